@@ -12,9 +12,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import pkg_resources
 
-try:
-        __version__ = pkg_resources.get_distribution("git_devbliss").version
-except pkg_resources.DistributionNotFound:  # pragma: no cover
-        __version__ = 'undefined'
+def version():
+    """Return the installed version of git-devbliss. It is looked up on
+    demand because reading the package metadata is slow and only needed
+    for --version."""
+    try:
+        from importlib import metadata
+    except ImportError:  # pragma: no cover
+        import pkg_resources
+        try:
+            return pkg_resources.get_distribution("git_devbliss").version
+        except pkg_resources.DistributionNotFound:
+            return 'undefined'
+    try:
+        return metadata.version("git_devbliss")
+    except metadata.PackageNotFoundError:  # pragma: no cover
+        return 'undefined'
+
+
+class LazyVersion (object):
+    """Version for docopt, which only turns it into a string when --version
+    is given."""
+
+    def __str__(self):
+        return version()
+
+
+# __version__ is only looked up when asked for (module __getattr__ needs
+# Python 3.7, the minimum in setup.py)
+def __getattr__(name):
+    if name == '__version__':
+        return version()
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name))
@@ -13,17 +13,26 @@
 # limitations under the License.
 
 import sys
-import pkg_resources
 import subprocess
 import os
 import os.path
+import time
 from docopt import docopt
 import re
-
-__version__ = pkg_resources.get_distribution("git_devbliss").version
-
-github_devbliss = pkg_resources.load_entry_point(
-    "git_devbliss", "console_scripts", "github-devbliss")
+import git_devbliss
+import git_devbliss.hooks
+import git_devbliss.maintenance
+from git_devbliss.hookcache import HookCache
+from git_devbliss.jobs import JobQueue, describe as describe_job
+from git_devbliss.git import (
+    MergedBranches, RefIndex, RepoSnapshot, branch_refspec, chunked,
+    fetcher, runner, tag_refspec, version_key)
+from git_devbliss.gitdir import remote_url
+
+_snapshot = None
+_ref_index = None
+_merged_branches = None
+hook_cache = HookCache()
 
 
 def main():
@@ -31,15 +40,18 @@ def main():
 Usage:
     git-devbliss ( feature | bug | refactor | research ) DESCRIPTION
     git-devbliss hotfix VERSION DESCRIPTION
-    git-devbliss finish [BASE_BRANCH]
-    git-devbliss release VERSION
-    git-devbliss status
+    git-devbliss finish [--deadline=DURATION] [--force-hooks] [--background]
+                        [BASE_BRANCH]
+    git-devbliss release [--deadline=DURATION] [--force-hooks] VERSION
+    git-devbliss status [--no-cache]
     git-devbliss delete [-f]
     git-devbliss issue [TITLE]
     git-devbliss review PULL_REQUEST_ID
     git-devbliss merge-button PULL_REQUEST_ID
     git-devbliss close-button PULL_REQUEST_ID
-    git-devbliss cleanup
+    git-devbliss cleanup [--api] [--maintenance]
+    git-devbliss maintenance
+    git-devbliss jobs
 
 Options:
     feature, bug, refactor, research
@@ -48,109 +60,225 @@ Options:
     finish        Open a pull request for the current branch
     release       Create a new tag, commit and push
     status        List branches, pull requests, and issues
+    --no-cache    Bypass the GitHub response cache
+    --deadline=DURATION
+                  Abort GitHub requests once the command has been
+                  running longer than DURATION (e.g. 90, 30s, 2m)
+    --force-hooks
+                  Run make hooks even if they already succeeded on the
+                  same tree
+    --background  Finish in a temporary worktree, detached from the
+                  terminal, and keep working in the meantime
     issue         Quickly post an issue to GitHub
     delete        Delete the current branch on github.com
     review        Review a pull request with the given id
     merge-button  Merge a pull request with the given id
     close-button  Close a pull request with the given id without merging
     cleanup       Cleans up the repository
+    --api         Delete merged branches on github.com through the GitHub
+                  API instead of git push
+    --maintenance
+                  Run maintenance after cleanup
+    maintenance   Write the commit-graph and multi-pack-index, pack refs and
+                  enable caches that speed up git, and report the timings
+                  of devbliss operations before and after
+    jobs          List the finish jobs running in the background and the
+                  pull requests of the finished ones
     -v --version  Print version number of git-devbliss
 '''
-    try:
-        # check whether the pwd is a git repository
-        git('rev-parse --abbrev-ref HEAD', pipe=True)
-
-        # check whether origin points to github.com
-        git('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True)
-    except subprocess.CalledProcessError:
+    if not origin_is_github():
         print('Fatal: origin does not point to a github.com repository',
               file=sys.stderr)
         sys.exit(1)
 
-    args = docopt(main.__doc__, version=__version__)
-    if(args['feature']):
-        branch('feature', args['DESCRIPTION'])
-    elif(args['bug']):
-        branch('bug', args['DESCRIPTION'])
-    elif(args['refactor']):
-        branch('refactor', args['DESCRIPTION'])
-    elif(args['research']):
-        branch('research', args['DESCRIPTION'])
-    elif(args['hotfix']):
-        hotfix(args['VERSION'], args['DESCRIPTION'])
-    elif(args['finish']):
-        finish(args['BASE_BRANCH'])
-    elif(args['release']):
-        release(args['VERSION'])
-    elif(args['status']):
-        github_devbliss(['status'])
-    elif(args['delete']):
-        delete(args['-f'])
-    elif(args['issue']):
-        github_devbliss(['issue', args['TITLE']])
-    elif(args['review']):
-        github_devbliss(['review', args['PULL_REQUEST_ID']])
-    elif(args['merge-button']):
-        github_devbliss(['merge-button', args['PULL_REQUEST_ID']])
-    elif(args['close-button']):
-        github_devbliss(['close-button', args['PULL_REQUEST_ID']])
-    elif(args['cleanup']):
-        cleanup()
+    args = docopt(main.__doc__, version=git_devbliss.LazyVersion())
+    if args['--deadline']:
+        set_deadline(args['--deadline'])
+    try:
+        if(args['feature']):
+            branch('feature', args['DESCRIPTION'])
+        elif(args['bug']):
+            branch('bug', args['DESCRIPTION'])
+        elif(args['refactor']):
+            branch('refactor', args['DESCRIPTION'])
+        elif(args['research']):
+            branch('research', args['DESCRIPTION'])
+        elif(args['hotfix']):
+            hotfix(args['VERSION'], args['DESCRIPTION'])
+        elif(args['finish']):
+            finish(args['BASE_BRANCH'], args['--force-hooks'],
+                   args['--background'])
+        elif(args['release']):
+            release(args['VERSION'], args['--force-hooks'])
+        elif(args['status']):
+            github_devbliss(['status'] + (
+                ['--no-cache'] if args['--no-cache'] else []))
+        elif(args['delete']):
+            delete(args['-f'])
+        elif(args['issue']):
+            github_devbliss(['issue', args['TITLE']])
+        elif(args['review']):
+            github_devbliss(['review', args['PULL_REQUEST_ID']])
+        elif(args['merge-button']):
+            github_devbliss(['merge-button', args['PULL_REQUEST_ID']])
+        elif(args['close-button']):
+            github_devbliss(['close-button', args['PULL_REQUEST_ID']])
+        elif(args['cleanup']):
+            cleanup(args['--api'])
+            if args['--maintenance']:
+                git_devbliss.maintenance.run(runner)
+        elif(args['maintenance']):
+            git_devbliss.maintenance.run(runner)
+        elif(args['jobs']):
+            jobs()
+    finally:
+        if os.environ.get('GIT_DEVBLISS_STATS'):
+            if git_devbliss.hooks.results:
+                print(git_devbliss.hooks.report(), file=sys.stderr)
+            # the GitHub client is only imported by commands that used it
+            github = sys.modules.get('git_devbliss.github')
+            if github:
+                print(github.GitHub.rate_limiter.report(), file=sys.stderr)
+                print(github.GitHub.connection_report(), file=sys.stderr)
+            print(runner.report(), file=sys.stderr)
+
+
+def github_devbliss(args):
+    # the GitHub client pulls in requests, so it is only imported by the
+    # commands that talk to GitHub
+    import git_devbliss.github.__main__
+    return git_devbliss.github.__main__.main(args)
+
+
+def set_deadline(duration):
+    import git_devbliss.github
+    try:
+        git_devbliss.github.GitHub.deadline = \
+            git_devbliss.github.Deadline.parse(duration)
+    except ValueError as e:
+        print('Fatal: ' + str(e), file=sys.stderr)
+        sys.exit(2)
 
 
 def hotfix(tag, description):
-    if [_tag for _tag in git('tag', pipe=True).split('\n') if tag == _tag]:
-        git('fetch origin')
-        git('checkout --quiet {}'.format(tag))
-        git('checkout --quiet -b hotfix/{}'.format(description))
-        git('push --set-upstream origin hotfix/{}'.format(description))
+    index = ref_index()
+    if index.has_tag(tag):
+        fetcher.fetch(tag_refspec(tag))
+        git(['checkout', '--quiet', tag])
+        git(['checkout', '--quiet', '-b', 'hotfix/' + description])
+        git(['push', '--set-upstream', 'origin', 'hotfix/' + description])
     else:
         print('Tag not found: {}'.format(tag), file=sys.stderr)
         print('Available tags:')
-        git('tag')
+        # list the tags of the same minor version if there are any
+        print('\n'.join(sorted(
+            index.complete(tag.rsplit('.', 1)[0] + '.') or index.tags,
+            key=version_key)))
         sys.exit(2)
 
 
-def git(command, pipe=False):
+def git(args, pipe=False):
     if pipe:
-        return subprocess.check_output('git {}'.format(command),
-                                       shell=True).decode()
+        return runner.output(args)
     else:
-        return os.system('git {}'.format(command))
+        return runner.call(args)
+
+
+def origin_is_github():
+    url = remote_url(runner, 'origin')
+    return bool(url and re.search(r'github.*:', url))
+
+
+def repo_snapshot(refresh=False):
+    """State of the repository, shared by all checks of a command. Pass
+    refresh=True once something (fetch, a make hook) may have changed it."""
+    global _snapshot
+    if _snapshot is None or refresh:
+        _snapshot = RepoSnapshot.take(runner)
+    return _snapshot
+
 
+def ref_index():
+    """Branches and tags of the repository, read once per command."""
+    global _ref_index
+    if _ref_index is None:
+        _ref_index = RefIndex.build(runner)
+    return _ref_index
 
-def is_repository_clean():
-    status = git('status --short --untracked-files=no | wc -l', pipe=True)
-    return status.strip() == "0"
+
+def merged_branches(refresh=False):
+    """Local and origin branches classified as merged into master or not."""
+    global _merged_branches
+    if _merged_branches is None or refresh:
+        _merged_branches = MergedBranches.classify(runner)
+    return _merged_branches
+
+
+def is_repository_clean(refresh=False):
+    return repo_snapshot(refresh).clean
 
 
 def is_synced_origin(remote_branch):
-    return git('rev-parse HEAD', pipe=True) == git(
-        'rev-parse origin/{}'.format(remote_branch), pipe=True)
+    return repo_snapshot().is_synced('origin/' + remote_branch)
 
 
 def check_repo_toplevel():
     # check if pwd is repository root in order to run makefile hooks properly
-    rev_parse = git('rev-parse --show-toplevel', pipe=True).strip()
-    if os.path.abspath(rev_parse) != os.path.abspath(os.getcwd()):
+    toplevel = repo_snapshot().toplevel
+    if toplevel is None or \
+            os.path.abspath(toplevel) != os.path.abspath(os.getcwd()):
         print('You need to run this command from the toplevel'
               ' of the working tree.', file=sys.stderr)
         sys.exit(2)
 
 
-def call_hook(hook, env_vars=''):
+def call_hook(hook, env_vars=None, force=False):
+    call_hooks([hook], env_vars, force)
+
+
+def call_hooks(hooks, env_vars=None, force=False):
+    """Run hooks, concurrently where the DEPENDENCIES of devbliss_hooks.py
+    allow it, and commit the changes they made in one commit."""
     check_repo_toplevel()
-    if os.path.isfile('Makefile'):
-        os.system(
-            '{env_vars} make {hook} || echo "Warning: Makefile has no target'
-            ' named {hook}"'.format(**locals()))
-
-        if not is_repository_clean():
-            git('commit --quiet -am "Ran git devbliss {hook} hook"'.format(
-                **locals()))
+    env = dict(os.environ, **(env_vars or {}))
+    tree = hook_cache.tree(runner)
+    pending = []
+    for hook in hooks:
+        if not force and hook_cache.succeeded(hook, tree, env):
+            print('Skipping the {} hook, it already succeeded on this'
+                  ' tree.'.format(hook))
+        else:
+            pending.append(hook)
+    plugins = {hook: git_devbliss.hooks.find(hook) for hook in pending}
+    if not any(plugins.values()) and not os.path.isfile('Makefile'):
+        if pending:
+            print('Warning: No Makefile found. All make hooks have been'
+                  ' skipped.', file=sys.stderr)
+        return
+    try:
+        results = git_devbliss.hooks.run_all(
+            pending, env, plugins, git_devbliss.hooks.dependencies())
+    except ValueError as e:
+        print('Error: ' + str(e), file=sys.stderr)
+        sys.exit(2)
+    for result in results:
+        if not result.ok:
+            print('Warning: ' + result.message)
+    if len(results) > 1:
+        print('Ran the hooks in ' + ', '.join('{} {:.2f}s'.format(
+            result.hook, result.seconds) for result in results))
+
+    if is_repository_clean(refresh=True):
+        # only hooks that left the tree as they found it can be skipped
+        # on it, a hook that changed files has to run again once its
+        # changes are gone (e.g. after a reset)
+        for result in results:
+            if result.ok:
+                hook_cache.record(result.hook, tree, env)
     else:
-        print('Warning: No Makefile found. All make hooks have been skipped.',
-              file=sys.stderr)
+        git(['commit', '--quiet', '-am',
+             'Ran git devbliss {} hook'.format(hooks[0])
+             if len(hooks) == 1 else 'Ran git devbliss hooks'])
 
 
 def branch(branch_type, branch_name):
@@ -160,25 +288,33 @@ def branch(branch_type, branch_name):
         print('You can delete this branch with "git devbliss delete'
               ' {branch_type}/{branch_name}"'.format(**locals()))
 
-    git('checkout --quiet master')
-    git('pull --quiet origin master')
-    try:
-        git('checkout --quiet -b {branch_type}/{branch_name}'.format(
-            **locals()))
-    except subprocess.CalledProcessError:
-        git('checkout --quiet {branch_type}/{branch_name}'.format(
-            **locals()))
-    git('push --set-upstream origin {branch_type}/{branch_name}'.format(
-        **locals()))
+    name = '{}/{}'.format(branch_type, branch_name)
+    git(['checkout', '--quiet', 'master'])
+    git(['pull', '--quiet', 'origin', 'master'])
+    if git(['checkout', '--quiet', '-b', name]):
+        git(['checkout', '--quiet', name])
+    git(['push', '--set-upstream', 'origin', name])
 
 
-def release(version):
+def release(version, force_hooks=False):
     if not re.match(r'^\d+\.\d+\.\d+$', version):
         print('Invalid version number', file=sys.stderr)
+        index = ref_index()
+        if index.latest():
+            print('The latest release is {}, the next one would be {},'
+                  ' {} or {}.'.format(index.latest(), index.next_version(),
+                                      index.next_version('minor'),
+                                      index.next_version('major')),
+                  file=sys.stderr)
         sys.exit(2)
+    if ref_index().has_tag(version):
+        print('Error: Tag {} already exists. The next release would be'
+              ' {}.'.format(version, ref_index().next_version()),
+              file=sys.stderr)
+        sys.exit(1)
 
-    git('fetch --quiet origin')
-    branch = git('rev-parse --abbrev-ref HEAD', pipe=True)
+    fetcher.fetch(branch_refspec('master'), force=True)
+    branch = repo_snapshot(refresh=True).branch
 
     if not is_repository_clean():
         print('Error: Repository is not clean. Aborting.', file=sys.stderr)
@@ -190,102 +326,205 @@ def release(version):
         print('Do "git pull && git push" and try agin.', file=sys.stderr)
         sys.exit(1)
 
-    call_hook('release', 'DEVBLISS_VERSION="{}"'.format(version))
-    git('diff')
+    call_hook('release', {'DEVBLISS_VERSION': version}, force_hooks)
+    git(['diff'])
     print("Have these changes been reviewed?")
     print("[enter / ctrl+c to cancel]")
     try:
         input()
     except KeyboardInterrupt:
         sys.exit(2)
-    git('commit --quiet --allow-empty -m "Release: {version}"'.format(
-        **locals()))
-    git('push origin {branch}'.format(**locals()))
-    git('tag {version}'.format(**locals()))
-    git('push --tags origin')
+    git(['commit', '--quiet', '--allow-empty', '-m',
+         'Release: {}'.format(version)])
+    git(['tag', version])
+    refs = ['refs/heads/' + branch, 'refs/tags/' + version]
+    # the release commit and its tag are published together or not at all
+    if git(['push', '--atomic', 'origin'] + refs) != 0:
+        print('Error: Push failed, nothing was published. Try again with'
+              ' "git push --atomic origin {} {}".'.format(*refs),
+              file=sys.stderr)
+        sys.exit(1)
+    if not is_published(refs):
+        print('Error: origin does not show {} and tag {} at the release'
+              ' commit.'.format(branch, version), file=sys.stderr)
+        sys.exit(1)
     if branch == 'master':
         print()
         github_devbliss(['pull-request'])
 
 
+def is_published(refs):
+    """Whether all refs point to HEAD on origin, checked with one
+    ls-remote."""
+    head = git(['rev-parse', 'HEAD'], pipe=True)
+    remote = dict(reversed(line.split('\t', 1)) for line in git(
+        ['ls-remote', 'origin'] + refs, pipe=True).splitlines())
+    return all(remote.get(ref) == head for ref in refs)
+
+
 def delete(force=False):
-    branch = git('rev-parse --abbrev-ref HEAD', pipe=True)
+    branch = repo_snapshot().branch
     if branch == 'master':
         print("Won't delete master branch. Aborting.", file=sys.stderr)
         sys.exit(2)
     if force or input(
             'Really delete the remote branch? [y/N] ').capitalize() == 'Y':
-        git('push --delete origin {}'.format(branch))
+        git(['push', '--delete', 'origin', branch])
         print('To restore the remote branch, type')
         print('    git push --set-upstream origin {}'.format(branch))
         print('To delete your local branch, type')
         print('    git checkout master && git branch -d {}'.format(branch))
 
 
-def cleanup():
-    git('fetch')
+def cleanup(api=False):
     print("Deleting remote tracking branches whose "
           "tracked branches on server are gone...")
-    git('remote prune origin')
+    fetcher.fetch(branch_refspec('*'), prune=True, force=True)
     print("Searching all remote branches except release "
           "that are already merged into master...")
-    get_remote_merged_branches = None
-    try:
-        get_remote_merged_branches = git('branch -r --merged origin/master'
-                                         ' | grep -v master | grep -v release',
-                                         pipe=True)
-    except subprocess.CalledProcessError:
+    merged = merged_branches(refresh=True)
+    remote_merged_branches = [
+        i for i in merged.remote_merged
+        if 'master' not in i and 'release' not in i]
+    if not remote_merged_branches:
         print('No remote merged branches found')
-    if get_remote_merged_branches:
-        print(get_remote_merged_branches)
+    else:
+        print('\n'.join('origin/' + i for i in remote_merged_branches))
         if input("Do you want to delete those branches on the server? [y/N]"
                  ).capitalize() == 'Y':
             print("Deleting...")
-            os.system("echo '{}' | sed 's#origin/##' | xargs -I {{}}"
-                      " git push origin :{{}}".format(
-                          get_remote_merged_branches))
-            git('remote prune origin')
+            if api:
+                github_devbliss(['delete-branches'] + remote_merged_branches)
+            else:
+                delete_remote_branches(remote_merged_branches)
+            git(['remote', 'prune', 'origin'])
         else:
             print("ok, will not delete anything.")
     print("Deleting all local branches (except current)"
           " that are already merged into local master...")
-    git("branch --merged master | grep -v master "
-        "| grep -v '\*' | xargs git branch -d")
+    current = repo_snapshot().branch
+    local_merged_branches = [
+        i for i in merged.merged if 'master' not in i and i != current]
+    if local_merged_branches:
+        git(['branch', '-d'] + local_merged_branches)
     print("Checking for unmerged local branches...")
-    git('branch --no-merged master')
-
-
-def finish(base_branch):
+    if merged.unmerged:
+        print('\n'.join(merged.unmerged))
+
+
+def delete_remote_branches(names):
+    """Delete branches on origin with one atomic push per command line full
+    of refspecs and print a summary. If a push fails, its branches are
+    deleted one by one so that a single protected or already deleted
+    branch does not keep the others."""
+    start = time.monotonic()
+    deleted = []
+    failed = []
+    for refspecs in chunked([':' + i for i in names]):
+        if git(['push', '--atomic', 'origin'] + refspecs) == 0:
+            deleted += [i[1:] for i in refspecs]
+            continue
+        for refspec in refspecs:
+            if git(['push', 'origin', refspec]) == 0:
+                deleted.append(refspec[1:])
+            else:
+                failed.append(refspec[1:])
+    if failed:
+        print('Could not delete ' + ', '.join(failed), file=sys.stderr)
+    print('Deleted {} of {} branches in {:.1f}s'.format(
+        len(deleted), len(names), time.monotonic() - start))
+    return deleted
+
+
+def finish(base_branch, force_hooks=False, background=False):
     base_branch_used = bool(base_branch)
     base_branch = base_branch or 'master'
-    branch = git('rev-parse --abbrev-ref HEAD', pipe=True)
+    branch = repo_snapshot().branch
     if not is_repository_clean():
         print("Error: Repository is not clean. Aborting.", file=sys.stderr)
         sys.exit(1)
 
-    if branch not in git('branch --contains {}'.format(base_branch),
-                         pipe=True):
+    # commits of the base branch missing from HEAD: this only walks the
+    # history between the two, and 0 means the base branch is merged
+    try:
+        behind = int(git(['rev-list', '--count', 'HEAD..' + base_branch,
+                          '--'], pipe=True))
+    except subprocess.CalledProcessError:
+        print("Error: Unknown base branch {}.".format(base_branch),
+              file=sys.stderr)
+        sys.exit(1)
+    if behind:
+        behind = '{} commit{} behind'.format(behind, 's' * (behind != 1))
         if 'hotfix/' in branch and not base_branch_used:
-            print("Warning: Master is not merged into the current branch.")
+            print("Warning: Master is not merged into the current branch"
+                  " ({}).".format(behind))
         else:
             print("Error: Won't finish. {} is not merged into the"
-                  " current branch.".format(base_branch), file=sys.stderr)
+                  " current branch ({}).".format(
+                      base_branch, behind), file=sys.stderr)
             print("Please do 'git merge {}', make sure all conflicts"
                   " are merged and try again.".format(base_branch),
                   file=sys.stderr)
             sys.exit(1)
-    env_vars = 'DEVBLISS_BRANCH_TYPE=' + branch.split('/')[0]
-    call_hook('finish', env_vars)
-    call_hook('changelog', env_vars)
-    call_hook('version', env_vars)
-    git('push origin {}'.format(branch))
+    env_vars = {'DEVBLISS_BRANCH_TYPE': branch.split('/')[0]}
+    if background:
+        start_job(branch, base_branch, env_vars, force_hooks)
+    else:
+        publish(branch, base_branch, env_vars, force_hooks)
+
+
+def publish(branch, base_branch, env_vars, force_hooks=False,
+            detached=False):
+    """Run the finish hooks, push branch and open its pull request. A
+    detached HEAD (the worktree of a background job) is pushed to
+    branch."""
+    call_hooks(['finish', 'changelog', 'version'], env_vars, force_hooks)
+    if detached:
+        git(['push', 'origin', 'HEAD:refs/heads/' + branch])
+    else:
+        git(['push', 'origin', branch])
     print()
     args = ['pull-request']
+    if detached:
+        args = args + ['--head=' + branch]
     if base_branch:
         args = args + [base_branch]
     github_devbliss(args)
     print()
     github_devbliss(['open-pulls'])
 
+
+def start_job(branch, base_branch, env_vars, force_hooks=False):
+    # hooks of a background job run without a terminal, DEVBLISS_BACKGROUND
+    # tells them to skip anything interactive like opening an editor
+    env_vars = dict(env_vars, DEVBLISS_BACKGROUND='1')
+    # the job cannot ask for GitHub credentials, log in before it starts
+    import git_devbliss.github
+    git_devbliss.github.GitHub()
+    queue = JobQueue(runner)
+    try:
+        job = queue.start(branch, base_branch, env_vars, force_hooks)
+    except subprocess.CalledProcessError:
+        print('Error: Could not create a worktree for the job.',
+              file=sys.stderr)
+        sys.exit(1)
+    print('Finishing {} in the background (job {}).'.format(
+        branch, job['id']))
+    print('Follow its progress in ' + queue.path(job['id'], '.log'))
+    print('Once it is done, "git pull" brings the commits of the hooks'
+          ' into your branch.')
+
+
+def jobs():
+    queue = JobQueue(runner)
+    all_jobs = queue.jobs()
+    if not all_jobs:
+        print('No finish jobs.')
+        return
+    for job in all_jobs:
+        print(describe_job(job))
+        if job['state'] != 'finished':
+            print('    log: ' + queue.path(job['id'], '.log'))
+
 if __name__ == '__main__':
     sys.exit(main())  # pragma nocover
@@ -0,0 +1,343 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import json
+import os
+import os.path
+import re
+import subprocess
+import threading
+import time
+import git_devbliss.gitdir
+
+# Number of git processes run at once by GitRunner.concurrently.
+MAX_WORKERS = 4
+
+# Longest argument list (in characters) passed to a single git command,
+# well below the command line limits of Windows (32k) and unix systems.
+MAX_COMMAND_LENGTH = 30000
+
+# Seconds a fetched ref stays fresh: fetching it again within that window
+# is skipped. GIT_DEVBLISS_FETCH_TTL overrides it, 0 always fetches.
+FETCH_TTL = 60
+
+VERSION = re.compile(r"^v?(\d+)\.(\d+)\.(\d+)$")
+
+
+class GitRunner (object):
+    """Runs git commands given as argv lists, without a shell in between,
+    and records the wall time of every call."""
+
+    def __init__(self, executable="git", max_workers=MAX_WORKERS):
+        self.executable = executable
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.timings = []
+
+    def _timed(self, function, args, **kwargs):
+        start = time.monotonic()
+        try:
+            return function([self.executable] + list(args), **kwargs)
+        finally:
+            with self.lock:
+                self.timings.append(
+                    (list(args), time.monotonic() - start))
+
+    def output(self, args):
+        """Return the stripped stdout of git args. Raises
+        subprocess.CalledProcessError if git fails."""
+        return self._timed(subprocess.check_output, args).decode().strip()
+
+    def lines(self, args):
+        return [line for line in self.output(args).splitlines()
+                if line.strip()]
+
+    def call(self, args):
+        """Run git args attached to the terminal and return its exit
+        status."""
+        return self._timed(subprocess.call, args)
+
+    def concurrently(self, *commands):
+        """Run independent commands at the same time and return their
+        output in the order of commands."""
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.output, args)
+                       for args in commands]
+            return [future.result() for future in futures]
+
+    def report(self):
+        if not self.timings:
+            return "git: no commands run"
+        total = sum(seconds for _, seconds in self.timings)
+        args, seconds = max(self.timings, key=lambda timing: timing[1])
+        return "git: {} commands in {:.2f}s, slowest: git {} ({:.2f}s)".format(
+            len(self.timings), total, " ".join(args), seconds)
+
+
+class RepoSnapshot (object):
+    """State of the repository read from a single `git status
+    --porcelain=v2 --branch` and the refs in .git: current
+    branch, its upstream and how far ahead/behind it is, whether tracked
+    files are modified, the top level of the working tree, and the commit
+    of every branch."""
+
+    def __init__(self, status, refs, toplevel=None):
+        self.head = None
+        self.branch = "HEAD"
+        self.upstream = None
+        self.ahead = self.behind = 0
+        self.clean = True
+        self.toplevel = toplevel
+        for line in status.splitlines():
+            if line.startswith("# branch.oid "):
+                oid = line.split()[2]
+                self.head = None if oid == "(initial)" else oid
+            elif line.startswith("# branch.head "):
+                head = line.split(" ", 2)[2]
+                self.branch = "HEAD" if head == "(detached)" else head
+            elif line.startswith("# branch.upstream "):
+                self.upstream = line.split(" ", 2)[2]
+            elif line.startswith("# branch.ab "):
+                ahead, behind = line.split()[2:4]
+                self.ahead, self.behind = int(ahead), -int(behind)
+            elif line and not line.startswith(("#", "?", "!")):
+                self.clean = False
+        self.refs = refs
+
+    @classmethod
+    def take(cls, runner, cwd="."):
+        status = runner.output(["status", "--porcelain=v2", "--branch",
+                                "--untracked-files=no"])
+        refs = git_devbliss.gitdir.refs(
+            runner, "refs/heads/", "refs/remotes/", path=cwd)
+        return cls(status, refs, git_devbliss.gitdir.toplevel(runner, cwd))
+
+    def resolve(self, name):
+        """Commit of a branch given as e.g. master or origin/master."""
+        for prefix in ("refs/heads/", "refs/remotes/", ""):
+            if prefix + name in self.refs:
+                return self.refs[prefix + name]
+        return None
+
+    def is_synced(self, name):
+        return self.head is not None and self.head == self.resolve(name)
+
+
+def chunked(args, limit=MAX_COMMAND_LENGTH):
+    """Split args into lists that each fit into a single command line of
+    at most limit characters."""
+    chunk, length = [], 0
+    for arg in args:
+        if chunk and length + len(arg) + 1 > limit:
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(arg)
+        length += len(arg) + 1
+    if chunk:
+        yield chunk
+
+
+def version_key(name):
+    """Sort key that orders version tags numerically (1.2.10 after 1.2.9),
+    followed by all other names."""
+    match = VERSION.match(name)
+    if match:
+        return (0, tuple(int(i) for i in match.groups()), name)
+    return (1, (), name)
+
+
+class RefIndex (object):
+    """Branches and tags of the repository, read once, for constant time
+    existence checks, version queries and prefix search."""
+
+    def __init__(self, refs):
+        self.refs = refs
+        self.branches = {name[11:]: objectname
+                         for name, objectname in refs.items()
+                         if name.startswith("refs/heads/")}
+        self.tags = {name[10:]: objectname
+                     for name, objectname in refs.items()
+                     if name.startswith("refs/tags/")}
+        self.versions = sorted((name for name in self.tags
+                                if VERSION.match(name)), key=version_key)
+        self._sorted = {"branches": sorted(self.branches),
+                        "tags": sorted(self.tags)}
+
+    @classmethod
+    def build(cls, runner, cwd="."):
+        return cls(git_devbliss.gitdir.refs(
+            runner, "refs/heads/", "refs/remotes/", "refs/tags/", path=cwd))
+
+    def has_tag(self, name):
+        return name in self.tags
+
+    def has_branch(self, name):
+        return name in self.branches
+
+    def latest(self):
+        """The highest version tag, or None."""
+        return self.versions[-1] if self.versions else None
+
+    def next_version(self, part="patch"):
+        """The version following the latest one with part (major, minor or
+        patch) increased."""
+        latest = self.latest()
+        major, minor, patch = (
+            [int(i) for i in VERSION.match(latest).groups()]
+            if latest else (0, 0, 0))
+        if part == "major":
+            return "{}.0.0".format(major + 1)
+        if part == "minor":
+            return "{}.{}.0".format(major, minor + 1)
+        return "{}.{}.{}".format(major, minor, patch + 1)
+
+    def complete(self, prefix, kind="tags"):
+        """Sorted names of branches or tags starting with prefix."""
+        names = self._sorted[kind]
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+
+class MergedBranches (object):
+    """Local branches split into merged and unmerged into base, and branches
+    of remote split the same way relative to remote/base. Each namespace is
+    classified by a single `for-each-ref --merged` (both run concurrently)
+    and compared with the refs read from .git, instead of a `git branch
+    --merged`/`--no-merged` history walk per question."""
+
+    def __init__(self, refs, merged, base="master", remote="origin"):
+        self.base = base
+        self.remote = remote
+        heads = sorted(name[11:] for name in refs
+                       if name.startswith("refs/heads/"))
+        prefix = "refs/remotes/{}/".format(remote)
+        remotes = sorted(name[len(prefix):] for name in refs
+                         if name.startswith(prefix) and
+                         name != prefix + "HEAD")
+        self.merged = [name for name in heads
+                       if "refs/heads/" + name in merged]
+        self.unmerged = [name for name in heads
+                         if "refs/heads/" + name not in merged]
+        self.remote_merged = [name for name in remotes
+                              if prefix + name in merged]
+        self.remote_unmerged = [name for name in remotes
+                                if prefix + name not in merged]
+
+    @classmethod
+    def classify(cls, runner, base="master", remote="origin", cwd="."):
+        refs = git_devbliss.gitdir.refs(
+            runner, "refs/heads/", "refs/remotes/{}/".format(remote),
+            path=cwd)
+        merged = set()
+        for output in runner.concurrently(
+                ["for-each-ref", "--format=%(refname)", "--merged=" + base,
+                 "refs/heads"],
+                ["for-each-ref", "--format=%(refname)",
+                 "--merged={}/{}".format(remote, base),
+                 "refs/remotes/" + remote]):
+            merged.update(output.splitlines())
+        return cls(refs, merged, base, remote)
+
+
+class FetchCoordinator (object):
+    """Fetches only the refspecs a command needs, and remembers when each of
+    them was last fetched (in .git/devbliss-fetch.json) so that back-to-back
+    commands skip fetches that happened less than ttl seconds ago."""
+
+    def __init__(self, runner, remote="origin", ttl=None, state=None):
+        self.runner = runner
+        self.remote = remote
+        self.ttl = ttl
+        self.state = state
+
+    def _ttl(self):
+        if self.ttl is not None:
+            return self.ttl
+        try:
+            return float(os.environ.get("GIT_DEVBLISS_FETCH_TTL", FETCH_TTL))
+        except ValueError:
+            return FETCH_TTL
+
+    def _state(self):
+        if self.state is None:
+            self.state = os.path.join(git_devbliss.gitdir.common_dir(
+                self.runner), "devbliss-fetch.json")
+        return self.state
+
+    def _load(self):
+        try:
+            with open(self._state(), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, fetched):
+        path = self._state()
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(fetched, f, indent=1, sort_keys=True)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass  # only an optimisation, the next command fetches again
+
+    def _key(self, refspec, prune=False):
+        return " ".join([self.remote, refspec] + ["--prune"] * prune)
+
+    def stale(self, refspecs, prune=False, now=None):
+        """The refspecs that have not been fetched within the last ttl
+        seconds (fetches with --prune also count for those without)."""
+        now = time.time() if now is None else now
+        fetched = self._load()
+        ttl = self._ttl()
+        return [refspec for refspec in refspecs if now - max(
+            fetched.get(self._key(refspec, True), 0),
+            0 if prune else fetched.get(self._key(refspec), 0)) >= ttl]
+
+    def fetch(self, *refspecs, prune=False, force=False):
+        """Fetch refspecs from the remote in one git fetch, leaving out
+        those that are still fresh unless force is given (commands that
+        delete or publish something must not act on stale refs). Returns
+        the exit status of git fetch, or 0 if nothing had to be fetched."""
+        now = time.time()
+        stale = list(refspecs) if force else self.stale(refspecs, prune, now)
+        if not stale:
+            return 0
+        status = self.runner.call(["fetch", "--quiet"] +
+                                  ["--prune"] * prune +
+                                  [self.remote] + stale)
+        if status == 0 and self._ttl() > 0:
+            fetched = {key: when for key, when in self._load().items()
+                       if now - when < self._ttl()}
+            fetched.update((self._key(refspec, prune), now)
+                           for refspec in stale)
+            self._save(fetched)
+        return status
+
+
+def branch_refspec(branch, remote="origin"):
+    return "+refs/heads/{0}:refs/remotes/{1}/{0}".format(branch, remote)
+
+
+def tag_refspec(tag):
+    return "+refs/tags/{0}:refs/tags/{0}".format(tag)
+
+
+runner = GitRunner()
+fetcher = FetchCoordinator(runner)
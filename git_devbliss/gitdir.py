@@ -0,0 +1,311 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import os.path
+import re
+import subprocess
+import threading
+
+OBJECT_NAME = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+SECTION = re.compile(r'^\[\s*([\w.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]$')
+
+# Parsed files by path and parser, together with the mtime, size and inode
+# they were parsed at, so repeated lookups only cost a stat. git replaces
+# files by renaming, so the inode tells rewrites within one timestamp tick
+# apart (loose refs always have the same size).
+_cache = {}
+_lock = threading.Lock()
+
+
+class Unsupported (Exception):
+    """Raised when the repository uses something the reader does not
+    understand (includes, other ref backends, GIT_DIR...). Callers fall
+    back to running git."""
+
+
+def _cached(path, parse):
+    """Return parse(contents of path), or None if path does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _lock:
+        entry = _cache.get((path, parse))
+    if entry and entry[0] == key:
+        return entry[1]
+    with open(path, encoding="utf-8") as f:
+        value = parse(f.read())
+    with _lock:
+        _cache[(path, parse)] = (key, value)
+    return value
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+def _unquote(value):
+    value = value.split(" #")[0].split(" ;")[0].strip()
+    if value.endswith("\\"):
+        raise Unsupported("line continuation in config")
+    if value.startswith('"') and value.endswith('"') and len(value) > 1:
+        value = value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def parse_config(text):
+    """Parse a git config file into {(section, subsection): {key: [value]}}
+    with lower case section and key names."""
+    config = {}
+    values = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("["):
+            match = SECTION.match(line)
+            if not match:
+                raise Unsupported("config section " + line)
+            section = match.group(1).lower()
+            if section in ("include", "includeif", "url"):
+                raise Unsupported("config section " + section)
+            values = config.setdefault((section, match.group(2)), {})
+            continue
+        if values is None:
+            raise Unsupported("config entry outside of a section")
+        key, _, value = line.partition("=")
+        values.setdefault(key.strip().lower(), []).append(
+            _unquote(value) if _ else "true")
+    if "refstorage" in config.get(("extensions", None), {}):
+        raise Unsupported("ref storage backend")
+    return config
+
+
+def user_config_paths():
+    """The system and global config files git reads besides the config of
+    the repository."""
+    if "GIT_CONFIG_PARAMETERS" in os.environ or \
+            "GIT_CONFIG_COUNT" in os.environ:
+        raise Unsupported("config from the environment")
+    paths = []
+    if os.environ.get("GIT_CONFIG_NOSYSTEM", "").lower() in (
+            "", "0", "false", "no", "off"):
+        paths.append(os.environ.get("GIT_CONFIG_SYSTEM", "/etc/gitconfig"))
+    if "GIT_CONFIG_GLOBAL" in os.environ:
+        paths.append(os.environ["GIT_CONFIG_GLOBAL"])
+    else:
+        paths.append(os.path.join(
+            os.environ.get("XDG_CONFIG_HOME") or
+            os.path.expanduser("~/.config"), "git", "config"))
+        paths.append(os.path.expanduser("~/.gitconfig"))
+    return [path for path in paths if path]
+
+
+def parse_ref_storage(text):
+    """The ref storage backend a config file selects (extensions.refStorage),
+    files unless it says otherwise."""
+    section = None
+    storage = "files"
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            match = SECTION.match(line)
+            section = match and match.group(1).lower()
+        elif section == "extensions":
+            key, _, value = line.partition("=")
+            if key.strip().lower() == "refstorage":
+                storage = _unquote(value).lower()
+    return storage
+
+
+def parse_head(text):
+    text = text.strip()
+    if text.startswith("ref: refs/"):
+        return text[5:]
+    if OBJECT_NAME.match(text):
+        return text
+    raise Unsupported("HEAD")
+
+
+def parse_packed_refs(text):
+    refs = {}
+    for line in text.splitlines():
+        if not line or line[0] in "#^":
+            continue
+        objectname, _, refname = line.partition(" ")
+        if not OBJECT_NAME.match(objectname):
+            raise Unsupported("packed-refs")
+        refs[refname] = objectname
+    return refs
+
+
+class GitDir (object):
+    """Reads HEAD, remotes and refs straight from the .git directory of a
+    working tree (or the .git file of a linked worktree)."""
+
+    def __init__(self, worktree, git_dir, common_dir):
+        self.worktree = worktree
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+
+    @classmethod
+    def find(cls, path="."):
+        """Return the GitDir of the working tree containing path, or None
+        if path is not inside one."""
+        if "GIT_DIR" in os.environ or "GIT_WORK_TREE" in os.environ:
+            raise Unsupported("GIT_DIR or GIT_WORK_TREE is set")
+        path = os.path.abspath(path)
+        while not os.path.exists(os.path.join(path, ".git")):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        git_dir = os.path.join(path, ".git")
+        if os.path.isfile(git_dir):
+            with open(git_dir, encoding="utf-8") as f:
+                text = f.read().strip()
+            if not text.startswith("gitdir: "):
+                raise Unsupported(".git file")
+            git_dir = os.path.normpath(os.path.join(path, text[8:]))
+        common_dir = git_dir
+        commondir = os.path.join(git_dir, "commondir")
+        if os.path.exists(commondir):
+            with open(commondir, encoding="utf-8") as f:
+                common_dir = os.path.normpath(
+                    os.path.join(git_dir, f.read().strip()))
+        # HEAD and refs/heads of a reftable repository are stubs
+        if _cached(os.path.join(common_dir, "config"),
+                   parse_ref_storage) not in (None, "files"):
+            raise Unsupported("ref storage backend")
+        return cls(path, git_dir, common_dir)
+
+    def head(self):
+        """The ref HEAD points to (e.g. refs/heads/master) or the commit if
+        HEAD is detached."""
+        head = _cached(os.path.join(self.git_dir, "HEAD"), parse_head)
+        if head is None:
+            raise Unsupported("no HEAD")
+        return head
+
+    def branch(self):
+        """Name of the current branch, or HEAD if it is detached (like
+        `git rev-parse --abbrev-ref HEAD`)."""
+        head = self.head()
+        if head.startswith("refs/heads/"):
+            return head[11:]
+        return "HEAD"
+
+    def config(self):
+        return _cached(os.path.join(self.common_dir, "config"),
+                       parse_config) or {}
+
+    def remotes(self):
+        """{name: url} of all remotes."""
+        for path in user_config_paths():
+            # raises Unsupported for url rewrites and includes, which
+            # change the urls of the repository config
+            _cached(path, parse_config)
+        return {subsection: values["url"][0]
+                for (section, subsection), values in self.config().items()
+                if section == "remote" and subsection and "url" in values}
+
+    def refs(self, *prefixes):
+        """{refname: objectname} of the branches and tags below prefixes
+        (e.g. refs/heads/), from packed-refs and loose ref files."""
+        refs = {name: objectname for name, objectname in (_cached(
+            os.path.join(self.common_dir, "packed-refs"),
+            parse_packed_refs) or {}).items() if name.startswith(prefixes)}
+        for prefix in prefixes:
+            top = os.path.join(self.common_dir, prefix)
+            for directory, _, files in os.walk(top):
+                for name in files:
+                    if name.endswith(".lock"):
+                        continue
+                    path = os.path.join(directory, name)
+                    refname = os.path.relpath(path, self.common_dir).replace(
+                        os.sep, "/")
+                    objectname = _cached(path, str.strip)
+                    if objectname is None:
+                        continue  # deleted while walking
+                    if objectname.startswith("ref: "):
+                        continue  # symbolic, e.g. refs/remotes/origin/HEAD
+                    if not OBJECT_NAME.match(objectname):
+                        raise Unsupported("ref " + refname)
+                    refs[refname] = objectname
+        return refs
+
+
+def current_branch(runner, path="."):
+    try:
+        gitdir = GitDir.find(path)
+        if gitdir:
+            return gitdir.branch()
+    except Unsupported:
+        pass
+    return runner.output(["rev-parse", "--abbrev-ref", "HEAD"])
+
+
+def remote_url(runner, name="origin", path="."):
+    """URL of the remote name, or None if there is no such remote or path
+    is not inside a repository."""
+    try:
+        gitdir = GitDir.find(path)
+        return gitdir and gitdir.remotes().get(name)
+    except Unsupported:
+        pass
+    try:
+        return runner.output(["remote", "get-url", name])
+    except subprocess.CalledProcessError:
+        return None
+
+
+def refs(runner, *prefixes, path="."):
+    try:
+        gitdir = GitDir.find(path)
+        if gitdir:
+            return gitdir.refs(*prefixes)
+    except Unsupported:
+        pass
+    output = runner.output(
+        ["for-each-ref", "--format=%(objectname) %(refname)"] +
+        [prefix.rstrip("/") for prefix in prefixes])
+    return dict(reversed(line.split(" ", 1))
+                for line in output.splitlines() if line.strip())
+
+
+def toplevel(runner, path="."):
+    try:
+        gitdir = GitDir.find(path)
+        return gitdir and gitdir.worktree
+    except Unsupported:
+        pass
+    try:
+        return runner.output(["rev-parse", "--show-toplevel"])
+    except subprocess.CalledProcessError:
+        return None
+
+
+def common_dir(runner, path="."):
+    """The .git directory shared by all worktrees of the repository."""
+    try:
+        gitdir = GitDir.find(path)
+        if gitdir:
+            return gitdir.common_dir
+    except Unsupported:
+        pass
+    return os.path.abspath(os.path.join(path, runner.output(
+        ["rev-parse", "--git-common-dir"])))
@@ -15,17 +15,77 @@
 import json
 import os
 import getpass
-import subprocess
 import sys
 import os.path
+import time
+import urllib.parse
 import requests
+from git_devbliss.git import runner
+from git_devbliss.gitdir import current_branch, remote_url
+from git_devbliss.github.cache import ResponseCache
+from git_devbliss.github.deadline import Deadline, DeadlineExceeded  # noqa
+from git_devbliss.github.ratelimit import RateLimiter
+from git_devbliss.github.retry import RetryPolicy
+
+# Size of the keep-alive connection pool: number of hosts to keep pools for
+# and number of connections kept open per host.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+# GitHub caps list endpoints at 100 items per page.
+PER_PAGE = 100
+
+# Seconds to wait for a connection to api.github.com and for each read.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+SEARCH_PULLS_QUERY = """
+query ($query: String!, $first: Int!, $cursor: String) {
+  search(query: $query, type: ISSUE, first: $first, after: $cursor) {
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      ... on PullRequest { number title url repository { name } }
+    }
+  }
+}
+"""
+
+
+def connection_stats(adapters):
+    opened = sent = 0
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            opened += pool.num_connections
+            sent += pool.num_requests
+    return {"opened": opened, "reused": sent - opened}
 
 
 class GitHub (object):
 
     interactive = False
+    use_cache = True
+    # shared by all clients so that the budget is tracked per command
+    rate_limiter = RateLimiter()
+    retry_policy = RetryPolicy()
+    connect_timeout = CONNECT_TIMEOUT
+    read_timeout = READ_TIMEOUT
+    deadline = None
+    # keep-alive adapters of all clients of the command, for
+    # connection_report()
+    adapters = []
 
-    def __init__(self, token_file="~/.github_token"):
+    def __init__(self, token_file="~/.github_token",
+                 pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE):
+        self.session = requests.Session()
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        GitHub.adapters.append(self.adapter)
+        self.cache = ResponseCache() if self.use_cache else None
         self.token_file = os.path.abspath(os.path.expanduser(token_file))
         if not os.path.exists(self.token_file):
             self._interactive_login()
@@ -44,10 +104,10 @@ class GitHub (object):
         if two_factor:
             headers["X-GitHub-OTP"] = two_factor
 
-        response = requests.post(
+        response = self.session.post(
             'https://api.github.com/authorizations',
             auth=(username, password), headers=headers,
-            data=json.dumps(body, sort_keys=True)
+            data=json.dumps(body, sort_keys=True), timeout=self.timeout()
         )
 
         body = response.json()
@@ -92,33 +152,123 @@ class GitHub (object):
             f.write(token)
         return token
 
-    def _request(self, method, path, body=None, host="https://api.github.com"):
-        response = requests.request(method, host + path, data=body, headers={
+    def timeout(self):
+        """Return the (connect, read) timeout for the next request, capped
+        at the time left until the deadline."""
+        if self.deadline:
+            return self.deadline.timeout(self.connect_timeout,
+                                         self.read_timeout)
+        return (self.connect_timeout, self.read_timeout)
+
+    def _wait(self, delay, pause=None):
+        if self.deadline:
+            self.deadline.check(delay)
+        (pause or time.sleep)(delay)
+
+    def _request(self, method, path, body=None, host="https://api.github.com",
+                 retry=None):
+        return self._send(method, path, body, host, retry)[0]
+
+    def _send(self, method, path, body=None, host="https://api.github.com",
+              retry=None):
+        url = host + path
+        headers = {
             "Authorization": "bearer " + self.token,
             "User-Agent": "git-devbliss/ng",  # TODO
             "Content-Type": "application/json",
-        })
-        response_body = response.json()
+        }
+        cache = self.cache if method == "GET" else None
+        cached = cache and cache.get(url, self.token)
+        if cached:
+            headers.update(cache.validators(cached))
+        retry = retry or self.retry_policy
+        attempt = 0
+        while True:
+            delay = self.rate_limiter.throttle(url)
+            if delay:
+                self._wait(delay, self.rate_limiter.pause)
+            try:
+                response = self.session.request(
+                    method, url, data=body, headers=headers,
+                    timeout=self.timeout())
+            except DeadlineExceeded:
+                raise
+            except requests.exceptions.RequestException as e:
+                if not retry.retry_error(method, attempt, e):
+                    raise
+                self._wait(retry.delay(attempt))
+                attempt += 1
+                continue
+            delay = self.rate_limiter.update(response)
+            if attempt + 1 >= retry.max_attempts:
+                break
+            elif delay is not None:
+                self._wait(delay, self.rate_limiter.pause)
+            elif retry.retry_response(method, attempt, response):
+                self._wait(retry.delay(attempt))
+            else:
+                break
+            attempt += 1
+        if cached and response.status_code == 304:
+            # not modified: not counted against the rate limit
+            if cached.get("link") and "Link" not in response.headers:
+                response.headers["Link"] = cached["link"]
+            return cached["body"], response
+        # 204 No Content, e.g. after deleting a ref
+        response_body = (None if response.status_code == 204
+                         else response.json())
         if response.status_code == 401:
             self.token = self._interactive_login()
-            return self._request(method, path, body, host)
+            return self._send(method, path, body, host, retry)
         if response.status_code in (301, ):  # TODO: 302, 307, 308
             path = response.headers['location']
-            return self._request(method, path, body, host)
+            return self._send(method, path, body, host, retry)
         if response.status_code >= 300:
             e = requests.exceptions.RequestException(
-                response.status_code, response.reason)
+                response.status_code, response.reason, response=response)
             e.body = response_body
             raise e
-        return response_body
+        if cache:
+            cache.set(url, self.token, response, response_body)
+        return response_body, response
+
+    def _paginate(self, path, per_page=PER_PAGE, key=None):
+        """Yield the items of a list endpoint, fetching the next page
+        (as announced by the Link header) only when the previous one has
+        been consumed. For endpoints that wrap the list in an object, key
+        names the attribute holding it."""
+        path = "{}{}per_page={}".format(
+            path, "&" if "?" in path else "?", per_page)
+        host = "https://api.github.com"
+        while path:
+            response_body, response = self._send("GET", path, host=host)
+            yield from (response_body[key] if key else response_body)
+            path = response.links.get("next", {}).get("url")
+            host = ""  # next links are absolute urls
+
+    def connection_stats(self):
+        """Return the number of connections opened and the number of
+        requests that reused an already open keep-alive connection."""
+        return connection_stats([self.adapter])
+
+    @classmethod
+    def connection_report(cls):
+        return ("GitHub API connections: {opened} opened, {reused} requests"
+                " reused one".format(**connection_stats(cls.adapters)))
 
     def pulls(self, owner, repository):
-        return self._request("GET", "/repos/"
-                             "{}/{}/pulls".format(owner, repository))
+        return list(self.iter_pulls(owner, repository))
+
+    def iter_pulls(self, owner, repository, per_page=PER_PAGE):
+        return self._paginate("/repos/{}/{}/pulls".format(
+            owner, repository), per_page)
 
     def issues(self, owner, repository):
-        return self._request("GET", "/repos/"
-                             "{}/{}/issues".format(owner, repository))
+        return list(self.iter_issues(owner, repository))
+
+    def iter_issues(self, owner, repository, per_page=PER_PAGE):
+        return self._paginate("/repos/{}/{}/issues".format(
+            owner, repository), per_page)
 
     def issue(self, owner, repository, title, body):
         return self._request(
@@ -126,12 +276,18 @@ class GitHub (object):
             json.dumps({"title": title, "body": body or None}, sort_keys=True))
 
     def branches(self, owner, repository):
-        return self._request("GET", "/repos/"
-                             "{}/{}/branches".format(owner, repository))
+        return list(self.iter_branches(owner, repository))
+
+    def iter_branches(self, owner, repository, per_page=PER_PAGE):
+        return self._paginate("/repos/{}/{}/branches".format(
+            owner, repository), per_page)
 
     def tags(self, owner, repository):
-        return self._request("GET", "/repos/"
-                             "{}/{}/tags".format(owner, repository))
+        return list(self.iter_tags(owner, repository))
+
+    def iter_tags(self, owner, repository, per_page=PER_PAGE):
+        return self._paginate("/repos/{}/{}/tags".format(
+            owner, repository), per_page)
 
     def orgs(self, org):
         return self._request("GET", "/orgs/{}".format(org))
@@ -140,16 +296,47 @@ class GitHub (object):
         return self._request("GET", "/orgs/{}/events".format(org))
 
     def repos(self, org):
-        return self._request("GET", "/orgs/{}/repos?per_page=500".format(org))
+        return list(self.iter_repos(org))
+
+    def iter_repos(self, org, per_page=PER_PAGE):
+        return self._paginate("/orgs/{}/repos".format(org), per_page)
+
+    def search_issues(self, query, sort=None, order=None,
+                      per_page=PER_PAGE):
+        path = "/search/issues?q=" + urllib.parse.quote_plus(query)
+        if sort:
+            path += "&sort={}&order={}".format(sort, order or "desc")
+        return self._paginate(path, per_page, key="items")
+
+    def graphql(self, document, **variables):
+        response_body = self._request("POST", "/graphql", json.dumps(
+            {"query": document, "variables": variables}, sort_keys=True))
+        if response_body.get("errors"):
+            error = response_body["errors"][0]
+            e = requests.exceptions.RequestException(
+                200, error.get("message"))
+            e.body = error
+            raise e
+        return response_body["data"]
+
+    def graphql_search_pulls(self, query, per_page=PER_PAGE):
+        cursor = None
+        while True:
+            search = self.graphql(SEARCH_PULLS_QUERY, query=query,
+                                  first=per_page, cursor=cursor)["search"]
+            yield from search["nodes"]
+            if not search["pageInfo"]["hasNextPage"]:
+                return
+            cursor = search["pageInfo"]["endCursor"]
 
     def pull_request(self, owner, repository, head, base="master",
-                     title="", body=""):
+                     title="", body="", retry=None):
         return self._request("POST", "/repos/{}/{}/pulls".format(
             owner, repository),
             json.dumps({"title": title or head,
                         "body": body or "",
                         "head": head,
-                        "base": base}, sort_keys=True))
+                        "base": base}, sort_keys=True), retry=retry)
 
     def get_pull_request(self, owner, repository, pull_request_no):
         return self._request("GET", "/repos/{}/{}/pulls/{}".format(
@@ -164,15 +351,18 @@ class GitHub (object):
             owner, repository, pull_request_no), json.dumps(
                 body, sort_keys=True))
 
+    def delete_branch(self, owner, repository, branch):
+        return self._request(
+            "DELETE", "/repos/{}/{}/git/refs/heads/{}".format(
+                owner, repository, urllib.parse.quote(branch)))
+
     def get_current_repo(self):
+        url = remote_url(runner, "origin") or ""
         try:
-            owner, repository = subprocess.check_output(
-                "git remote -v", shell=True).decode().split(
-                ":")[1].split()[0].split("/")
-        except IndexError:
+            owner, repository = url.split(":")[1].split("/")
+        except (IndexError, ValueError):
             raise ValueError("Could not find a valid github remote")
         return owner, repository.split(".git")[0]
 
     def get_current_branch(self):
-        return subprocess.check_output(
-            "git rev-parse --abbrev-ref HEAD", shell=True).strip().decode()
+        return current_branch(runner)
@@ -13,19 +13,20 @@
 # limitations under the License.
 
 import sys
-import git_devbliss.github
 import time
+import concurrent.futures
+import git_devbliss.github
+from git_devbliss.git import fetcher, runner, version_key
 import requests
 import subprocess
-import os
 from docopt import docopt
-import pkg_resources
 
-__version__ = pkg_resources.get_distribution("git_devbliss").version
+# Number of repositories whose pull requests are fetched at once by overview.
+OVERVIEW_JOBS = 8
 
 
-def get_repository():
-    github = git_devbliss.github.GitHub()
+def get_repository(github=None):
+    github = github or git_devbliss.github.GitHub()
     try:
         owner, repository = github.get_current_repo()
     except subprocess.CalledProcessError as e:
@@ -41,72 +42,81 @@ def tags(repo_path=None):
     if repo_path:
         owner, repository = repo_path.split("/")
     else:
-        owner, repository = get_repository()
+        owner, repository = get_repository(github)
     try:
         req = github.tags(owner, repository)
     except requests.exceptions.RequestException as e:
+        if e.response is None:
+            # timeouts and connection errors are reported by github_runner
+            raise
         status, body = e.args
         print("Fatal:", status, body, file=sys.stderr)
         sys.exit(1)
     else:
-        print("\n".join(sorted(tag["name"] for tag in req)))
+        print("\n".join(sorted((tag["name"] for tag in req),
+                               key=version_key)))
 
 
-def pull_request(base_branch, maxretries):
+def no_commits_between(response):
+    # GitHub may need a few seconds to notice a branch that was just pushed
+    if response.status_code != 422:
+        return False
+    try:
+        errors = response.json().get("errors") or []
+    except ValueError:
+        return False
+    return any(str(i.get("message")).startswith("No commits between")
+               for i in errors)
+
+
+def pull_request(base_branch, maxretries, head=None):
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
+    owner, repository = get_repository(github)
     try:
         with open("pull_request.md") as f:
             pull_request_description = f.read()
     except (IOError, OSError):
         pull_request_description = ""
-    maxretries = 1 if maxretries < 1 else maxretries
-    while maxretries:
-        try:
-            req = github.pull_request(owner,
-                                      repository,
-                                      github.get_current_branch(),
-                                      base=base_branch,
-                                      body=pull_request_description)
-            maxretries = 0  # we got an answer so we're happy
-        except requests.exceptions.RequestException as e:
-            if e.response is not None:
-                status = e.response.status_code
-                body = e.response.json()
-                errors = [j for j in body["errors"]
-                          if j.get("message")]
-                # retry in case github needs a few seconds to realize the push
-                retry = [i for i in errors if str(i.get("message")).startswith(
-                    "No commits between")]
-                if status == 422:  # no commits between base and head branch
-                    if retry:
-                        maxretries = maxretries - 1
-                        time.sleep(1)
-                        if maxretries:
-                            continue
-                    if errors:
-                        for i in errors:
-                            print("Fatal: " + str(i.get("message") or i),
-                                  file=sys.stderr)
-                    else:
-                        print("Fatal: " + str(body), file=sys.stderr)
-                        print("Either the pull request already exists or there"
-                              " are no commits between the two branches.",
-                              file=sys.stderr)
-                    sys.exit(1)
-            else:
-                raise e
+    retry = git_devbliss.github.RetryPolicy(
+        max_attempts=maxretries, base_delay=1, retry_if=no_commits_between)
+    try:
+        req = github.pull_request(owner,
+                                  repository,
+                                  head or github.get_current_branch(),
+                                  base=base_branch,
+                                  body=pull_request_description,
+                                  retry=retry)
+    except requests.exceptions.RequestException as e:
+        if e.response is None or e.response.status_code != 422:
+            raise e
+        body = e.response.json()
+        errors = [j for j in body.get("errors", []) if j.get("message")]
+        if errors:
+            for i in errors:
+                print("Fatal: " + str(i.get("message") or i),
+                      file=sys.stderr)
+        else:
+            print("Fatal: " + str(body), file=sys.stderr)
+            print("Either the pull request already exists or there"
+                  " are no commits between the two branches.",
+                  file=sys.stderr)
+        sys.exit(1)
     print(req["html_url"])
 
 
 def pulls():
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
-    pulls = github.pulls(owner, repository)
-    if pulls:
-        print()
-        print("Pull Requests:")
+    owner, repository = get_repository(github)
+    print_pulls(github.iter_pulls(owner, repository))
+
+
+def print_pulls(pulls):
+    first = True
     for i in pulls:
+        if first:
+            print()
+            print("Pull Requests:")
+            first = False
         print("    #{}: {} <{}>".format(
             i["number"], i["title"], i["html_url"]))
     print()
@@ -114,20 +124,22 @@ def pulls():
 
 def status():
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
-    branches = github.branches(owner, repository)
-    print()
-    print("Tracking {}/{} <https://github.com/{}/{}>".format(
-        owner, repository, owner, repository))
-    print()
-    print("Branches:")
-    for i in branches:
-        url = "https://github.com/{}/{}/tree/{}".format(
-            owner, repository, i["name"])
-        print("    {} <{}>".format(i["name"], url))
-    pulls()
-    issues = [i for i in github.issues(owner, repository)
-              if "pull_request" not in i]
+    owner, repository = get_repository(github)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        branches = executor.submit(github.branches, owner, repository)
+        pulls = executor.submit(github.pulls, owner, repository)
+        issues = executor.submit(github.issues, owner, repository)
+        print()
+        print("Tracking {}/{} <https://github.com/{}/{}>".format(
+            owner, repository, owner, repository))
+        print()
+        print("Branches:")
+        for i in branches.result():
+            url = "https://github.com/{}/{}/tree/{}".format(
+                owner, repository, i["name"])
+            print("    {} <{}>".format(i["name"], url))
+        print_pulls(pulls.result())
+        issues = [i for i in issues.result() if "pull_request" not in i]
     if issues:
         print()
         print("Issues:")
@@ -139,39 +151,36 @@ def status():
 
 def issue(title=None):
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
-    try:
-        title = title or input("Title: ")
-        body = ""
-        print("Body (^D to finish):")
-        while True:
-            try:
-                body += input("") + "\n"
-            except EOFError:
-                break
-            except KeyboardInterrupt:
-                print()
-                sys.exit(2)
-        req = github.issue(owner, repository, title, body)
-    except requests.exceptions.RequestException as e:
-        if e.request:
-            status = e.request.status_code
-            body = e.request.body
-        else:
-            raise e
-        print("Fatal:", status, body, file=sys.stderr)
-        sys.exit(1)
+    owner, repository = get_repository(github)
+    title = title or input("Title: ")
+    body = ""
+    print("Body (^D to finish):")
+    while True:
+        try:
+            body += input("") + "\n"
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            print()
+            sys.exit(2)
+    # HTTP errors are reported with GitHub's message by github_runner
+    req = github.issue(owner, repository, title, body)
     print()
     print("    " + req["html_url"])
     print()
 
 
-def overview(owner):
-    github = git_devbliss.github.GitHub()
+def overview(owner, jobs=OVERVIEW_JOBS, engine="rest"):
+    if engine == "rest":
+        repositories = rest_overview(owner, jobs)
+    elif engine in ("search", "graphql"):
+        repositories = search_overview(owner, engine)
+    else:
+        print("Fatal: unknown engine {} (use rest, search or graphql)".format(
+            engine), file=sys.stderr)
+        sys.exit(2)
     first = True
-    for i in github.repos(owner):
-        repository = i["name"]
-        pulls = github.pulls(owner, repository)
+    for repository, pulls in repositories:
         if pulls:
             if first:
                 print()
@@ -183,15 +192,79 @@ def overview(owner):
             print()
 
 
+def delete_branches(branches, jobs):
+    jobs = max(jobs, 1)
+    github = git_devbliss.github.GitHub(
+        pool_maxsize=max(jobs, git_devbliss.github.POOL_MAXSIZE))
+    owner, repository = get_repository(github)
+    start = time.monotonic()
+    deleted = 0
+    # every request waits for the rate limiter, so the token's budget is
+    # respected however many run at once
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(github.delete_branch, owner, repository,
+                                   branch) for branch in branches]
+        for branch, future in zip(branches, futures):
+            try:
+                future.result()
+            except requests.exceptions.RequestException as e:
+                body = getattr(e, "body", None)
+                message = body.get("message") if isinstance(body, dict) \
+                    else None
+                print("Could not delete {}: {}".format(branch, message or e),
+                      file=sys.stderr)
+            else:
+                deleted += 1
+    print("Deleted {} of {} branches in {:.1f}s".format(
+        deleted, len(branches), time.monotonic() - start))
+
+
+def rest_overview(owner, jobs):
+    jobs = max(jobs, 1)
+    github = git_devbliss.github.GitHub(
+        pool_maxsize=max(jobs, git_devbliss.github.POOL_MAXSIZE))
+    repositories = sorted((i["name"] for i in github.iter_repos(owner)),
+                          key=str.lower)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(github.pulls, owner, repository)
+                   for repository in repositories]
+        try:
+            # yield in order as soon as all preceding repositories are done
+            for repository, future in zip(repositories, futures):
+                yield repository, future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def search_overview(owner, engine):
+    github = git_devbliss.github.GitHub()
+    query = "is:pr is:open org:{}".format(owner)
+    repositories = {}
+    if engine == "graphql":
+        for i in github.graphql_search_pulls(query + " sort:created-desc"):
+            repositories.setdefault(i["repository"]["name"], []).append({
+                "number": i["number"],
+                "title": i["title"],
+                "html_url": i["url"],
+            })
+    else:
+        for i in github.search_issues(query, sort="created"):
+            repository = i["repository_url"].rsplit("/", 1)[1]
+            repositories.setdefault(repository, []).append(i)
+    for repository in sorted(repositories, key=str.lower):
+        yield repository, repositories[repository]
+
+
 def merge_button(pull_request_no):
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
+    owner, repository = get_repository(github)
     pull_request = github.get_pull_request(owner, repository, pull_request_no)
     head = pull_request['head']['ref']
     response = github.merge_button(owner, repository, pull_request_no)
     if response.get('merged'):
-        output = subprocess.check_output(
-            "git push --delete origin {}".format(head), shell=True)
+        output = runner.output(["push", "--delete", "origin", head])
         print("Success: {}".format(response['message']))
         print(output)
     else:
@@ -201,18 +274,29 @@ def merge_button(pull_request_no):
 
 def review(pull_request_no):
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
-    pull_request = github.get_pull_request(owner, repository, pull_request_no)
+    owner, repository = get_repository(github)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        # the head of the pull request (also of one from a fork) can be
+        # fetched while its metadata is still being requested
+        fetched = executor.submit(
+            fetcher.fetch, "refs/pull/{}/head".format(pull_request_no))
+        pull_request = github.get_pull_request(
+            owner, repository, pull_request_no)
+        fetched.result()
     base, head = pull_request['base']['sha'], pull_request['head']['sha']
-    os.system("git fetch --quiet origin")
-    os.system("git diff --color=auto {}...{}".format(
-        base, head))
+    # the fetch of the head may have been skipped as fresh or have failed,
+    # and the pull request may have been force-pushed in the meantime
+    missing = [sha for sha in (base, head)
+               if runner.call(["cat-file", "-e", sha]) != 0]
+    if missing:
+        fetcher.fetch(*missing, force=True)
+    runner.call(["diff", "--color=auto", "{}...{}".format(base, head)])
 
 
 def close_pull_request(pull_request_no):
     body = {"state": "closed"}
     github = git_devbliss.github.GitHub()
-    owner, repository = get_repository()
+    owner, repository = get_repository(github)
     try:
         response = github.update_pull_request(
             owner, repository, pull_request_no, body)
@@ -226,19 +310,35 @@ def close_pull_request(pull_request_no):
     print()
 
 
+def configure(args):
+    github = git_devbliss.github.GitHub
+    github.use_cache = not args['--no-cache']
+    try:
+        github.connect_timeout = float(args['--connect-timeout'])
+        github.read_timeout = float(args['--read-timeout'])
+        if args['--deadline']:
+            github.deadline = git_devbliss.github.Deadline.parse(
+                args['--deadline'])
+    except ValueError as e:
+        print("Fatal: " + str(e), file=sys.stderr)
+        sys.exit(2)
+
+
 def github_runner(args):
     """Devbliss Github Client
 
 Usage:
-    github-devbliss pull-request [BASE_BRANCH] [MAXRETRIES]
-    github-devbliss review PULLNUMBER
-    github-devbliss open-pulls
-    github-devbliss merge-button PULLNUMBER
-    github-devbliss close-button PULLNUMBER
-    github-devbliss status
-    github-devbliss issue [TITLE]
-    github-devbliss tags [REPOSITORY]
-    github-devbliss overview ORG
+    github-devbliss [options] pull-request [--head=BRANCH] [BASE_BRANCH]
+                                           [MAXRETRIES]
+    github-devbliss [options] review PULLNUMBER
+    github-devbliss [options] open-pulls
+    github-devbliss [options] merge-button PULLNUMBER
+    github-devbliss [options] close-button PULLNUMBER
+    github-devbliss [options] status
+    github-devbliss [options] issue [TITLE]
+    github-devbliss [options] tags [REPOSITORY]
+    github-devbliss [options] overview ORG
+    github-devbliss [options] delete-branches BRANCH...
 
 Options:
     pull-request    Start a new pull request from the
@@ -252,12 +352,41 @@ Options:
     tags            List the current repository's tags
     overview        Show outstanding pull requests for an
                     entire organisation
+    delete-branches Delete the given branches of the current
+                    repository on GitHub
+    --head=BRANCH      Branch pull-request opens the pull request
+                       from instead of the current one
+    --no-cache         Do not use or update the response cache
+                       in ~/.cache/git-devbliss
+    -j N --jobs=N      Number of repositories overview fetches
+                       or branches delete-branches deletes
+                       concurrently [default: 8]
+    --stats            Report the rate limit budget used by
+                       the command and the connections it
+                       opened
+    --deadline=DURATION
+                       Abort if the command takes longer than
+                       DURATION (e.g. 90, 30s, 2m)
+    --connect-timeout=SECONDS
+                       Timeout for connecting to GitHub [default: 5]
+    --read-timeout=SECONDS
+                       Timeout for each read from GitHub
+                       [default: 30]
+    --engine=ENGINE    How overview finds open pull requests:
+                       rest (one request per repository), search
+                       or graphql (org wide search, limited to
+                       1000 results) [default: rest]
 """
+    stats = False
     try:
-        args = docopt(github_runner.__doc__, version=__version__, argv=args)
+        args = docopt(github_runner.__doc__, argv=args,
+                      version=git_devbliss.LazyVersion())
+        configure(args)
+        stats = args['--stats']
         if(args['pull-request']):
             pull_request(base_branch=args['BASE_BRANCH'] or 'master',
-                         maxretries=int(args['MAXRETRIES'] or 3))
+                         maxretries=int(args['MAXRETRIES'] or 3),
+                         head=args['--head'])
         elif(args['open-pulls']):
             pulls()
         elif(args['review']):
@@ -273,7 +402,10 @@ Options:
         elif(args['issue']):
             issue(args['TITLE'])
         elif(args['overview']):
-            overview(args['ORG'])
+            overview(args['ORG'], jobs=int(args['--jobs']),
+                     engine=args['--engine'])
+        elif(args['delete-branches']):
+            delete_branches(args['BRANCH'], jobs=int(args['--jobs']))
     except requests.exceptions.RequestException as e:
         if hasattr(e, "body"):
             try:
@@ -287,6 +419,12 @@ Options:
                 sys.exit(1)
         print(str(e), file=sys.stderr)
         sys.exit(1)
+    finally:
+        if stats:
+            print(git_devbliss.github.GitHub.rate_limiter.report(),
+                  file=sys.stderr)
+            print(git_devbliss.github.GitHub.connection_report(),
+                  file=sys.stderr)
 
 
 def main(args=None):
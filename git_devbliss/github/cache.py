@@ -0,0 +1,133 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or "~/.cache", "git-devbliss")
+MAX_SIZE = 20 * 1024 * 1024
+# Age in seconds after which a temporary file is taken to be left behind by
+# a writer that died, rather than being written right now.
+STALE_TMP = 3600
+
+
+class ResponseCache (object):
+    """On-disk cache of GitHub GET responses, revalidated with
+    If-None-Match / If-Modified-Since. Entries are keyed by url and a hash
+    of the token, so different accounts never share cached bodies."""
+
+    def __init__(self, directory=CACHE_DIR, max_size=MAX_SIZE):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        # bytes of the entries, counted by evict() and kept up to date by
+        # set(), so that the directory is only scanned when it may be over
+        # budget
+        self.size = None
+        self.lock = threading.Lock()
+
+    def _path(self, url, token):
+        identity = hashlib.sha256(token.encode()).hexdigest()
+        key = hashlib.sha256((identity + " " + url).encode()).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, url, token):
+        path = self._path(url, token)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path, None)  # mark as recently used
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def validators(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def set(self, url, token, response, body):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "link": response.headers.get("Link"),
+            "body": body,
+        }
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, self._path(url, token))
+            tmp = None
+        except (IOError, OSError):
+            return
+        finally:
+            if tmp:
+                _remove(tmp)
+        with self.lock:
+            if self.size is not None:
+                # a replaced entry is counted twice until the next scan
+                self.size += size
+                if self.size <= self.max_size:
+                    return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits into
+        max_size bytes, and temporary files left behind by dead writers."""
+        entries = []
+        stale = time.time() - STALE_TMP
+        for name in os.listdir(self.directory):
+            if not name.endswith((".json", ".tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".json"):
+                entries.append((stat.st_mtime, stat.st_size, path))
+            elif stat.st_mtime < stale:
+                _remove(path)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            _remove(path)
+            total -= size
+        with self.lock:
+            self.size = total
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
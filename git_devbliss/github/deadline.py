@@ -0,0 +1,55 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import time
+import requests
+
+UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class DeadlineExceeded (requests.exceptions.Timeout):
+    pass
+
+
+class Deadline (object):
+    """Time budget of a whole command. Request timeouts are capped at the
+    time that is left and requests fail with DeadlineExceeded once the
+    budget is used up."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    @classmethod
+    def parse(cls, value):
+        """Create a deadline from a duration such as 90, 30s, 2m or 1h."""
+        match = re.match(r"^(\d+(?:\.\d+)?)(ms|s|m|h)?$", value.strip())
+        if not match:
+            raise ValueError("Invalid duration: {}".format(value))
+        return cls(float(match.group(1)) * UNITS[match.group(2) or "s"])
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def check(self, needed=0):
+        if self.remaining() <= needed:
+            raise DeadlineExceeded(
+                "Aborting: the deadline of {:g}s has been exceeded".format(
+                    self.seconds))
+
+    def timeout(self, connect, read):
+        self.check()
+        remaining = self.remaining()
+        return (min(connect, remaining), min(read, remaining))
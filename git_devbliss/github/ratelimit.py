@@ -0,0 +1,123 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+import time
+import requests
+
+# Share of each rate limit bucket that is left untouched for other users
+# of the token. Requests pause until the bucket resets once it is reached.
+RESERVE = 0.02
+# Longest pause (in seconds) before giving up instead of waiting.
+MAX_WAIT = 90
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def resource(url):
+    if "/search/" in url:
+        return "search"
+    if url.endswith("/graphql"):
+        return "graphql"
+    return "core"
+
+
+class RateLimiter (object):
+    """Tracks the X-RateLimit-* headers of every response per resource
+    (core, search, graphql) and pauses requests before the budget of the
+    token is exhausted."""
+
+    def __init__(self, reserve=RESERVE, max_wait=MAX_WAIT):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.used = {}
+
+    def throttle(self, url):
+        """Return the number of seconds to pause before sending a request to
+        url, or 0 if the budget of its resource allows it right away."""
+        name = resource(url)
+        with self.lock:
+            bucket = self.buckets.get(name)
+            if not bucket:
+                return 0
+            delay = bucket["reset"] - time.time()
+            if (bucket["remaining"] > int(bucket["limit"] * self.reserve)
+                    or delay <= 0):
+                return 0
+        if delay > self.max_wait:
+            e = requests.exceptions.RequestException(
+                403, "rate limit exhausted")
+            e.body = {"message": "GitHub {} rate limit nearly exhausted ({}"
+                      " requests left), resets at {}".format(
+                          name, bucket["remaining"], time.strftime(
+                              "%H:%M:%S", time.localtime(bucket["reset"])))}
+            raise e
+        return delay
+
+    def update(self, response):
+        """Record the rate limit headers of response. Returns the number of
+        seconds to wait before retrying if the request was rejected by the
+        primary or secondary rate limit, None otherwise."""
+        headers = response.headers
+        name = headers.get("X-RateLimit-Resource") or "core"
+        limit = _int(headers.get("X-RateLimit-Limit"))
+        remaining = _int(headers.get("X-RateLimit-Remaining"))
+        reset = _int(headers.get("X-RateLimit-Reset"))
+        with self.lock:
+            if response.status_code != 304:
+                self.used[name] = self.used.get(name, 0) + 1
+            if None not in (limit, remaining, reset):
+                bucket = self.buckets.setdefault(name, {"reset": 0})
+                # responses of concurrent requests may arrive out of order
+                if reset > bucket["reset"] or \
+                        remaining < bucket["remaining"]:
+                    bucket.update(
+                        limit=limit, remaining=remaining, reset=reset)
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = _int(headers.get("Retry-After"))
+        if retry_after is not None:
+            delay = retry_after
+        elif remaining == 0 and reset:
+            delay = reset - time.time()
+        else:
+            return None
+        return max(delay, 0) if delay <= self.max_wait else None
+
+    def pause(self, delay):
+        print("Waiting {:.0f}s for the GitHub rate limit...".format(delay),
+              file=sys.stderr)
+        time.sleep(delay)
+
+    def report(self):
+        if not self.used:
+            return "GitHub API: no requests counted against the rate limit"
+        parts = []
+        for name in sorted(self.used):
+            part = "{}: {} used".format(name, self.used[name])
+            bucket = self.buckets.get(name)
+            if bucket:
+                part += ", {}/{} left, resets at {}".format(
+                    bucket["remaining"], bucket["limit"], time.strftime(
+                        "%H:%M:%S", time.localtime(bucket["reset"])))
+            parts.append(part)
+        return "GitHub API rate limit budget: " + "; ".join(parts)
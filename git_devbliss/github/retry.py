@@ -0,0 +1,61 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import requests
+
+RETRY_STATUSES = frozenset((500, 502, 503, 504))
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class RetryPolicy (object):
+    """Decides whether a failed request is retried and how long to wait
+    before the next attempt (exponential backoff with full jitter).
+
+    Requests that may have had an effect on the server (POST, PATCH) are
+    only retried when the connection could not be established at all, or
+    when retry_if(response) explicitly says the response is safe to
+    retry."""
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=8,
+                 jitter=True, statuses=RETRY_STATUSES,
+                 methods=IDEMPOTENT_METHODS, retry_if=None):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.statuses = statuses
+        self.methods = methods
+        self.retry_if = retry_if
+
+    def delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def retry_error(self, method, attempt, error):
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True  # nothing has been sent yet
+        return (method in self.methods and isinstance(error, (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout)))
+
+    def retry_response(self, method, attempt, response):
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if self.retry_if and self.retry_if(response):
+            return True
+        return (method in self.methods and
+                response.status_code in self.statuses)
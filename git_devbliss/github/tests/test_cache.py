@@ -0,0 +1,127 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+from git_devbliss.github.cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def response(self, **headers):
+        return unittest.mock.Mock(headers=headers)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get('test_url', 'test_token'))
+
+    def test_set_get(self):
+        self.cache.set('test_url', 'test_token', self.response(
+            ETag='"test_etag"', **{'Last-Modified': 'test_date'}),
+            [{'name': 'test'}])
+        entry = self.cache.get('test_url', 'test_token')
+        self.assertEqual(entry['body'], [{'name': 'test'}])
+        self.assertEqual(self.cache.validators(entry), {
+            'If-None-Match': '"test_etag"',
+            'If-Modified-Since': 'test_date',
+        })
+
+    def test_keyed_by_token(self):
+        self.cache.set('test_url', 'test_token', self.response(
+            ETag='"test_etag"'), {})
+        self.assertIsNone(self.cache.get('test_url', 'other_token'))
+        for name in os.listdir(self.directory.name):
+            with open(os.path.join(self.directory.name, name)) as f:
+                self.assertNotIn('test_token', f.read())
+
+    def test_set_without_validators(self):
+        self.cache.set('test_url', 'test_token', self.response(), {})
+        self.assertIsNone(self.cache.get('test_url', 'test_token'))
+
+    def test_evict_least_recently_used(self):
+        for i, url in enumerate(('url1', 'url2', 'url3')):
+            self.cache.set(url, 'test_token', self.response(ETag='x'),
+                           'x' * 100)
+            path = self.cache._path(url, 'test_token')
+            os.utime(path, (i, i))
+        self.cache.max_size = 400
+        os.utime(self.cache._path('url1', 'test_token'), (10, 10))
+        self.cache.evict()
+        self.assertIsNotNone(self.cache.get('url1', 'test_token'))
+        self.assertIsNone(self.cache.get('url2', 'test_token'))
+        self.assertIsNotNone(self.cache.get('url3', 'test_token'))
+
+    @unittest.mock.patch('os.makedirs')
+    def test_set_unwritable(self, makedirs):
+        makedirs.side_effect = PermissionError()
+        self.cache.set('test_url', 'test_token', self.response(ETag='x'), {})
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_evict_skips(self):
+        self.cache.set('test_url', 'test_token', self.response(ETag='x'),
+                       'x' * 100)
+        with open(os.path.join(self.directory.name, 'x.tmp'), 'w') as f:
+            f.write('x' * 100)
+        self.cache.max_size = 0
+        # entries removed by another process in the meantime
+        with unittest.mock.patch('os.stat', side_effect=OSError()):
+            self.cache.evict()
+        self.assertIsNotNone(self.cache.get('test_url', 'test_token'))
+        with unittest.mock.patch('os.remove', side_effect=OSError()):
+            self.cache.evict()
+        self.assertIsNotNone(self.cache.get('test_url', 'test_token'))
+        self.cache.evict()
+        self.assertEqual(os.listdir(self.directory.name), ['x.tmp'])
+
+    @unittest.mock.patch('os.replace')
+    def test_set_failed(self, replace):
+        replace.side_effect = PermissionError()
+        self.cache.set('test_url', 'test_token', self.response(ETag='x'), {})
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_evict_stale_tmp(self):
+        for name in ('stale.tmp', 'fresh.tmp', 'other'):
+            with open(os.path.join(self.directory.name, name), 'w'):
+                pass
+        for name in ('stale.tmp', 'other'):
+            os.utime(os.path.join(self.directory.name, name), (0, 0))
+        self.cache.evict()
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ['fresh.tmp', 'other'])
+
+    def test_evict_only_over_budget(self):
+        self.cache.max_size = 1000
+        self.cache.set('url0', 'test_token', self.response(ETag='x'),
+                       'x' * 100)
+        self.assertGreater(self.cache.size, 100)
+        with unittest.mock.patch('os.listdir',
+                                 wraps=os.listdir) as listdir:
+            for url in ('url1', 'url2', 'url3', 'url4'):
+                self.cache.set(url, 'test_token', self.response(ETag='x'),
+                               'x' * 100)
+            self.assertEqual(listdir.call_count, 0)
+            for url in ('url5', 'url6', 'url7'):
+                self.cache.set(url, 'test_token', self.response(ETag='x'),
+                               'x' * 100)
+            self.assertGreater(listdir.call_count, 0)
+        self.assertLessEqual(self.cache.size, 1000)
+        self.assertLessEqual(len(os.listdir(self.directory.name)), 6)
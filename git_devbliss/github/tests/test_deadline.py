@@ -0,0 +1,48 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import unittest.mock
+import requests
+from git_devbliss.github.deadline import Deadline, DeadlineExceeded
+
+
+@unittest.mock.patch("time.monotonic", return_value=100)
+class DeadlineTest(unittest.TestCase):
+
+    def test_parse(self, monotonic):
+        self.assertEqual(Deadline.parse('90').seconds, 90)
+        self.assertEqual(Deadline.parse('30s').seconds, 30)
+        self.assertEqual(Deadline.parse('2m').seconds, 120)
+        self.assertEqual(Deadline.parse('1h').seconds, 3600)
+        self.assertEqual(Deadline.parse('500ms').seconds, 0.5)
+        with self.assertRaises(ValueError):
+            Deadline.parse('soon')
+
+    def test_timeout(self, monotonic):
+        deadline = Deadline(30)
+        self.assertEqual(deadline.timeout(5, 60), (5, 30))
+        monotonic.return_value = 127
+        self.assertEqual(deadline.timeout(5, 60), (3, 3))
+
+    def test_exceeded(self, monotonic):
+        deadline = Deadline(30)
+        deadline.check(10)
+        with self.assertRaises(DeadlineExceeded):
+            deadline.check(31)
+        monotonic.return_value = 130
+        with self.assertRaises(requests.exceptions.Timeout) as e:
+            deadline.timeout(5, 30)
+        self.assertEqual(str(e.exception),
+                         'Aborting: the deadline of 30s has been exceeded')
@@ -18,6 +18,8 @@ import git_devbliss.github
 import sys
 from unittest.mock import call
 import requests
+import json
+import tempfile
 
 
 class GitHubTest(unittest.TestCase):
@@ -49,7 +51,7 @@ class GitHubTest(unittest.TestCase):
         ])
 
     @unittest.mock.patch("builtins.print")
-    @unittest.mock.patch("requests.post")
+    @unittest.mock.patch("requests.Session.post")
     @unittest.mock.patch("getpass.getpass")
     @unittest.mock.patch("builtins.input")
     @unittest.mock.patch("os.path.exists")
@@ -72,7 +74,8 @@ class GitHubTest(unittest.TestCase):
                  headers={'User-Agent': 'git-devbliss/ng',
                           'Content-Type': 'application/json'},
                  auth=('test_username', 'test_pass'),
-                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}'),
+                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
+                 timeout=(5, 30)),
             call().json()
         ])
 
@@ -83,7 +86,7 @@ class GitHubTest(unittest.TestCase):
                                           file=sys.stderr)
 
     @unittest.mock.patch("builtins.print")
-    @unittest.mock.patch("requests.post")
+    @unittest.mock.patch("requests.Session.post")
     @unittest.mock.patch("getpass.getpass")
     @unittest.mock.patch("builtins.input")
     @unittest.mock.patch("os.path.exists")
@@ -106,7 +109,8 @@ class GitHubTest(unittest.TestCase):
                  headers={'User-Agent': 'git-devbliss/ng',
                           'Content-Type': 'application/json'},
                  auth=('test_username', 'test_pass'),
-                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}'),
+                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
+                 timeout=(5, 30)),
             call().json()
         ])
         input_function.assert_has_calls([
@@ -125,7 +129,7 @@ class GitHubTest(unittest.TestCase):
         ])
 
     @unittest.mock.patch("builtins.print")
-    @unittest.mock.patch("requests.post")
+    @unittest.mock.patch("requests.Session.post")
     @unittest.mock.patch("getpass.getpass")
     @unittest.mock.patch("builtins.input")
     @unittest.mock.patch("os.path.exists")
@@ -149,7 +153,8 @@ class GitHubTest(unittest.TestCase):
                  headers={'User-Agent': 'git-devbliss/ng',
                           'Content-Type': 'application/json'},
                  auth=('test_username', 'test_pass'),
-                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}'),
+                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
+                 timeout=(5, 30)),
             call().json()
         ])
         input_function.assert_has_calls([
@@ -161,7 +166,7 @@ class GitHubTest(unittest.TestCase):
         ])
 
     @unittest.mock.patch("builtins.print")
-    @unittest.mock.patch("requests.post")
+    @unittest.mock.patch("requests.Session.post")
     @unittest.mock.patch("getpass.getpass")
     @unittest.mock.patch("builtins.input")
     @unittest.mock.patch("os.path.exists")
@@ -185,7 +190,8 @@ class GitHubTest(unittest.TestCase):
                  headers={'User-Agent': 'git-devbliss/ng',
                           'Content-Type': 'application/json'},
                  auth=('test_username', 'test_pass'),
-                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}'),
+                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
+                 timeout=(5, 30)),
             call().json()
         ])
         input_function.assert_has_calls([
@@ -196,7 +202,7 @@ class GitHubTest(unittest.TestCase):
         ])
 
     @unittest.mock.patch("builtins.print")
-    @unittest.mock.patch("requests.post")
+    @unittest.mock.patch("requests.Session.post")
     @unittest.mock.patch("getpass.getpass")
     @unittest.mock.patch("builtins.input")
     @unittest.mock.patch("os.path.exists")
@@ -234,13 +240,14 @@ class GitHubTest(unittest.TestCase):
                  headers={'Content-Type': 'application/json',
                           'User-Agent': 'git-devbliss/ng'},
                  auth=('test_username', 'test_pass'),
-                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}'),
+                 data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
+                 timeout=(5, 30)),
             call().json()
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch("builtins.print")
-    @unittest.mock.patch("requests.post")
+    @unittest.mock.patch("requests.Session.post")
     @unittest.mock.patch("getpass.getpass")
     @unittest.mock.patch("builtins.input")
     @unittest.mock.patch("os.path.exists")
@@ -284,13 +291,13 @@ class GitHubTest(unittest.TestCase):
                  data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
                  headers={'User-Agent': 'git-devbliss/ng',
                           'Content-Type': 'application/json'},
-                 auth=('test_username', 'test_pass')),
+                 auth=('test_username', 'test_pass'), timeout=(5, 30)),
             call('https://api.github.com/authorizations',
                  data='{"note": "git-devbliss-ng", "scopes": ["repo"]}',
                  headers={'User-Agent': 'git-devbliss/ng',
                           'X-GitHub-OTP': 'two_factor_code',
                           'Content-Type': 'application/json'},
-                 auth=('test_username', 'test_pass'))
+                 auth=('test_username', 'test_pass'), timeout=(5, 30))
         ])
         input_function.assert_has_calls([
             call('GitHub username: '),
@@ -298,12 +305,13 @@ class GitHubTest(unittest.TestCase):
         ])
         self.assertEqual(print_function.call_count, 0)
 
-    @unittest.mock.patch("requests.request")
+    @unittest.mock.patch("requests.Session.request")
     @unittest.mock.patch("os.path.exists")
     def test_request_400(self, exists, request):
         exists.return_value = True
         request.return_value = unittest.mock.Mock()
         request.return_value.status_code = 400
+        request.return_value.headers = {}
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
@@ -317,12 +325,12 @@ class GitHubTest(unittest.TestCase):
                  headers={'User-Agent': 'git-devbliss/ng',
                           'Content-Type': 'application/json',
                           'Authorization': 'bearer test_token'},
-                 data='test_body'),
+                 data='test_body', timeout=(5, 30)),
             call().json()
         ])
 
     @unittest.mock.patch("git_devbliss.github.GitHub._interactive_login")
-    @unittest.mock.patch("requests.request")
+    @unittest.mock.patch("requests.Session.request")
     @unittest.mock.patch("os.path.exists")
     def test_request_401(self, exists, request, login):
         exists.return_value = True
@@ -345,16 +353,16 @@ class GitHubTest(unittest.TestCase):
                  headers={'Content-Type': 'application/json',
                           'User-Agent': 'git-devbliss/ng',
                           'Authorization': 'bearer test_token'},
-                 data='test_body'),
+                 data='test_body', timeout=(5, 30)),
             call('test_method', 'test_hosttest_path',
                  headers={'Content-Type': 'application/json',
                           'User-Agent': 'git-devbliss/ng',
                           'Authorization': 'bearer test_token'},
-                 data='test_body'),
+                 data='test_body', timeout=(5, 30)),
         ])
         exists.assert_called_with(gh.token_file)
 
-    @unittest.mock.patch("requests.request")
+    @unittest.mock.patch("requests.Session.request")
     @unittest.mock.patch("os.path.exists")
     def test_request_301(self, exists, request):
         exists.return_value = True
@@ -377,40 +385,258 @@ class GitHubTest(unittest.TestCase):
                 'Content-Type': 'application/json',
                 'Authorization': 'bearer test_token',
                 'User-Agent': 'git-devbliss/ng'},
-                data='test_body'),
+                data='test_body', timeout=(5, 30)),
             call('test_method', 'test_hosttest_location', headers={
                 'Content-Type': 'application/json',
                 'Authorization': 'bearer test_token',
                 'User-Agent': 'git-devbliss/ng'},
-                data='test_body'),
+                data='test_body', timeout=(5, 30)),
         ])
         exists.assert_called_with(gh.token_file)
 
-    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("git_devbliss.github.GitHub.rate_limiter",
+                         git_devbliss.github.RateLimiter())
+    @unittest.mock.patch("builtins.print")
+    @unittest.mock.patch("time.sleep")
+    @unittest.mock.patch("requests.Session.request")
     @unittest.mock.patch("os.path.exists")
-    def test_pulls(self, exists, request):
+    def test_request_secondary_rate_limit(self, exists, request, sleep,
+                                          print_function):
         exists.return_value = True
+        mock_403 = unittest.mock.Mock()
+        mock_403.status_code = 403
+        mock_403.headers = {'Retry-After': '5'}
+        mock_200 = unittest.mock.Mock()
+        mock_200.status_code = 200
+        mock_200.headers = {}
+        request.side_effect = [mock_403, mock_200]
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            gh._request('test_method', 'test_path',
+                        'test_body', 'test_host')
+        sleep.assert_called_once_with(5)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(gh.rate_limiter.used, {'core': 2})
+
+    @unittest.mock.patch("time.sleep")
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_retry(self, exists, request, sleep):
+        exists.return_value = True
+        mock_502 = unittest.mock.Mock(status_code=502, headers={})
+        mock_200 = unittest.mock.Mock(status_code=200, headers={})
+        request.side_effect = [
+            requests.exceptions.ConnectionError(), mock_502, mock_200]
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            gh._request('PUT', 'test_path', 'test_body', 'test_host')
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @unittest.mock.patch("time.sleep")
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_retry_exhausted(self, exists, request, sleep):
+        exists.return_value = True
+        request.return_value = unittest.mock.Mock(status_code=503,
+                                                  headers={})
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            with self.assertRaises(
+                    requests.exceptions.RequestException) as e:
+                gh._request('PUT', 'test_path', 'test_body', 'test_host',
+                            retry=git_devbliss.github.RetryPolicy(
+                                max_attempts=2))
+        self.assertIs(e.exception.response, request.return_value)
+        self.assertEqual(request.call_count, 2)
+
+    @unittest.mock.patch("time.sleep")
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_post_not_retried(self, exists, request, sleep):
+        exists.return_value = True
+        request.side_effect = requests.exceptions.ConnectionError()
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                gh._request('POST', 'test_path', 'test_body', 'test_host')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(sleep.call_count, 0)
+
+    @unittest.mock.patch("time.sleep")
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_deadline(self, exists, request, sleep):
+        exists.return_value = True
+        request.return_value = unittest.mock.Mock(status_code=503,
+                                                  headers={})
+        deadline = unittest.mock.Mock()
+        deadline.timeout.return_value = (1, 2)
+        deadline.check.side_effect = [
+            None, git_devbliss.github.DeadlineExceeded('test_exceeded')]
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            gh.deadline = deadline
+            with self.assertRaises(git_devbliss.github.DeadlineExceeded):
+                gh._request('GET', 'test_path', 'test_body', 'test_host')
+        deadline.timeout.assert_called_with(5, 30)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(request.call_args[1]['timeout'], (1, 2))
+        self.assertEqual(sleep.call_count, 1)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.rate_limiter")
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_throttled_deadline(self, exists, request,
+                                        rate_limiter):
+        exists.return_value = True
+        rate_limiter.throttle.return_value = 3
+        deadline = unittest.mock.Mock()
+        deadline.timeout.side_effect = git_devbliss.github.DeadlineExceeded(
+            'test_exceeded')
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            gh.deadline = deadline
+            with self.assertRaises(git_devbliss.github.DeadlineExceeded):
+                gh._request('GET', 'test_path', 'test_body', 'test_host')
+        deadline.check.assert_called_once_with(3)
+        rate_limiter.pause.assert_called_once_with(3)
+        self.assertEqual(request.call_count, 0)
+
+    @unittest.mock.patch("os.path.exists")
+    def test_connection_pool(self, exists):
+        exists.return_value = True
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub(pool_connections=2,
+                                            pool_maxsize=5)
+        self.assertIs(gh.session.get_adapter('https://api.github.com'),
+                      gh.adapter)
+        pool = gh.adapter.poolmanager.connection_from_url(
+            'https://api.github.com')
+        self.assertEqual(pool.pool.maxsize, 5)
+        self.assertEqual(gh.connection_stats(), {'opened': 0, 'reused': 0})
+        pool.num_connections = 1
+        pool.num_requests = 7
+        self.assertEqual(gh.connection_stats(), {'opened': 1, 'reused': 6})
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.adapters", [])
+    @unittest.mock.patch("os.path.exists")
+    def test_connection_report(self, exists):
+        exists.return_value = True
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            first = git_devbliss.github.GitHub()
+            second = git_devbliss.github.GitHub()
+        for gh, requests_sent in ((first, 3), (second, 2)):
+            pool = gh.adapter.poolmanager.connection_from_url(
+                'https://api.github.com')
+            pool.num_connections = 1
+            pool.num_requests = requests_sent
+        self.assertEqual(git_devbliss.github.GitHub.connection_report(),
+                         'GitHub API connections: 2 opened, 3 requests'
+                         ' reused one')
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.use_cache", False)
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_reuses_session(self, exists, request):
+        exists.return_value = True
+        request.return_value = unittest.mock.Mock()
+        request.return_value.status_code = 200
+        request.return_value.json.return_value = []
+        request.return_value.links = {}
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            session = gh.session
+            gh.pulls('test_user', 'test_repo')
+            gh.issues('test_user', 'test_repo')
+        self.assertIs(gh.session, session)
+        self.assertEqual(request.call_count, 2)
+
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_request_not_modified(self, exists, request):
+        exists.return_value = True
+        mock_200 = unittest.mock.Mock()
+        mock_200.status_code = 200
+        mock_200.json.return_value = [{'name': 'master'}]
+        mock_200.headers = {'ETag': '"test_etag"', 'Link': 'test_link'}
+        mock_304 = unittest.mock.Mock()
+        mock_304.status_code = 304
+        mock_304.headers = {}
+        request.side_effect = [mock_200, mock_304]
+        with tempfile.TemporaryDirectory() as directory:
+            with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                     read_data='test_token')):
+                gh = git_devbliss.github.GitHub()
+            gh.cache = git_devbliss.github.cache.ResponseCache(directory)
+            self.assertEqual(gh._request('GET', '/test_path'),
+                             [{'name': 'master'}])
+            body, response = gh._send('GET', '/test_path')
+        self.assertEqual(body, [{'name': 'master'}])
+        self.assertIs(response, mock_304)
+        self.assertEqual(mock_304.headers, {'Link': 'test_link'})
+        self.assertEqual(mock_304.json.call_count, 0)
+        request.assert_has_calls([
+            call('GET', 'https://api.github.com/test_path', data=None,
+                 headers={'Content-Type': 'application/json',
+                          'Authorization': 'bearer test_token',
+                          'User-Agent': 'git-devbliss/ng'},
+                 timeout=(5, 30)),
+            call('GET', 'https://api.github.com/test_path', data=None,
+                 headers={'Content-Type': 'application/json',
+                          'Authorization': 'bearer test_token',
+                          'User-Agent': 'git-devbliss/ng',
+                          'If-None-Match': '"test_etag"'},
+                 timeout=(5, 30)),
+        ])
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.use_cache", False)
+    @unittest.mock.patch("os.path.exists")
+    def test_no_cache(self, exists):
+        exists.return_value = True
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+        self.assertIsNone(gh.cache)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
+    @unittest.mock.patch("os.path.exists")
+    def test_pulls(self, exists, send):
+        exists.return_value = True
+        send.return_value = ([], unittest.mock.Mock(links={}))
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
             gh.pulls('test_user', 'test_repo')
-            request.assert_called_once_with(
-                'GET', '/repos/test_user/test_repo/pulls')
+            send.assert_called_once_with(
+                'GET', '/repos/test_user/test_repo/pulls?per_page=100',
+                host='https://api.github.com')
 
-    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
     @unittest.mock.patch("os.path.exists")
-    def test_issues(self, exists, request):
+    def test_issues(self, exists, send):
         exists.return_value = True
+        send.return_value = ([], unittest.mock.Mock(links={}))
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
             gh.issues('test_user', 'test_repo')
-            request.assert_called_once_with(
-                'GET', '/repos/test_user/test_repo/issues')
+            send.assert_called_once_with(
+                'GET', '/repos/test_user/test_repo/issues?per_page=100',
+                host='https://api.github.com')
 
     @unittest.mock.patch("git_devbliss.github.GitHub._request")
     @unittest.mock.patch("os.path.exists")
@@ -426,31 +652,35 @@ class GitHubTest(unittest.TestCase):
                 'POST', '/repos/test_user/test_repo/issues',
                 '{"body": "test_body", "title": "test_title"}')
 
-    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
     @unittest.mock.patch("os.path.exists")
-    def test_branches(self, exists, request):
+    def test_branches(self, exists, send):
         exists.return_value = True
+        send.return_value = ([], unittest.mock.Mock(links={}))
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
             gh.branches('test_user', 'test_repo')
-            request.assert_called_once_with(
-                'GET', '/repos/test_user/test_repo/branches')
+            send.assert_called_once_with(
+                'GET', '/repos/test_user/test_repo/branches?per_page=100',
+                host='https://api.github.com')
 
-    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
     @unittest.mock.patch("os.path.exists")
-    def test_tags(self, exists, request):
+    def test_tags(self, exists, send):
         exists.return_value = True
+        send.return_value = ([], unittest.mock.Mock(links={}))
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
             gh.tags('test_user', 'test_repo')
-            request.assert_called_once_with(
-                'GET', '/repos/test_user/test_repo/tags')
+            send.assert_called_once_with(
+                'GET', '/repos/test_user/test_repo/tags?per_page=100',
+                host='https://api.github.com')
 
     @unittest.mock.patch("git_devbliss.github.GitHub._request")
     @unittest.mock.patch("os.path.exists")
@@ -478,18 +708,97 @@ class GitHubTest(unittest.TestCase):
             request.assert_called_once_with(
                 'GET', '/orgs/test_org/events')
 
-    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
     @unittest.mock.patch("os.path.exists")
-    def test_repos(self, exists, request):
+    def test_repos(self, exists, send):
         exists.return_value = True
+        send.return_value = ([], unittest.mock.Mock(links={}))
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
             gh.repos('test_org')
-            request.assert_called_once_with(
-                'GET', '/orgs/test_org/repos?per_page=500')
+            send.assert_called_once_with(
+                'GET', '/orgs/test_org/repos?per_page=100',
+                host='https://api.github.com')
+
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
+    @unittest.mock.patch("os.path.exists")
+    def test_iter_repos_follows_next_link(self, exists, send):
+        exists.return_value = True
+        next_url = 'https://api.github.com/orgs/test_org/repos?page=2'
+        send.side_effect = [
+            ([{'name': 'repo1'}, {'name': 'repo2'}], unittest.mock.Mock(
+                links={'next': {'url': next_url, 'rel': 'next'}})),
+            ([{'name': 'repo3'}], unittest.mock.Mock(links={})),
+        ]
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            repos = gh.iter_repos('test_org', per_page=2)
+            self.assertEqual(next(repos), {'name': 'repo1'})
+            self.assertEqual(next(repos), {'name': 'repo2'})
+            self.assertEqual(send.call_count, 1)
+            self.assertEqual(list(repos), [{'name': 'repo3'}])
+        send.assert_has_calls([
+            call('GET', '/orgs/test_org/repos?per_page=2',
+                 host='https://api.github.com'),
+            call('GET', next_url, host=''),
+        ])
+
+    @unittest.mock.patch("git_devbliss.github.GitHub._send")
+    @unittest.mock.patch("os.path.exists")
+    def test_search_issues(self, exists, send):
+        exists.return_value = True
+        send.return_value = ({'total_count': 1, 'items': [{'number': 1}]},
+                             unittest.mock.Mock(links={}))
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            self.assertEqual(
+                list(gh.search_issues('is:pr org:test_org', sort='created')),
+                [{'number': 1}])
+            send.assert_called_once_with(
+                'GET', '/search/issues?q=is%3Apr+org%3Atest_org'
+                '&sort=created&order=desc&per_page=100',
+                host='https://api.github.com')
+
+    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("os.path.exists")
+    def test_graphql_search_pulls(self, exists, request):
+        exists.return_value = True
+        request.side_effect = [
+            {'data': {'search': {
+                'pageInfo': {'hasNextPage': True, 'endCursor': 'c1'},
+                'nodes': [{'number': 1}]}}},
+            {'data': {'search': {
+                'pageInfo': {'hasNextPage': False, 'endCursor': 'c2'},
+                'nodes': [{'number': 2}]}}},
+        ]
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            self.assertEqual(list(gh.graphql_search_pulls('test_query')),
+                             [{'number': 1}, {'number': 2}])
+        self.assertEqual(request.call_count, 2)
+        body = json.loads(request.call_args[0][2])
+        self.assertEqual(body['variables'], {
+            'query': 'test_query', 'first': 100, 'cursor': 'c1'})
+        self.assertEqual(request.call_args[0][:2], ('POST', '/graphql'))
+
+    @unittest.mock.patch("git_devbliss.github.GitHub._request")
+    @unittest.mock.patch("os.path.exists")
+    def test_graphql_error(self, exists, request):
+        exists.return_value = True
+        request.return_value = {'errors': [{'message': 'test_error'}]}
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            with self.assertRaises(
+                    requests.exceptions.RequestException) as context:
+                gh.graphql('test_query')
+        self.assertEqual(context.exception.body, {'message': 'test_error'})
 
     @unittest.mock.patch("git_devbliss.github.GitHub._request")
     @unittest.mock.patch("os.path.exists")
@@ -505,7 +814,7 @@ class GitHubTest(unittest.TestCase):
             request.assert_called_once_with(
                 'POST', '/repos/test_user/test_repo/pulls',
                 '{"base": "test_base", "body": "test_body", '
-                '"head": "test_head", "title": "test_title"}')
+                '"head": "test_head", "title": "test_title"}', retry=None)
 
     @unittest.mock.patch("git_devbliss.github.GitHub._request")
     @unittest.mock.patch("os.path.exists")
@@ -533,6 +842,23 @@ class GitHubTest(unittest.TestCase):
             request.assert_called_once_with(
                 'PUT', '/repos/test_user/test_repo/pulls/333/merge', '{}')
 
+    @unittest.mock.patch("git_devbliss.github.GitHub.use_cache", False)
+    @unittest.mock.patch("requests.Session.request")
+    @unittest.mock.patch("os.path.exists")
+    def test_delete_branch(self, exists, request):
+        exists.return_value = True
+        request.return_value = unittest.mock.Mock(status_code=204,
+                                                  headers={})
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='test_token')):
+            gh = git_devbliss.github.GitHub()
+            self.assertIsNone(
+                gh.delete_branch('test_user', 'test_repo', 'feature/a b'))
+        self.assertEqual(request.call_args[0], (
+            'DELETE', 'https://api.github.com/repos/test_user/test_repo'
+            '/git/refs/heads/feature/a%20b'))
+        self.assertEqual(request.return_value.json.call_count, 0)
+
     @unittest.mock.patch("git_devbliss.github.GitHub._request")
     @unittest.mock.patch("os.path.exists")
     def test_update_pull_request(self, exists, request):
@@ -546,44 +872,45 @@ class GitHubTest(unittest.TestCase):
             request.assert_called_once_with(
                 'PATCH', '/repos/test_user/test_repo/pulls/333', '"test_body"')
 
-    @unittest.mock.patch("subprocess.check_output")
+    @unittest.mock.patch("git_devbliss.github.remote_url")
     @unittest.mock.patch("os.path.exists")
-    def test_get_current_repo(self, exists, check_output):
+    def test_get_current_repo(self, exists, remote_url):
         exists.return_value = True
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
-            check_output.return_value = b'git@github.com:test_user/test_repo'
-            gh.get_current_repo()
-            check_output.assert_called_once_with(
-                'git remote -v', shell=True)
+            remote_url.return_value = 'git@github.com:test_user/test_repo.git'
+            self.assertEqual(gh.get_current_repo(),
+                             ('test_user', 'test_repo'))
+            remote_url.assert_called_once_with(
+                git_devbliss.github.runner, 'origin')
 
-    @unittest.mock.patch("subprocess.check_output")
+    @unittest.mock.patch("git_devbliss.github.current_branch")
     @unittest.mock.patch("os.path.exists")
-    def test_get_current_branch(self, exists, check_output):
+    def test_get_current_branch(self, exists, current_branch):
         exists.return_value = True
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
-            gh.get_current_branch()
-            check_output.assert_called_once_with(
-                'git rev-parse --abbrev-ref HEAD', shell=True)
+            current_branch.return_value = 'test_branch'
+            self.assertEqual(gh.get_current_branch(), 'test_branch')
+            current_branch.assert_called_once_with(
+                git_devbliss.github.runner)
 
-    @unittest.mock.patch("subprocess.check_output")
+    @unittest.mock.patch("git_devbliss.github.remote_url")
     @unittest.mock.patch("os.path.exists")
-    def test_get_current_repo_error(self, exists, check_output):
+    def test_get_current_repo_error(self, exists, remote_url):
         exists.return_value = True
         with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
                                  read_data='test_token')):
             gh = git_devbliss.github.GitHub()
             self.assertEqual(gh.token, 'test_token')
 
-            check_output.return_value = b''
-            with self.assertRaises(ValueError):
-                gh.get_current_repo()
-            check_output.assert_called_once_with(
-                'git remote -v', shell=True)
+            for url in (None, 'https://github.com/test_user/test_repo'):
+                remote_url.return_value = url
+                with self.assertRaises(ValueError):
+                    gh.get_current_repo()
@@ -19,6 +19,8 @@ from unittest.mock import call
 import requests
 import sys
 import subprocess
+import threading
+import git_devbliss.github
 
 
 main = pkg_resources.load_entry_point(
@@ -55,8 +57,8 @@ class MainTest(unittest.TestCase):
             },
         ]
         main(['status'])
-        init.assert_called_with()
-        get_current_repo.assert_called_with()
+        init.assert_called_once_with()
+        get_current_repo.assert_called_once_with()
         branches.assert_called_with('test_user', 'test_repo')
         pulls.assert_called_with('test_user', 'test_repo')
         issues.assert_called_with('test_user', 'test_repo')
@@ -80,7 +82,92 @@ class MainTest(unittest.TestCase):
             call()
         ])
 
+    @unittest.mock.patch("git_devbliss.github.GitHub.use_cache", True)
+    @unittest.mock.patch("git_devbliss.github.GitHub.read_timeout", 30)
+    @unittest.mock.patch("git_devbliss.github.GitHub.connect_timeout", 5)
+    @unittest.mock.patch("git_devbliss.github.GitHub.deadline", None)
+    @unittest.mock.patch("git_devbliss.github.GitHub.tags")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_timeouts(self, init, tags, print_function):
+        init.return_value = None
+        tags.return_value = []
+        main(['tags', 'test_user/test_repo', '--deadline', '2m',
+              '--connect-timeout', '1', '--read-timeout=7.5'])
+        github = git_devbliss.github.GitHub
+        self.assertEqual(github.deadline.seconds, 120)
+        self.assertEqual(github.connect_timeout, 1)
+        self.assertEqual(github.read_timeout, 7.5)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.deadline", None)
+    def test_invalid_deadline(self, print_function):
+        with self.assertRaises(SystemExit):
+            main(['tags', '--deadline', 'soon'])
+        print_function.assert_called_with('Fatal: Invalid duration: soon',
+                                          file=sys.stderr)
+        self.assertIsNone(git_devbliss.github.GitHub.deadline)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.connection_report")
+    @unittest.mock.patch("git_devbliss.github.GitHub.rate_limiter")
+    @unittest.mock.patch("git_devbliss.github.GitHub.tags")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_stats(self, init, tags, rate_limiter, connection_report,
+                   print_function):
+        init.return_value = None
+        tags.side_effect = requests.exceptions.RequestException(
+            400, 'Error',)
+        rate_limiter.report.return_value = 'test_report'
+        connection_report.return_value = 'test_connections'
+        with self.assertRaises(SystemExit):
+            main(['tags', 'test_user/test_repo', '--stats'])
+        self.assertEqual(print_function.call_args_list[-2:], [
+            call('test_report', file=sys.stderr),
+            call('test_connections', file=sys.stderr),
+        ])
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.issues")
     @unittest.mock.patch("git_devbliss.github.GitHub.pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.branches")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_status_concurrent(self, init, get_current_repo, branches, pulls,
+                               issues, print_function):
+        init.return_value = None
+        get_current_repo.return_value = ('test_user', 'test_repo')
+        fetched = threading.Event()
+
+        def slow_branches(owner, repository):
+            # only returns once the issues have been fetched in parallel
+            self.assertTrue(fetched.wait(5))
+            return [{'name': 'master'}]
+
+        def fast_issues(owner, repository):
+            fetched.set()
+            return []
+        branches.side_effect = slow_branches
+        issues.side_effect = fast_issues
+        pulls.return_value = []
+        main(['status'])
+        print_function.assert_has_calls([
+            call('Branches:'),
+            call('    master'
+                 ' <https://github.com/test_user/test_repo/tree/master>'),
+            call(),
+        ])
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_open_pulls_no_cache(self, init, get_current_repo, pulls,
+                                 print_function):
+        init.return_value = None
+        get_current_repo.return_value = ('test_user', 'test_repo')
+        pulls.return_value = []
+        main(['open-pulls', '--no-cache'])
+        self.assertFalse(git_devbliss.github.GitHub.use_cache)
+        main(['open-pulls'])
+        self.assertTrue(git_devbliss.github.GitHub.use_cache)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_pulls")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
     def test_open_pulls(self, init, get_current_repo, pulls,
@@ -101,7 +188,7 @@ class MainTest(unittest.TestCase):
             call()
         ])
 
-    @unittest.mock.patch("git_devbliss.github.GitHub.pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_pulls")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
     def test_open_pulls_value_error(self, init, get_current_repo, pulls,
@@ -117,7 +204,7 @@ class MainTest(unittest.TestCase):
         get_current_repo.assert_called_with()
         print_function.assert_called_with('Fatal: test_error', file=sys.stderr)
 
-    @unittest.mock.patch("git_devbliss.github.GitHub.pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_pulls")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
     def test_open_pulls_subproc_error(self, init, get_current_repo, pulls,
@@ -229,17 +316,20 @@ class MainTest(unittest.TestCase):
             EOFError,
         ]
 
-        response = unittest.mock.Mock()
-        body = unittest.mock.Mock()
-        response.json = body
-        response.status_code = 400
-        body.return_value = {'test_error'}
-        issue.side_effect = requests.exceptions.RequestException(
-            400, response=response)
-        with self.assertRaises(SystemExit):
+        # as raised by GitHub._send for an error response
+        response = unittest.mock.Mock(status_code=422,
+                                      request=requests.PreparedRequest())
+        error = requests.exceptions.RequestException(
+            422, 'Unprocessable Entity', response=response)
+        error.body = {'message': 'Validation Failed'}
+        issue.side_effect = error
+        with self.assertRaises(SystemExit) as e:
             main(['issue'])
+        self.assertEqual(e.exception.code, 1)
         init.assert_called_with()
         get_current_repo.assert_called_with()
+        print_function.assert_called_with('Error: Validation Failed',
+                                          file=sys.stderr)
 
     @unittest.mock.patch("git_devbliss.github.GitHub.issue")
     @unittest.mock.patch("builtins.input")
@@ -268,7 +358,7 @@ class MainTest(unittest.TestCase):
             call()
         ])
 
-    @unittest.mock.patch("git_devbliss.github.GitHub.repos")
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_repos")
     @unittest.mock.patch("git_devbliss.github.GitHub.pulls")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
     def test_overview(self, init, pulls, repos,
@@ -279,7 +369,7 @@ class MainTest(unittest.TestCase):
             {"number": 0, "title": "test_pull", "html_url": "test_pull_url"}
         ]
         main(['overview', 'test_user'])
-        init.assert_called_with()
+        init.assert_called_with(pool_maxsize=16)
         repos.assert_called_with('test_user')
         pulls.assert_has_calls([
             call('test_user', 'repo1'),
@@ -295,6 +385,118 @@ class MainTest(unittest.TestCase):
             call()
         ])
 
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_repos")
+    @unittest.mock.patch("git_devbliss.github.GitHub.pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_overview_ordered(self, init, pulls, repos, print_function):
+        init.return_value = None
+        repos.return_value = [{'name': 'c'}, {'name': 'A'}, {'name': 'b'}]
+        released = threading.Event()
+
+        def fetch(owner, repository):
+            if repository == 'A':
+                # the first repository finishes last
+                released.wait(5)
+            else:
+                released.set()
+            return [{"number": 0, "title": repository, "html_url": "url"}]
+        pulls.side_effect = fetch
+        main(['overview', 'test_user', '--jobs', '32'])
+        init.assert_called_with(pool_maxsize=32)
+        self.assertEqual(
+            [c[0][0] for c in print_function.call_args_list if c[0] and
+             not c[0][0].startswith(' ')], ['A', 'b', 'c'])
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.iter_repos")
+    @unittest.mock.patch("git_devbliss.github.GitHub.pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_overview_error(self, init, pulls, repos, print_function):
+        init.return_value = None
+        repos.return_value = [{'name': 'repo1'}, {'name': 'repo2'}]
+        pulls.side_effect = requests.exceptions.RequestException(
+            500, 'test_error')
+        with self.assertRaises(SystemExit):
+            main(['overview', 'test_user', '-j', '1'])
+        print_function.assert_called_with(
+            '[Errno 500] test_error', file=sys.stderr)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.search_issues")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_overview_search(self, init, search_issues, print_function):
+        init.return_value = None
+        search_issues.return_value = [
+            {"number": 2, "title": "pull2", "html_url": "url2",
+             "repository_url": "https://api.github.com/repos/test_user/b"},
+            {"number": 1, "title": "pull1", "html_url": "url1",
+             "repository_url": "https://api.github.com/repos/test_user/a"},
+        ]
+        main(['overview', 'test_user', '--engine=search'])
+        init.assert_called_with()
+        search_issues.assert_called_with('is:pr is:open org:test_user',
+                                         sort='created')
+        print_function.assert_has_calls([
+            call(),
+            call('a', '<https://github.com/test_user/a>'),
+            call('    #1: pull1 <url1>'),
+            call(),
+            call('b', '<https://github.com/test_user/b>'),
+            call('    #2: pull2 <url2>'),
+            call()
+        ])
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.graphql_search_pulls")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_overview_graphql(self, init, search_pulls, print_function):
+        init.return_value = None
+        search_pulls.return_value = [
+            {"number": 1, "title": "pull1", "url": "url1",
+             "repository": {"name": "a"}},
+        ]
+        main(['overview', 'test_user', '--engine=graphql'])
+        search_pulls.assert_called_with(
+            'is:pr is:open org:test_user sort:created-desc')
+        print_function.assert_has_calls([
+            call(),
+            call('a', '<https://github.com/test_user/a>'),
+            call('    #1: pull1 <url1>'),
+            call()
+        ])
+
+    def test_overview_unknown_engine(self, print_function):
+        with self.assertRaises(SystemExit):
+            main(['overview', 'test_user', '--engine=soap'])
+        print_function.assert_called_with(
+            'Fatal: unknown engine soap (use rest, search or graphql)',
+            file=sys.stderr)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
+    @unittest.mock.patch("git_devbliss.github.GitHub.delete_branch")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_delete_branches(self, init, delete_branch, get_current_repo,
+                             print_function):
+        init.return_value = None
+        get_current_repo.return_value = ('test_user', 'test_repo')
+        error = requests.exceptions.RequestException(422, 'Unprocessable')
+        error.body = {'message': 'Reference does not exist'}
+
+        def delete(owner, repository, branch):
+            if branch == 'bug/b':
+                raise error
+
+        delete_branch.side_effect = delete
+        main(['delete-branches', '-j', '2', 'feature/a', 'bug/b', 'c'])
+        init.assert_called_with(pool_maxsize=16)
+        self.assertEqual(sorted(delete_branch.call_args_list), [
+            call('test_user', 'test_repo', 'bug/b'),
+            call('test_user', 'test_repo', 'c'),
+            call('test_user', 'test_repo', 'feature/a'),
+        ])
+        print_function.assert_any_call(
+            'Could not delete bug/b: Reference does not exist',
+            file=sys.stderr)
+        self.assertRegex(print_function.call_args[0][0],
+                         r'^Deleted 2 of 3 branches in \d+\.\ds$')
+
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.tags")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
@@ -315,12 +517,13 @@ class MainTest(unittest.TestCase):
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
     def test_tags_with_repository(self, init, tags, print_function):
         init.return_value = None
-        tags.return_value = [{'name': 'tag1'}, {'name': 'tag2'}]
+        tags.return_value = [{'name': 'tag1'}, {'name': '1.10.0'},
+                             {'name': '1.9.2'}, {'name': 'tag2'}]
         main(['tags', 'test_user/test_repo'])
         init.assert_called_with()
         tags.assert_called_with('test_user', 'test_repo')
         print_function.assert_has_calls([
-            call('tag1\ntag2')
+            call('1.9.2\n1.10.0\ntag1\ntag2')
         ])
 
     @unittest.mock.patch("git_devbliss.github.GitHub.tags")
@@ -328,7 +531,7 @@ class MainTest(unittest.TestCase):
     def test_tags_http_error(self, init, tags, print_function):
         init.return_value = None
         tags.side_effect = requests.exceptions.RequestException(
-            400, 'Error',)
+            400, 'Error', response=unittest.mock.Mock(status_code=400))
         with self.assertRaises(SystemExit):
             main(['tags', 'test_user/test_repo'])
         init.assert_called_with()
@@ -336,6 +539,18 @@ class MainTest(unittest.TestCase):
         print_function.assert_called_with('Fatal:', 400, 'Error',
                                           file=sys.stderr)
 
+    @unittest.mock.patch("git_devbliss.github.GitHub.tags")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_tags_deadline(self, init, tags, print_function):
+        init.return_value = None
+        tags.side_effect = git_devbliss.github.DeadlineExceeded(
+            'deadline of 0.0s exceeded')
+        with self.assertRaises(SystemExit) as e:
+            main(['tags', 'test_user/test_repo'])
+        self.assertEqual(e.exception.code, 1)
+        print_function.assert_called_with('deadline of 0.0s exceeded',
+                                          file=sys.stderr)
+
     @unittest.mock.patch("subprocess.check_output")
     @unittest.mock.patch("git_devbliss.github.GitHub.merge_button")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
@@ -348,15 +563,15 @@ class MainTest(unittest.TestCase):
         get_current_repo.return_value = ('test_user', 'test_repo')
         get_pull_request.return_value = {'head': {'ref': 'test_ref'}}
         merge_button.return_value = {'merged': True, 'message': 'test_message'}
-        check_output.return_value = 'test_git_output_deleted_remote_ref'
+        check_output.return_value = b'test_git_output_deleted_remote_ref'
 
         main(['merge-button', '333'])
         init.assert_called_with()
         get_current_repo.assert_called_with()
         get_pull_request.assert_called_with('test_user', 'test_repo', '333')
         merge_button.assert_called_with('test_user', 'test_repo', '333')
-        check_output.assert_called_with("git push --delete origin test_ref",
-                                        shell=True)
+        check_output.assert_called_with(
+            ["git", "push", "--delete", "origin", "test_ref"])
 
         print_function.assert_has_calls([
             call('Success: test_message'),
@@ -458,32 +673,85 @@ class MainTest(unittest.TestCase):
             call()
         ])
 
-    @unittest.mock.patch("os.system")
+    @unittest.mock.patch("git_devbliss.github.__main__.fetcher")
+    @unittest.mock.patch("subprocess.call")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
     def test_review(self, init, get_current_repo,
-                    get_pull_request, system,
+                    get_pull_request, system, fetcher,
                     print_function):
         init.return_value = None
         get_current_repo.return_value = ('test_user', 'test_repo')
-        get_pull_request.return_value = {'head': {'sha': 'head_sha'},
-                                         'base': {'sha': 'base_sha'}}
-        system.side_effect = [
-            'test_git_fetch_output',
-            'test_git_diff_output'
-        ]
+        get_pull_request.return_value = {
+            'head': {'sha': 'head_sha'},
+            'base': {'sha': 'base_sha', 'ref': 'master'}}
+        system.side_effect = [0, 0, 0]
 
         main(['review', '333'])
         init.assert_called_with()
         get_current_repo.assert_called_with()
         get_pull_request.assert_called_with('test_user', 'test_repo', '333')
-        system.assert_has_calls([
-            call("git fetch --quiet origin"),
-            call("git diff --color=auto base_sha...head_sha")
+        fetcher.fetch.assert_called_once_with('refs/pull/333/head')
+        self.assertEqual(system.call_args_list, [
+            call(["git", "cat-file", "-e", "base_sha"]),
+            call(["git", "cat-file", "-e", "head_sha"]),
+            call(["git", "diff", "--color=auto", "base_sha...head_sha"])
+        ])
+
+    @unittest.mock.patch("git_devbliss.github.__main__.fetcher")
+    @unittest.mock.patch("subprocess.call")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_review_missing_head(self, init, get_current_repo,
+                                 get_pull_request, system, fetcher,
+                                 print_function):
+        init.return_value = None
+        get_current_repo.return_value = ('test_user', 'test_repo')
+        get_pull_request.return_value = {
+            'head': {'sha': 'head_sha'},
+            'base': {'sha': 'base_sha', 'ref': 'master'}}
+        # the pull request was force-pushed after its head was fetched
+        system.side_effect = [0, 1, 0]
+        main(['review', '333'])
+        self.assertEqual(fetcher.fetch.call_args_list, [
+            call('refs/pull/333/head'),
+            call('head_sha', force=True),
         ])
+        system.assert_called_with(
+            ["git", "diff", "--color=auto", "base_sha...head_sha"])
 
-    @unittest.mock.patch("os.system")
+    @unittest.mock.patch("git_devbliss.github.__main__.fetcher")
+    @unittest.mock.patch("subprocess.call")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_review_missing_base(self, init, get_current_repo,
+                                 get_pull_request, system, fetcher,
+                                 print_function):
+        init.return_value = None
+        get_current_repo.return_value = ('test_user', 'test_repo')
+        fetching = threading.Event()
+        fetcher.fetch.side_effect = lambda *args, **kwargs: fetching.set()
+
+        def get(owner, repository, number):
+            # the head is fetched while the metadata is requested
+            self.assertTrue(fetching.wait(5))
+            return {'head': {'sha': 'head_sha'},
+                    'base': {'sha': 'base_sha', 'ref': 'master'}}
+
+        get_pull_request.side_effect = get
+        system.side_effect = [1, 0, 0]
+        main(['review', '333'])
+        self.assertEqual(fetcher.fetch.call_args_list, [
+            call('refs/pull/333/head'),
+            call('base_sha', force=True),
+        ])
+        system.assert_called_with(
+            ["git", "diff", "--color=auto", "base_sha...head_sha"])
+
+    @unittest.mock.patch("subprocess.call")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
@@ -502,7 +770,7 @@ class MainTest(unittest.TestCase):
         get_current_repo.assert_called_with()
         get_pull_request.assert_called_with('test_user', 'test_repo', '333')
 
-    @unittest.mock.patch("os.system")
+    @unittest.mock.patch("subprocess.call")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
@@ -521,7 +789,7 @@ class MainTest(unittest.TestCase):
         get_current_repo.assert_called_with()
         get_pull_request.assert_called_with('test_user', 'test_repo', '333')
 
-    @unittest.mock.patch("os.system")
+    @unittest.mock.patch("subprocess.call")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_pull_request")
     @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
     @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
@@ -562,7 +830,32 @@ class MainTest(unittest.TestCase):
                                         'test_repo',
                                         'test_branch',
                                         base='test-mainline-branch',
-                                        body='test_data_from_markdown')
+                                        body='test_data_from_markdown',
+                                        retry=unittest.mock.ANY)
+        retry = pull_request.call_args[1]['retry']
+        self.assertEqual(retry.max_attempts, 3)
+
+    @unittest.mock.patch("git_devbliss.github.GitHub.pull_request")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_branch")
+    @unittest.mock.patch("git_devbliss.github.GitHub.get_current_repo")
+    @unittest.mock.patch("git_devbliss.github.GitHub.__init__")
+    def test_pull_request_head(
+            self, init, get_current_repo, get_current_branch,
+            pull_request, print_function):
+        init.return_value = None
+        get_current_repo.return_value = ('test_user', 'test_repo')
+        pull_request.return_value = {'html_url': 'test_pull_url'}
+        with unittest.mock.patch('builtins.open', unittest.mock.mock_open(
+                                 read_data='')):
+            main(['pull-request', '--head=feature/x', 'master'])
+        self.assertEqual(get_current_branch.call_count, 0)
+        pull_request.assert_called_with('test_user',
+                                        'test_repo',
+                                        'feature/x',
+                                        base='master',
+                                        body='',
+                                        retry=unittest.mock.ANY)
+        print_function.assert_called_with('test_pull_url')
 
     @unittest.mock.patch("time.sleep")
     @unittest.mock.patch("git_devbliss.github.GitHub.pull_request")
@@ -591,7 +884,8 @@ class MainTest(unittest.TestCase):
                                         'test_repo',
                                         'test_branch',
                                         base='test-mainline-branch',
-                                        body='')
+                                        body='',
+                                        retry=unittest.mock.ANY)
 
     @unittest.mock.patch("time.sleep")
     @unittest.mock.patch("git_devbliss.github.GitHub.pull_request")
@@ -610,13 +904,17 @@ class MainTest(unittest.TestCase):
         response.json = body
         response.status_code = 422
         body.return_value = {"errors": [{"message": "No commits between"}]}
-        pull_request.side_effect = [
-            requests.exceptions.RequestException(
-                422, response=response),
-            {'html_url': 'test_pull_url'}
-        ]
+        pull_request.return_value = {'html_url': 'test_pull_url'}
         open_function.side_effect = IOError()
         main(['pull-request', 'test-mainline-branch', '3'])
+        retry = pull_request.call_args[1]['retry']
+        self.assertTrue(retry.retry_if(response))
+        response.status_code = 400
+        self.assertFalse(retry.retry_if(response))
+        response.status_code = 422
+        body.side_effect = ValueError()
+        self.assertFalse(retry.retry_if(response))
+        print_function.assert_called_with('test_pull_url')
         init.assert_called_with()
         get_current_repo.assert_called_with()
         get_current_branch.assert_called_with()
@@ -625,7 +923,8 @@ class MainTest(unittest.TestCase):
                                         'test_repo',
                                         'test_branch',
                                         base='test-mainline-branch',
-                                        body='')
+                                        body='',
+                                        retry=unittest.mock.ANY)
 
     @unittest.mock.patch("time.sleep")
     @unittest.mock.patch("git_devbliss.github.GitHub.pull_request")
@@ -644,25 +943,13 @@ class MainTest(unittest.TestCase):
         response.json = body
         response.status_code = 422
         body.return_value = {"errors": [{"message": "No commits between"}]}
-        pull_request.side_effect = [
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-        ]
+        pull_request.side_effect = requests.exceptions.RequestException(
+            422, response=response)
         open_function.side_effect = IOError()
         with self.assertRaises(SystemExit):
             main(['pull-request', 'test-mainline-branch', '3'])
+        print_function.assert_called_with('Fatal: No commits between',
+                                          file=sys.stderr)
         init.assert_called_with()
         get_current_repo.assert_called_with()
         get_current_branch.assert_called_with()
@@ -671,7 +958,8 @@ class MainTest(unittest.TestCase):
                                         'test_repo',
                                         'test_branch',
                                         base='test-mainline-branch',
-                                        body='')
+                                        body='',
+                                        retry=unittest.mock.ANY)
 
     @unittest.mock.patch("time.sleep")
     @unittest.mock.patch("git_devbliss.github.GitHub.pull_request")
@@ -690,22 +978,8 @@ class MainTest(unittest.TestCase):
         response.json = body
         response.status_code = 422
         body.return_value = {"errors": []}
-        pull_request.side_effect = [
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-            requests.exceptions.RequestException(
-                422, response=response),
-        ]
+        pull_request.side_effect = requests.exceptions.RequestException(
+            422, response=response)
         open_function.side_effect = IOError()
         with self.assertRaises(SystemExit):
             main(['pull-request', 'test-mainline-branch', '3'])
@@ -717,4 +991,5 @@ class MainTest(unittest.TestCase):
                                         'test_repo',
                                         'test_branch',
                                         base='test-mainline-branch',
-                                        body='')
+                                        body='',
+                                        retry=unittest.mock.ANY)
@@ -0,0 +1,110 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import unittest.mock
+import requests
+from git_devbliss.github.ratelimit import RateLimiter, resource
+
+
+def response(status_code=200, **headers):
+    return unittest.mock.Mock(status_code=status_code, headers={
+        key.replace('_', '-'): str(value) for key, value in headers.items()})
+
+
+@unittest.mock.patch("time.time", return_value=1000)
+@unittest.mock.patch("time.sleep")
+@unittest.mock.patch("builtins.print")
+class RateLimiterTest(unittest.TestCase):
+
+    def test_resource(self, print_function, sleep, now):
+        self.assertEqual(resource('https://api.github.com/search/issues'),
+                         'search')
+        self.assertEqual(resource('https://api.github.com/graphql'),
+                         'graphql')
+        self.assertEqual(resource('https://api.github.com/orgs/x/repos'),
+                         'core')
+
+    def test_no_throttle_with_budget(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.throttle('https://api.github.com/user'), 0)
+        self.assertIsNone(limiter.update(response(**{
+            'X-RateLimit-Limit': 5000, 'X-RateLimit-Remaining': 4000,
+            'X-RateLimit-Reset': 1060})))
+        self.assertEqual(limiter.throttle('https://api.github.com/user'), 0)
+
+    def test_throttle_pauses_until_reset(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        limiter.update(response(**{
+            'X-RateLimit-Limit': 5000, 'X-RateLimit-Remaining': 100,
+            'X-RateLimit-Reset': 1060}))
+        self.assertEqual(limiter.throttle('https://api.github.com/user'), 60)
+        # other resources are not affected
+        self.assertEqual(
+            limiter.throttle('https://api.github.com/search/issues'), 0)
+
+    def test_throttle_too_long(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        limiter.update(response(**{
+            'X-RateLimit-Limit': 5000, 'X-RateLimit-Remaining': 3,
+            'X-RateLimit-Reset': 4600}))
+        with self.assertRaises(requests.exceptions.RequestException) as e:
+            limiter.throttle('https://api.github.com/user')
+        self.assertIn('core rate limit nearly exhausted (3 requests left)',
+                      e.exception.body['message'])
+        self.assertEqual(sleep.call_count, 0)
+
+    def test_out_of_order_responses(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        limiter.update(response(**{
+            'X-RateLimit-Limit': 5000, 'X-RateLimit-Remaining': 10,
+            'X-RateLimit-Reset': 1060}))
+        limiter.update(response(**{
+            'X-RateLimit-Limit': 5000, 'X-RateLimit-Remaining': 11,
+            'X-RateLimit-Reset': 1060}))
+        self.assertEqual(limiter.buckets['core']['remaining'], 10)
+
+    def test_retry_after(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.update(response(403, Retry_After=30)), 30)
+        self.assertEqual(limiter.update(response(429, Retry_After=30)), 30)
+        self.assertIsNone(limiter.update(response(403, Retry_After=3600)))
+        self.assertIsNone(limiter.update(response(403)))
+
+    def test_primary_limit_exhausted(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.update(response(403, **{
+            'X-RateLimit-Limit': 5000, 'X-RateLimit-Remaining': 0,
+            'X-RateLimit-Reset': 1020})), 20)
+
+    def test_pause(self, print_function, sleep, now):
+        RateLimiter().pause(12)
+        sleep.assert_called_once_with(12)
+        print_function.assert_called_once_with(
+            'Waiting 12s for the GitHub rate limit...',
+            file=unittest.mock.ANY)
+
+    def test_report(self, print_function, sleep, now):
+        limiter = RateLimiter()
+        self.assertEqual(
+            limiter.report(),
+            'GitHub API: no requests counted against the rate limit')
+        limiter.update(response(**{
+            'X-RateLimit-Limit': 30, 'X-RateLimit-Remaining': 29,
+            'X-RateLimit-Reset': 1060, 'X-RateLimit-Resource': 'search'}))
+        limiter.update(response(304))
+        self.assertRegex(
+            limiter.report(),
+            r'^GitHub API rate limit budget: '
+            r'search: 1 used, 29/30 left, resets at \d\d:\d\d:\d\d$')
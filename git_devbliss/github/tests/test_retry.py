@@ -0,0 +1,59 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import unittest.mock
+import requests
+from git_devbliss.github.retry import RetryPolicy
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_delay(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+        self.assertEqual([policy.delay(i) for i in range(5)],
+                         [1, 2, 4, 5, 5])
+
+    @unittest.mock.patch("random.uniform")
+    def test_delay_jitter(self, uniform):
+        uniform.return_value = 0.3
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        self.assertEqual(policy.delay(2), 0.3)
+        uniform.assert_called_with(0, 4)
+
+    def test_retry_response(self):
+        policy = RetryPolicy(max_attempts=3)
+        response = unittest.mock.Mock(status_code=502)
+        self.assertTrue(policy.retry_response('GET', 0, response))
+        self.assertTrue(policy.retry_response('GET', 1, response))
+        self.assertFalse(policy.retry_response('GET', 2, response))
+        self.assertFalse(policy.retry_response('POST', 0, response))
+        response.status_code = 404
+        self.assertFalse(policy.retry_response('GET', 0, response))
+
+    def test_retry_if(self):
+        policy = RetryPolicy(retry_if=lambda r: r.status_code == 422)
+        response = unittest.mock.Mock(status_code=422)
+        self.assertTrue(policy.retry_response('POST', 0, response))
+
+    def test_retry_error(self):
+        policy = RetryPolicy(max_attempts=2)
+        reset = requests.exceptions.ConnectionError()
+        self.assertTrue(policy.retry_error('GET', 0, reset))
+        self.assertFalse(policy.retry_error('GET', 1, reset))
+        self.assertFalse(policy.retry_error('POST', 0, reset))
+        self.assertTrue(policy.retry_error(
+            'POST', 0, requests.exceptions.ConnectTimeout()))
+        self.assertFalse(policy.retry_error(
+            'GET', 0, requests.exceptions.InvalidURL()))
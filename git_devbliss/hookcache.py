@@ -0,0 +1,100 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import os.path
+import subprocess
+import tempfile
+import time
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or "~/.cache", "git-devbliss", "hooks")
+MAX_ENTRIES = 1000
+
+
+class HookCache (object):
+    """On-disk record of the make hooks that succeeded, keyed by the hook,
+    the tree they ran on and the DEVBLISS_* variables they saw, so that a
+    hook is not run again on exactly the same content."""
+
+    def __init__(self, directory=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_entries = max_entries
+
+    def tree(self, runner):
+        """The tree of HEAD, or None if there is no commit yet."""
+        try:
+            return runner.output(["rev-parse", "--verify", "--quiet",
+                                  "HEAD^{tree}"]) or None
+        except subprocess.CalledProcessError:
+            return None
+
+    def _path(self, hook, tree, env):
+        variables = {name: value for name, value in env.items()
+                     if name.startswith("DEVBLISS_")}
+        key = hashlib.sha256(json.dumps(
+            [hook, tree, variables], sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def succeeded(self, hook, tree, env):
+        if not tree:
+            return False
+        path = self._path(hook, tree, env)
+        try:
+            os.utime(path, None)  # mark as recently used
+        except OSError:
+            return False
+        return True
+
+    def record(self, hook, tree, env):
+        if not tree:
+            return
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"hook": hook, "tree": tree, "time": time.time()},
+                          f)
+            os.replace(tmp, self._path(hook, tree, env))
+            tmp = None
+        except OSError:
+            return
+        finally:
+            if tmp:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries beyond max_entries."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+        for _, path in sorted(entries)[:max(
+                len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,176 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import os.path
+import subprocess
+import threading
+import time
+
+# Entry point group of hook plugins: the name of an entry point is the hook
+# it implements, e.g. version = mypackage.hooks:bump_version
+ENTRY_POINT_GROUP = "git_devbliss.hooks"
+# Module in the top level of the working tree whose functions implement
+# hooks of the same name (with - replaced by _).
+HOOKS_FILE = "devbliss_hooks.py"
+
+# HookResults of the hooks run by this command.
+results = []
+_lock = threading.Lock()
+# Imported devbliss_hooks.py modules by path, with their mtime.
+_modules = {}
+
+
+class HookResult (object):
+    """Outcome of running a hook: where it came from (devbliss_hooks.py,
+    an entry point or the Makefile), whether it succeeded and how long it
+    took."""
+
+    def __init__(self, hook, source, ok, seconds, message=None):
+        self.hook = hook
+        self.source = source
+        self.ok = ok
+        self.seconds = seconds
+        self.message = message
+
+    def __repr__(self):
+        return "<HookResult {} ({}): {} in {:.2f}s>".format(
+            self.hook, self.source, "ok" if self.ok else "failed",
+            self.seconds)
+
+
+def _hooks_file(directory):
+    """The devbliss_hooks.py module of directory, or None. It is imported
+    again only when the file has changed."""
+    path = os.path.abspath(os.path.join(directory, HOOKS_FILE))
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        cached = _modules.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("devbliss_hooks", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with _lock:
+        _modules[path] = (mtime, module)
+    return module
+
+
+def _from_hooks_file(hook, directory):
+    function = getattr(_hooks_file(directory), hook.replace("-", "_"), None)
+    return function and (HOOKS_FILE, function)
+
+
+def dependencies(directory="."):
+    """{hook: [hooks it has to wait for]} as declared by DEPENDENCIES in
+    devbliss_hooks.py."""
+    return dict(getattr(_hooks_file(directory), "DEPENDENCIES", None) or {})
+
+
+def _entry_points():
+    try:
+        from importlib import metadata
+    except ImportError:  # pragma: no cover
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(ENTRY_POINT_GROUP))
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(entry_points.get(ENTRY_POINT_GROUP, []))  # pragma: no cover
+
+
+def _from_entry_points(hook):
+    for entry_point in _entry_points():
+        if entry_point.name == hook:
+            source = "entry point " + getattr(entry_point, "value", hook)
+            return source, entry_point.load()
+    return None
+
+
+def find(hook, directory="."):
+    """(source, function) of the plugin implementing hook, or None if it
+    is left to the Makefile. Plugins are only imported here, i.e. once
+    their hook fires."""
+    return _from_hooks_file(hook, directory) or _from_entry_points(hook)
+
+
+def run(hook, env, plugin=None):
+    """Run hook in-process if a plugin implements it, otherwise as make
+    target, and return a HookResult. A plugin is called with the
+    environment of the hook and fails by raising an exception or returning
+    False."""
+    start = time.monotonic()
+    if plugin:
+        source, function = plugin
+        try:
+            ok = function(env) is not False
+            message = None if ok else "The {} hook ({}) failed".format(
+                hook, source)
+        except Exception as e:
+            ok = False
+            message = "The {} hook ({}) failed: {}: {}".format(
+                hook, source, type(e).__name__, e)
+    else:
+        source = "Makefile"
+        ok = subprocess.call(["make", hook], env=env) == 0
+        message = None if ok else "Makefile has no target named " + hook
+    result = HookResult(hook, source, ok, time.monotonic() - start, message)
+    with _lock:
+        results.append(result)
+    return result
+
+
+def run_all(hooks, env, plugins=None, dependencies=None):
+    """Run hooks, each as soon as the hooks it depends on are done, and
+    return their HookResults in the order of hooks. A hook whose
+    dependencies are not declared waits for all hooks before it."""
+    import concurrent.futures
+    plugins = plugins or {}
+    after = {}
+    for i, hook in enumerate(hooks):
+        declared = (dependencies or {}).get(hook)
+        after[hook] = set(hooks[:i] if declared is None else
+                          set(declared) & set(hooks))
+    done = {}
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(hooks), 1)) as executor:
+        running = {}
+        while len(done) < len(hooks):
+            for hook in hooks:
+                if hook not in done and hook not in running.values() and \
+                        after[hook] <= set(done):
+                    running[executor.submit(
+                        run, hook, env, plugins.get(hook))] = hook
+            if not running:
+                raise ValueError("Circular dependencies between the hooks "
+                                 + ", ".join(sorted(set(hooks) - set(done))))
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                done[running.pop(future)] = future.result()
+    return [done[hook] for hook in hooks]
+
+
+def report():
+    if not results:
+        return "hooks: none run"
+    return "hooks: " + ", ".join(
+        "{} ({}) {:.2f}s{}".format(result.hook, result.source,
+                                   result.seconds,
+                                   "" if result.ok else " failed")
+        for result in results)
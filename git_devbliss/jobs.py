@@ -0,0 +1,215 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import os.path
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import git_devbliss.gitdir
+from git_devbliss.git import runner
+
+# Directory in the .git directory shared by all worktrees that holds the
+# state (ID.json) and output (ID.log) of every job.
+JOBS_DIR = "devbliss-jobs"
+# Number of finished jobs that are kept; older ones are removed when a new
+# job starts.
+MAX_FINISHED = 20
+# A line of the output of github-devbliss pull-request.
+PULL_REQUEST_URL = re.compile(r"^https?://\S+/pull/\d+$", re.MULTILINE)
+
+
+class JobQueue (object):
+    """finish pipelines (hooks, push, pull request) running detached from
+    the terminal, each in a temporary worktree holding a snapshot of the
+    branch, so that the working tree can be used in the meantime."""
+
+    def __init__(self, runner, directory=None):
+        self.runner = runner
+        self.directory = directory
+
+    def _directory(self):
+        if self.directory is None:
+            self.directory = os.path.join(git_devbliss.gitdir.common_dir(
+                self.runner), JOBS_DIR)
+        return self.directory
+
+    def path(self, job_id, extension):
+        return os.path.join(self._directory(), job_id + extension)
+
+    def load(self, job_id):
+        try:
+            with open(self.path(job_id, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, job):
+        path = self.path(job["id"], ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def jobs(self):
+        """All jobs, oldest first, with their state: running, finished,
+        failed, or died if the worker is gone without finishing."""
+        try:
+            names = os.listdir(self._directory())
+        except OSError:
+            return []
+        jobs = []
+        for name in sorted(names):
+            job = name.endswith(".json") and self.load(name[:-5])
+            if not job:
+                continue
+            if job["finished"] is not None:
+                job["state"] = "finished" if job["status"] == 0 else "failed"
+            elif job["pid"] is None or is_alive(job["pid"]):
+                job["state"] = "running"
+            else:
+                job["state"] = "died"
+            jobs.append(job)
+        return jobs
+
+    def prune(self, keep=MAX_FINISHED):
+        """Remove all but the keep latest finished jobs, together with the
+        worktrees failed jobs kept."""
+        finished = [job for job in self.jobs() if job["state"] != "running"]
+        for job in finished[:max(len(finished) - keep, 0)]:
+            if job["state"] != "finished":
+                self.runner.call(["worktree", "remove", "--force",
+                                  job["worktree"]])
+            for extension in (".json", ".log"):
+                try:
+                    os.remove(self.path(job["id"], extension))
+                except OSError:
+                    pass
+
+    def start(self, branch, base_branch, env_vars, force_hooks=False):
+        """Check out HEAD into a temporary worktree and start a worker that
+        runs the finish pipeline of branch there. Returns the job.
+        Raises subprocess.CalledProcessError if the worktree cannot be
+        created."""
+        os.makedirs(self._directory(), exist_ok=True)
+        self.prune()
+        # the random part keeps jobs of a branch started within the same
+        # second apart
+        job_id = "{}-{}-{}".format(time.strftime("%Y%m%d-%H%M%S"),
+                                   re.sub(r"[^\w.-]+", "-", branch),
+                                   os.urandom(3).hex())
+        worktree = tempfile.mkdtemp(prefix="git-devbliss-")
+        self.runner.output(["worktree", "add", "--quiet", "--detach",
+                            worktree, "HEAD"])
+        job = {"id": job_id, "branch": branch, "base_branch": base_branch,
+               "env": env_vars, "force_hooks": force_hooks,
+               "worktree": worktree, "started": time.time(), "pid": None,
+               "finished": None, "status": None, "pull_request": None}
+        self.save(job)
+        if sys.platform == "win32":
+            detach = {"creationflags": subprocess.DETACHED_PROCESS |
+                      subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            detach = {"start_new_session": True}
+        with open(self.path(job_id, ".log"), "w", encoding="utf-8") as log:
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "git_devbliss.jobs", job_id],
+                cwd=worktree, env=dict(os.environ, PYTHONUNBUFFERED="1"),
+                stdin=subprocess.DEVNULL, stdout=log,
+                stderr=subprocess.STDOUT, **detach)
+        job["pid"] = worker.pid
+        self.save(job)
+        return job
+
+    def run(self, job_id):
+        """Worker side of start(): run the pipeline in the worktree, record
+        the outcome and the pull request, and remove the worktree if the
+        job succeeded. Returns the exit status."""
+        # the worker is started with the command it runs in its own module
+        from git_devbliss.__main__ import publish
+        job = self.load(job_id)
+        job["pid"] = os.getpid()
+        self.save(job)
+        status = 1
+        try:
+            publish(job["branch"], job["base_branch"], job["env"],
+                    job["force_hooks"], detached=True)
+            status = 0
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            job["status"] = status
+            job["pull_request"] = self.pull_request(job_id)
+            job["finished"] = time.time()
+            if status == 0:
+                # a failed job keeps its worktree (and the commits of its
+                # hooks) for inspection
+                self.runner.call(["worktree", "remove", "--force",
+                                  job["worktree"]])
+            self.save(job)
+        return status
+
+    def pull_request(self, job_id):
+        """URL of the pull request opened by the job, read from its log."""
+        try:
+            with open(self.path(job_id, ".log"), encoding="utf-8") as f:
+                urls = PULL_REQUEST_URL.findall(f.read())
+        except OSError:
+            return None
+        return urls[-1] if urls else None
+
+
+def is_alive(pid):
+    if sys.platform == "win32":
+        return True  # there is no signal 0 to probe with
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def describe(job, now=None):
+    """One line summary of a job for git devbliss jobs."""
+    now = time.time() if now is None else now
+    line = "{}  {} -> {}  ".format(job["id"], job["branch"],
+                                   job["base_branch"])
+    if job["state"] == "running":
+        return line + "running for {:.0f}s".format(now - job["started"])
+    if job["state"] == "finished":
+        return (line + "finished in {:.0f}s  {}".format(
+            job["finished"] - job["started"],
+            job["pull_request"] or "")).rstrip()
+    if job["state"] == "failed":
+        return line + "failed (exit status {}), worktree kept at {}".format(
+            job["status"], job["worktree"])
+    return line + "died, worktree kept at {}".format(job["worktree"])
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    return JobQueue(runner).run(args[0])
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma nocover
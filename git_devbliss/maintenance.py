@@ -0,0 +1,103 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import sys
+import time
+import git_devbliss.gitdir
+from git_devbliss.git import MergedBranches, RefIndex, RepoSnapshot
+
+# (description, git arguments) of the maintenance steps, in order. Steps
+# the installed git does not know are skipped with a warning.
+STEPS = [
+    ("Packing refs", ["pack-refs", "--all", "--prune"]),
+    # generation numbers are part of every commit-graph git writes
+    ("Writing the commit-graph",
+     ["commit-graph", "write", "--reachable", "--changed-paths"]),
+    ("Writing the multi-pack-index", ["multi-pack-index", "write"]),
+    ("Updating the commit-graph on every fetch",
+     ["config", "fetch.writeCommitGraph", "true"]),
+    ("Enabling the untracked cache",
+     ["config", "core.untrackedCache", "true"]),
+]
+# Platforms git ships a built-in file system monitor for.
+FSMONITOR_PLATFORMS = ("darwin", "win32")
+FSMONITOR_STEP = ("Enabling the file system monitor",
+                  ["config", "core.fsmonitor", "true"])
+# Number of runs of each operation; the fastest one is reported.
+REPEAT = 3
+
+
+def steps(platform=sys.platform):
+    if platform in FSMONITOR_PLATFORMS:
+        return STEPS + [FSMONITOR_STEP]
+    return STEPS
+
+
+def operations(runner, base="master"):
+    """(name, function) of the repository reads devbliss commands rely
+    on."""
+    return [
+        ("status", lambda: RepoSnapshot.take(runner)),
+        ("branches and tags", lambda: RefIndex.build(runner)),
+        ("merged branches", lambda: MergedBranches.classify(runner, base)),
+        ("ancestry check", lambda: runner.output(
+            ["rev-list", "--count", "HEAD.." + base, "--"])),
+    ]
+
+
+def measure(operations, repeat=REPEAT):
+    """{name: seconds} with the fastest of repeat runs of every operation,
+    or None for operations that fail in this repository."""
+    timings = {}
+    for name, operation in operations:
+        best = None
+        for _ in range(repeat):
+            git_devbliss.gitdir.clear_cache()
+            start = time.monotonic()
+            try:
+                operation()
+            except subprocess.CalledProcessError:
+                best = None
+                break
+            seconds = time.monotonic() - start
+            best = seconds if best is None else min(best, seconds)
+        timings[name] = best
+    return timings
+
+
+def report(before, after):
+    def show(seconds):
+        return "n/a" if seconds is None else "{:.3f}s".format(seconds)
+
+    width = max(len(name) for name in before)
+    lines = ["Timings before -> after maintenance:"]
+    for name in before:
+        lines.append("    {} {} -> {}".format(
+            name.ljust(width), show(before[name]),
+            show(after.get(name))))
+    return "\n".join(lines)
+
+
+def run(runner, base="master"):
+    """Run the maintenance steps and print how long the operations of
+    operations() took before and after them."""
+    measured = operations(runner, base)
+    before = measure(measured)
+    for description, args in steps():
+        print(description + "...")
+        if runner.call(args) != 0:
+            print("Warning: git {} failed, skipping.".format(
+                " ".join(args)), file=sys.stderr)
+    print(report(before, measure(measured)))
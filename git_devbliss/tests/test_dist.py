@@ -20,3 +20,9 @@ class DistributionTest(unittest.TestCase):
 
     def test_version(self):
         self.assertRegex(git_devbliss.__version__, r'\d+\.\d+\.\d+')
+
+    def test_lazy_version(self):
+        self.assertEqual(str(git_devbliss.LazyVersion()),
+                         git_devbliss.version())
+        with self.assertRaises(AttributeError):
+            git_devbliss.no_such_attribute
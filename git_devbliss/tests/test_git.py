@@ -0,0 +1,361 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import os.path
+import subprocess
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from git_devbliss.git import (
+    FETCH_TTL, FetchCoordinator, GitRunner, MergedBranches, RefIndex,
+    RepoSnapshot, branch_refspec, chunked, tag_refspec, version_key)
+
+STATUS = '''# branch.oid 1111111111111111111111111111111111111111
+# branch.head feature/test
+# branch.upstream origin/feature/test
+# branch.ab +2 -3
+1 .M N... 100644 100644 100644 aaaaaaa aaaaaaa Makefile
+'''
+REFS = {
+    'refs/heads/feature/test': '1' * 40,
+    'refs/heads/master': '2' * 40,
+    'refs/remotes/origin/master': '1' * 40,
+}
+
+
+class GitRunnerTest(unittest.TestCase):
+
+    @unittest.mock.patch("subprocess.check_output")
+    def test_output(self, check_output):
+        check_output.return_value = b"  feature/a\n\n* master\n"
+        runner = GitRunner()
+        self.assertEqual(runner.output(["branch"]), "feature/a\n\n* master")
+        self.assertEqual(runner.lines(["branch"]), ["feature/a", "* master"])
+        check_output.assert_called_with(["git", "branch"])
+        self.assertEqual([args for args, _ in runner.timings],
+                         [["branch"], ["branch"]])
+
+    @unittest.mock.patch("subprocess.check_output")
+    def test_output_error(self, check_output):
+        check_output.side_effect = subprocess.CalledProcessError(128, "git")
+        runner = GitRunner()
+        with self.assertRaises(subprocess.CalledProcessError):
+            runner.output(["rev-parse", "HEAD"])
+        self.assertEqual(len(runner.timings), 1)
+
+    @unittest.mock.patch("subprocess.call")
+    def test_call(self, call):
+        call.return_value = 1
+        runner = GitRunner(executable="/usr/bin/git")
+        self.assertEqual(runner.call(["push", "origin", "master"]), 1)
+        call.assert_called_once_with(
+            ["/usr/bin/git", "push", "origin", "master"])
+
+    @unittest.mock.patch("subprocess.check_output")
+    def test_concurrently(self, check_output):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def output(argv):
+            barrier.wait()  # both commands have to run at the same time
+            return argv[-1].encode()
+
+        check_output.side_effect = output
+        runner = GitRunner(max_workers=2)
+        self.assertEqual(runner.concurrently(["log", "a"], ["log", "b"]),
+                         ["a", "b"])
+
+    @unittest.mock.patch("time.monotonic")
+    @unittest.mock.patch("subprocess.call")
+    def test_report(self, call, monotonic):
+        runner = GitRunner()
+        self.assertEqual(runner.report(), "git: no commands run")
+        monotonic.side_effect = [0, 0.5, 1, 3]
+        runner.call(["fetch"])
+        runner.call(["push"])
+        self.assertEqual(
+            runner.report(),
+            "git: 2 commands in 2.50s, slowest: git push (2.00s)")
+
+
+class RepoSnapshotTest(unittest.TestCase):
+
+    def test_parse(self):
+        snapshot = RepoSnapshot(STATUS, REFS, '/test_repo')
+        self.assertEqual(snapshot.head, '1' * 40)
+        self.assertEqual(snapshot.branch, 'feature/test')
+        self.assertEqual(snapshot.upstream, 'origin/feature/test')
+        self.assertEqual((snapshot.ahead, snapshot.behind), (2, 3))
+        self.assertFalse(snapshot.clean)
+        self.assertEqual(snapshot.toplevel, '/test_repo')
+        self.assertEqual(snapshot.resolve('master'), '2' * 40)
+        self.assertEqual(snapshot.resolve('origin/master'), '1' * 40)
+        self.assertIsNone(snapshot.resolve('origin/feature/test'))
+        self.assertTrue(snapshot.is_synced('origin/master'))
+        self.assertFalse(snapshot.is_synced('master'))
+
+    def test_detached_initial(self):
+        snapshot = RepoSnapshot(
+            '# branch.oid (initial)\n# branch.head (detached)\n'
+            '? untracked\n', {})
+        self.assertIsNone(snapshot.head)
+        self.assertEqual(snapshot.branch, 'HEAD')
+        self.assertIsNone(snapshot.upstream)
+        self.assertTrue(snapshot.clean)
+        self.assertFalse(snapshot.is_synced('origin/master'))
+
+    @unittest.mock.patch('git_devbliss.gitdir.toplevel')
+    @unittest.mock.patch('git_devbliss.gitdir.refs')
+    def test_take(self, refs, toplevel):
+        refs.return_value = REFS
+        toplevel.return_value = '/test_repo'
+        runner = unittest.mock.Mock()
+        runner.output.return_value = STATUS
+        snapshot = RepoSnapshot.take(runner)
+        self.assertEqual(snapshot.branch, 'feature/test')
+        self.assertEqual(snapshot.toplevel, '/test_repo')
+        runner.output.assert_called_once_with(
+            ['status', '--porcelain=v2', '--branch', '--untracked-files=no'])
+        refs.assert_called_once_with(
+            runner, 'refs/heads/', 'refs/remotes/', path='.')
+
+    def test_repository(self):
+        with tempfile.TemporaryDirectory() as repository:
+            repository = os.path.realpath(repository)
+            for command in ('-c init.defaultBranch=master init --quiet',
+                            '-c user.name=test -c user.email=test commit'
+                            ' --quiet --allow-empty -m test'):
+                subprocess.check_call(['git'] + command.split(),
+                                      cwd=repository)
+            os.mkdir(os.path.join(repository, 'sub'))
+            with open(os.path.join(repository, 'sub', 'file'), 'w'):
+                pass
+            cwd = os.getcwd()
+            os.chdir(os.path.join(repository, 'sub'))
+            try:
+                snapshot = RepoSnapshot.take(GitRunner())
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(snapshot.branch, 'master')
+            self.assertTrue(snapshot.clean)
+            self.assertEqual(snapshot.toplevel, repository)
+            self.assertEqual(snapshot.resolve('master'), snapshot.head)
+
+
+class ChunkedTest(unittest.TestCase):
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(['aa', 'bb', 'cc', 'dd'], limit=6)),
+                         [['aa', 'bb'], ['cc', 'dd']])
+        self.assertEqual(list(chunked(['aaaaaaaa', 'b'], limit=6)),
+                         [['aaaaaaaa'], ['b']])
+        self.assertEqual(list(chunked([])), [])
+        self.assertEqual(len(list(chunked([':' + 'x' * 99] * 1000))), 4)
+
+
+class RefIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = RefIndex({
+            'refs/heads/master': 'a' * 40,
+            'refs/heads/feature/a': 'b' * 40,
+            'refs/heads/feature/b': 'c' * 40,
+            'refs/remotes/origin/master': 'a' * 40,
+            'refs/tags/1.2.9': 'd' * 40,
+            'refs/tags/1.2.10': 'e' * 40,
+            'refs/tags/v0.9.0': 'f' * 40,
+            'refs/tags/nightly': '0' * 40,
+        })
+
+    def test_lookup(self):
+        self.assertTrue(self.index.has_tag('1.2.10'))
+        self.assertFalse(self.index.has_tag('1.2.11'))
+        self.assertTrue(self.index.has_branch('feature/a'))
+        self.assertFalse(self.index.has_branch('origin/master'))
+        self.assertEqual(self.index.tags['nightly'], '0' * 40)
+
+    def test_versions(self):
+        self.assertEqual(self.index.versions, ['v0.9.0', '1.2.9', '1.2.10'])
+        self.assertEqual(self.index.latest(), '1.2.10')
+        self.assertEqual(self.index.next_version(), '1.2.11')
+        self.assertEqual(self.index.next_version('minor'), '1.3.0')
+        self.assertEqual(self.index.next_version('major'), '2.0.0')
+        empty = RefIndex({})
+        self.assertIsNone(empty.latest())
+        self.assertEqual(empty.next_version(), '0.0.1')
+
+    def test_complete(self):
+        self.assertEqual(self.index.complete('1.2.'), ['1.2.10', '1.2.9'])
+        self.assertEqual(self.index.complete('feature/', 'branches'),
+                         ['feature/a', 'feature/b'])
+        self.assertEqual(self.index.complete('2'), [])
+        self.assertEqual(len(self.index.complete('')), 4)
+
+    def test_version_key(self):
+        self.assertEqual(sorted(['b', '10.0.0', 'a', '9.0.0'],
+                                key=version_key),
+                         ['9.0.0', '10.0.0', 'a', 'b'])
+
+    @unittest.mock.patch('git_devbliss.gitdir.refs')
+    def test_build(self, refs):
+        refs.return_value = {'refs/tags/1.0.0': 'a' * 40}
+        runner = unittest.mock.Mock()
+        self.assertEqual(RefIndex.build(runner).latest(), '1.0.0')
+        refs.assert_called_once_with(runner, 'refs/heads/', 'refs/remotes/',
+                                     'refs/tags/', path='.')
+
+
+class MergedBranchesTest(unittest.TestCase):
+
+    def test_parse(self):
+        merged = MergedBranches({
+            'refs/heads/master': 'a' * 40,
+            'refs/heads/feature/done': 'a' * 40,
+            'refs/heads/feature/open': 'b' * 40,
+            'refs/remotes/origin/HEAD': 'a' * 40,
+            'refs/remotes/origin/master': 'a' * 40,
+            'refs/remotes/origin/feature/done': 'a' * 40,
+            'refs/remotes/origin/feature/open': 'b' * 40,
+            'refs/remotes/upstream/feature/done': 'a' * 40,
+        }, {'refs/heads/master', 'refs/heads/feature/done',
+            'refs/remotes/origin/HEAD', 'refs/remotes/origin/master',
+            'refs/remotes/origin/feature/done'})
+        self.assertEqual(merged.merged, ['feature/done', 'master'])
+        self.assertEqual(merged.unmerged, ['feature/open'])
+        self.assertEqual(merged.remote_merged, ['feature/done', 'master'])
+        self.assertEqual(merged.remote_unmerged, ['feature/open'])
+
+    def test_repository(self):
+        with tempfile.TemporaryDirectory() as repository:
+            for command in (
+                    '-c init.defaultBranch=master init --quiet',
+                    '-c user.name=test -c user.email=test commit'
+                    ' --quiet --allow-empty -m test',
+                    'branch feature/done',
+                    'checkout --quiet -b feature/open',
+                    '-c user.name=test -c user.email=test commit'
+                    ' --quiet --allow-empty -m open',
+                    'update-ref refs/remotes/origin/master master',
+                    'update-ref refs/remotes/origin/feature/open HEAD'):
+                subprocess.check_call(['git'] + command.split(),
+                                      cwd=repository)
+            cwd = os.getcwd()
+            os.chdir(repository)
+            try:
+                runner = GitRunner()
+                merged = MergedBranches.classify(runner)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(merged.merged, ['feature/done', 'master'])
+            self.assertEqual(merged.unmerged, ['feature/open'])
+            self.assertEqual(merged.remote_merged, ['master'])
+            self.assertEqual(merged.remote_unmerged, ['feature/open'])
+            self.assertEqual(len(runner.timings), 2)
+
+
+class FetchCoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.state = os.path.join(directory.name, 'devbliss-fetch.json')
+        self.runner = unittest.mock.Mock()
+        self.runner.call.return_value = 0
+        self.fetcher = FetchCoordinator(self.runner, ttl=60,
+                                        state=self.state)
+
+    def test_refspecs(self):
+        self.assertEqual(branch_refspec('master'),
+                         '+refs/heads/master:refs/remotes/origin/master')
+        self.assertEqual(branch_refspec('*', 'upstream'),
+                         '+refs/heads/*:refs/remotes/upstream/*')
+        self.assertEqual(tag_refspec('1.0.0'),
+                         '+refs/tags/1.0.0:refs/tags/1.0.0')
+
+    def test_fetch_fresh(self):
+        self.assertEqual(self.fetcher.fetch('a', 'b'), 0)
+        self.assertEqual(self.fetcher.fetch('b', 'c'), 0)
+        self.assertEqual(self.fetcher.fetch('a', 'c'), 0)
+        self.assertEqual(self.runner.call.call_args_list, [
+            unittest.mock.call(['fetch', '--quiet', 'origin', 'a', 'b']),
+            unittest.mock.call(['fetch', '--quiet', 'origin', 'c']),
+        ])
+
+    def test_fetch_stale(self):
+        self.fetcher.fetch('a')
+        with open(self.state) as f:
+            fetched = json.load(f)
+        fetched['origin a'] -= 61
+        with open(self.state, 'w') as f:
+            json.dump(fetched, f)
+        self.fetcher.fetch('a')
+        self.assertEqual(self.runner.call.call_count, 2)
+
+    def test_fetch_prune(self):
+        self.fetcher.fetch('a')
+        self.fetcher.fetch('a', prune=True)
+        self.fetcher.fetch('a')
+        self.fetcher.fetch('a', prune=True)
+        self.assertEqual(self.runner.call.call_args_list, [
+            unittest.mock.call(['fetch', '--quiet', 'origin', 'a']),
+            unittest.mock.call(
+                ['fetch', '--quiet', '--prune', 'origin', 'a']),
+        ])
+
+    def test_fetch_force(self):
+        self.fetcher.fetch('a', prune=True)
+        self.fetcher.fetch('a', 'b', prune=True, force=True)
+        self.fetcher.fetch('b')
+        self.assertEqual(self.runner.call.call_args_list, [
+            unittest.mock.call(
+                ['fetch', '--quiet', '--prune', 'origin', 'a']),
+            unittest.mock.call(
+                ['fetch', '--quiet', '--prune', 'origin', 'a', 'b']),
+        ])
+
+    def test_fetch_failed(self):
+        self.runner.call.return_value = 1
+        self.assertEqual(self.fetcher.fetch('a'), 1)
+        self.assertEqual(self.fetcher.fetch('a'), 1)
+        self.assertEqual(self.runner.call.call_count, 2)
+        self.assertFalse(os.path.exists(self.state))
+
+    @unittest.mock.patch.dict('os.environ', {'GIT_DEVBLISS_FETCH_TTL': '0'})
+    def test_fetch_ttl_disabled(self):
+        self.fetcher.ttl = None
+        self.fetcher.fetch('a')
+        self.fetcher.fetch('a')
+        self.assertEqual(self.runner.call.call_count, 2)
+
+    @unittest.mock.patch.dict('os.environ',
+                              {'GIT_DEVBLISS_FETCH_TTL': 'never'})
+    def test_fetch_ttl_invalid(self):
+        self.fetcher.ttl = None
+        self.assertEqual(self.fetcher._ttl(), FETCH_TTL)
+
+    def test_fetch_state_unwritable(self):
+        self.fetcher.state = os.path.join(self.state, 'missing', 'x.json')
+        self.assertEqual(self.fetcher.fetch('a'), 0)
+        self.assertEqual(self.fetcher.fetch('a'), 0)
+        self.assertEqual(self.runner.call.call_count, 2)
+
+    @unittest.mock.patch('git_devbliss.gitdir.common_dir')
+    def test_state(self, common_dir):
+        common_dir.return_value = '/test_repo/.git'
+        fetcher = FetchCoordinator(self.runner)
+        self.assertEqual(fetcher._state(),
+                         '/test_repo/.git/devbliss-fetch.json')
+        common_dir.assert_called_once_with(self.runner)
@@ -0,0 +1,318 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import os.path
+import subprocess
+import tempfile
+import unittest
+import unittest.mock
+import git_devbliss.gitdir
+from git_devbliss.git import GitRunner
+from git_devbliss.gitdir import GitDir, Unsupported
+
+
+def git(repository, command):
+    return subprocess.check_output(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test'] +
+        command.split(), cwd=repository).decode().strip()
+
+
+@unittest.mock.patch.dict('os.environ')
+class GitDirTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ.pop('GIT_DIR', None)
+        os.environ.pop('GIT_WORK_TREE', None)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # keep the config of the machine out of the tests
+        os.environ['HOME'] = os.path.realpath(directory.name)
+        os.environ['GIT_CONFIG_NOSYSTEM'] = '1'
+        for name in ('XDG_CONFIG_HOME', 'GIT_CONFIG_GLOBAL',
+                     'GIT_CONFIG_PARAMETERS', 'GIT_CONFIG_COUNT'):
+            os.environ.pop(name, None)
+        self.repository = os.path.join(
+            os.path.realpath(directory.name), 'repo')
+        os.mkdir(self.repository)
+        git(self.repository, '-c init.defaultBranch=master init --quiet')
+        git(self.repository, 'commit --quiet --allow-empty -m test')
+        git(self.repository,
+            'remote add origin git@github.com:test_user/test_repo.git')
+        git(self.repository, 'remote add upstream https://example.com/x')
+
+    def test_find(self):
+        os.mkdir(os.path.join(self.repository, 'sub'))
+        gitdir = GitDir.find(os.path.join(self.repository, 'sub'))
+        self.assertEqual(gitdir.worktree, self.repository)
+        self.assertEqual(gitdir.git_dir,
+                         os.path.join(self.repository, '.git'))
+        self.assertEqual(gitdir.common_dir, gitdir.git_dir)
+        self.assertIsNone(GitDir.find('/'))
+
+    def test_branch(self):
+        gitdir = GitDir.find(self.repository)
+        self.assertEqual(gitdir.branch(), 'master')
+        git(self.repository, 'checkout --quiet -b feature/test')
+        self.assertEqual(gitdir.branch(), 'feature/test')
+        git(self.repository, 'checkout --quiet --detach')
+        self.assertEqual(gitdir.branch(), 'HEAD')
+        self.assertEqual(gitdir.head(), git(self.repository,
+                                            'rev-parse HEAD'))
+
+    def test_remotes(self):
+        self.assertEqual(GitDir.find(self.repository).remotes(), {
+            'origin': 'git@github.com:test_user/test_repo.git',
+            'upstream': 'https://example.com/x',
+        })
+
+    def test_refs(self):
+        head = git(self.repository, 'rev-parse HEAD')
+        git(self.repository, 'branch packed')
+        git(self.repository, 'pack-refs --all')
+        git(self.repository, 'branch loose')
+        git(self.repository, 'update-ref refs/remotes/origin/master HEAD')
+        git(self.repository,
+            'symbolic-ref refs/remotes/origin/HEAD refs/remotes/origin/master')
+        gitdir = GitDir.find(self.repository)
+        self.assertEqual(gitdir.refs('refs/heads/', 'refs/remotes/'), {
+            'refs/heads/master': head,
+            'refs/heads/packed': head,
+            'refs/heads/loose': head,
+            'refs/remotes/origin/master': head,
+        })
+        self.assertEqual(gitdir.refs('refs/tags/'), {})
+
+    def test_worktree(self):
+        worktree = self.repository + '-worktree'
+        git(self.repository,
+            'worktree add --quiet -b feature/worktree ' + worktree)
+        gitdir = GitDir.find(worktree)
+        self.assertEqual(gitdir.worktree, worktree)
+        self.assertEqual(gitdir.common_dir,
+                         os.path.join(self.repository, '.git'))
+        self.assertEqual(gitdir.branch(), 'feature/worktree')
+        self.assertIn('origin', gitdir.remotes())
+        self.assertIn('refs/heads/feature/worktree',
+                      gitdir.refs('refs/heads/'))
+
+    def test_cache(self):
+        gitdir = GitDir.find(self.repository)
+        gitdir.remotes()
+        with unittest.mock.patch('builtins.open') as open_function:
+            gitdir.remotes()
+            gitdir.remotes()
+        self.assertEqual(open_function.call_count, 0)
+        git(self.repository, 'remote set-url origin git@github.com:a/b')
+        self.assertEqual(gitdir.remotes()['origin'], 'git@github.com:a/b')
+        git_devbliss.gitdir.clear_cache()
+        with unittest.mock.patch('builtins.open') as open_function:
+            gitdir.remotes()
+        self.assertEqual(open_function.call_count, 1)
+
+    def test_cache_same_tick(self):
+        git(self.repository, 'branch other HEAD')
+        git(self.repository, 'commit --quiet --allow-empty -m other')
+        gitdir = GitDir.find(self.repository)
+        path = os.path.join(self.repository, '.git', 'refs', 'heads',
+                            'master')
+        head = gitdir.refs('refs/heads/')['refs/heads/master']
+        other = gitdir.refs('refs/heads/')['refs/heads/other']
+        stat = os.stat(path)
+        # rewritten by rename within the timestamp resolution of the
+        # filesystem
+        with open(path + '.lock', 'w') as f:
+            f.write(other + '\n')
+        os.utime(path + '.lock', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(path + '.lock', path)
+        self.assertNotEqual(head, other)
+        self.assertEqual(gitdir.refs('refs/heads/')['refs/heads/master'],
+                         other)
+
+    def test_common_dir(self):
+        runner = unittest.mock.Mock()
+        self.assertEqual(
+            git_devbliss.gitdir.common_dir(runner, self.repository),
+            os.path.join(self.repository, '.git'))
+        self.assertEqual(runner.output.call_count, 0)
+        os.environ['GIT_DIR'] = os.path.join(self.repository, '.git')
+        runner.output.return_value = '.git'
+        self.assertEqual(
+            git_devbliss.gitdir.common_dir(runner, self.repository),
+            os.path.join(self.repository, '.git'))
+        runner.output.assert_called_once_with(
+            ['rev-parse', '--git-common-dir'])
+
+    def test_unsupported(self):
+        with open(os.path.join(self.repository, '.git', 'config'),
+                  'a') as f:
+            f.write('[include]\n    path = other\n')
+        gitdir = GitDir.find(self.repository)
+        with self.assertRaises(Unsupported):
+            gitdir.remotes()
+        os.environ['GIT_DIR'] = os.path.join(self.repository, '.git')
+        with self.assertRaises(Unsupported):
+            GitDir.find(self.repository)
+
+    def test_unsupported_files(self):
+        git_dir = os.path.join(self.repository, '.git')
+        with self.assertRaises(Unsupported):
+            git_devbliss.gitdir.parse_config('[core\n')
+        with self.assertRaises(Unsupported):
+            git_devbliss.gitdir.parse_head('garbage\n')
+        with self.assertRaises(Unsupported):
+            git_devbliss.gitdir.parse_packed_refs('garbage refs/heads/x\n')
+        with open(os.path.join(git_dir, 'refs', 'heads', 'bad'), 'w') as f:
+            f.write('garbage\n')
+        with self.assertRaises(Unsupported):
+            GitDir.find(self.repository).refs('refs/heads/')
+        os.remove(os.path.join(git_dir, 'HEAD'))
+        with self.assertRaises(Unsupported):
+            GitDir.find(self.repository).head()
+        worktree = self.repository + '-file'
+        os.mkdir(worktree)
+        with open(os.path.join(worktree, '.git'), 'w') as f:
+            f.write('not a gitdir line\n')
+        with self.assertRaises(Unsupported):
+            GitDir.find(worktree)
+
+    def test_reftable(self):
+        git_dir = os.path.join(self.repository, '.git')
+        git(self.repository, 'config extensions.refStorage files')
+        self.assertEqual(GitDir.find(self.repository).branch(), 'master')
+        # what git init --ref-format=reftable leaves behind
+        git(self.repository, 'config extensions.refStorage reftable')
+        with open(os.path.join(git_dir, 'HEAD'), 'w') as f:
+            f.write('ref: refs/heads/.invalid\n')
+        with self.assertRaises(Unsupported):
+            GitDir.find(self.repository)
+        runner = unittest.mock.Mock()
+        runner.output.side_effect = ['master', '']
+        self.assertEqual(
+            git_devbliss.gitdir.current_branch(runner, self.repository),
+            'master')
+        self.assertEqual(
+            git_devbliss.gitdir.refs(runner, 'refs/heads/',
+                                     path=self.repository), {})
+        self.assertEqual(runner.output.call_count, 2)
+        self.assertEqual(git_devbliss.gitdir.parse_ref_storage(
+            '[core]\n\trefStorage = x\n[extensions]\n'
+            '\tRefStorage = "reftable"\n'), 'reftable')
+
+    def test_refs_skipped(self):
+        heads = os.path.join(self.repository, '.git', 'refs', 'heads')
+        with open(os.path.join(heads, 'master.lock'), 'w') as f:
+            f.write('garbage\n')
+        gitdir = GitDir.find(self.repository)
+        self.assertEqual(list(gitdir.refs('refs/heads/')),
+                         ['refs/heads/master'])
+        # a ref deleted between listing and reading it
+        with unittest.mock.patch('git_devbliss.gitdir._cached',
+                                 return_value=None):
+            self.assertEqual(gitdir.refs('refs/heads/'), {})
+
+    def test_fallback_git_dir(self):
+        os.environ['GIT_DIR'] = os.path.join(self.repository, '.git')
+        runner = unittest.mock.Mock()
+        runner.output.side_effect = [
+            'master', 'a' * 40 + ' refs/heads/master\n', self.repository,
+            subprocess.CalledProcessError(128, 'git')]
+        self.assertEqual(
+            git_devbliss.gitdir.current_branch(runner, self.repository),
+            'master')
+        self.assertEqual(
+            git_devbliss.gitdir.refs(runner, 'refs/heads/', 'refs/tags/',
+                                     path=self.repository),
+            {'refs/heads/master': 'a' * 40})
+        self.assertEqual(
+            git_devbliss.gitdir.toplevel(runner, self.repository),
+            self.repository)
+        self.assertIsNone(
+            git_devbliss.gitdir.toplevel(runner, self.repository))
+        self.assertEqual(
+            [args[0] for args, _ in runner.output.call_args_list], [
+                ['rev-parse', '--abbrev-ref', 'HEAD'],
+                ['for-each-ref', '--format=%(objectname) %(refname)',
+                 'refs/heads', 'refs/tags'],
+                ['rev-parse', '--show-toplevel'],
+                ['rev-parse', '--show-toplevel'],
+            ])
+
+    def test_fallback(self):
+        with open(os.path.join(self.repository, '.git', 'config'),
+                  'a') as f:
+            f.write('[url "git@github.com:"]\n'
+                    '    insteadOf = https://example.com/\n')
+        runner = GitRunner()
+        cwd = os.getcwd()
+        os.chdir(self.repository)
+        try:
+            self.assertEqual(
+                git_devbliss.gitdir.remote_url(runner, 'upstream'),
+                'git@github.com:x')
+            self.assertIsNone(git_devbliss.gitdir.remote_url(runner, 'none'))
+            self.assertEqual(git_devbliss.gitdir.current_branch(runner),
+                             'master')
+            self.assertEqual(git_devbliss.gitdir.toplevel(runner),
+                             self.repository)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual([args[0] for args, _ in runner.timings],
+                         ['remote', 'remote'])
+
+    def test_user_config(self):
+        gitdir = GitDir.find(self.repository)
+        with open(os.path.join(os.environ['HOME'], '.gitconfig'), 'w') as f:
+            f.write('[user]\n\tname = test\n')
+        self.assertIn('origin', gitdir.remotes())
+        with open(os.path.join(os.environ['HOME'], '.gitconfig'), 'a') as f:
+            f.write('[url "git@github.com:"]\n'
+                    '    insteadOf = https://example.com/\n')
+        with self.assertRaises(Unsupported):
+            gitdir.remotes()
+        cwd = os.getcwd()
+        os.chdir(self.repository)
+        try:
+            self.assertEqual(
+                git_devbliss.gitdir.remote_url(GitRunner(), 'upstream'),
+                'git@github.com:x')
+        finally:
+            os.chdir(cwd)
+        system = os.path.join(os.environ['HOME'], 'system')
+        with open(system, 'w') as f:
+            f.write('[include]\n\tpath = other\n')
+        os.environ['GIT_CONFIG_GLOBAL'] = os.devnull
+        os.environ['GIT_CONFIG_SYSTEM'] = system
+        self.assertIn('origin', gitdir.remotes())
+        del os.environ['GIT_CONFIG_NOSYSTEM']
+        with self.assertRaises(Unsupported):
+            gitdir.remotes()
+        self.assertEqual(git_devbliss.gitdir.user_config_paths(),
+                         [system, os.devnull])
+        os.environ['GIT_CONFIG_PARAMETERS'] = "'core.bare'='false'"
+        with self.assertRaises(Unsupported):
+            gitdir.remotes()
+
+    def test_parse_config(self):
+        config = git_devbliss.gitdir.parse_config(
+            '# comment\n[core]\n\tbare = false\n\tlogAllRefUpdates\n'
+            '[remote "or\\"igin"]\n\turl = "git@github.com:a/b" ; c\n')
+        self.assertEqual(config[('core', None)], {
+            'bare': ['false'], 'logallrefupdates': ['true']})
+        self.assertEqual(config[('remote', 'or\\"igin')],
+                         {'url': ['git@github.com:a/b']})
+        for text in ('url = x\n', '[core]\n\tx = a\\\n',
+                     '[extensions]\n\trefStorage = reftable\n'):
+            with self.assertRaises(Unsupported):
+                git_devbliss.gitdir.parse_config(text)
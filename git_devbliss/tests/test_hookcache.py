@@ -0,0 +1,98 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import tempfile
+import unittest
+import unittest.mock
+from git_devbliss.hookcache import HookCache
+
+
+class HookCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = os.path.join(directory.name, 'hooks')
+        self.cache = HookCache(self.directory)
+
+    def test_record(self):
+        env = {'DEVBLISS_BRANCH_TYPE': 'feature', 'HOME': '/a'}
+        self.assertFalse(self.cache.succeeded('finish', 'tree', env))
+        self.cache.record('finish', 'tree', env)
+        self.assertTrue(self.cache.succeeded('finish', 'tree', env))
+        # other variables do not matter
+        self.assertTrue(self.cache.succeeded(
+            'finish', 'tree', {'DEVBLISS_BRANCH_TYPE': 'feature'}))
+        self.assertFalse(self.cache.succeeded(
+            'finish', 'tree', {'DEVBLISS_BRANCH_TYPE': 'bug'}))
+        self.assertFalse(self.cache.succeeded('finish', 'other', env))
+        self.assertFalse(self.cache.succeeded('version', 'tree', env))
+
+    def test_no_tree(self):
+        self.cache.record('finish', None, {})
+        self.assertFalse(os.path.exists(self.directory))
+        self.assertFalse(self.cache.succeeded('finish', None, {}))
+
+    def test_evict(self):
+        for i, tree in enumerate(['a', 'b', 'c']):
+            self.cache.record('finish', tree, {})
+            path = self.cache._path('finish', tree, {})
+            os.utime(path, (i, i))
+        self.cache.max_entries = 2
+        self.cache.succeeded('finish', 'a', {})  # a is now the most recent
+        self.cache.record('finish', 'd', {})
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertTrue(self.cache.succeeded('finish', 'a', {}))
+        self.assertTrue(self.cache.succeeded('finish', 'd', {}))
+
+    def test_tree(self):
+        runner = unittest.mock.Mock()
+        runner.output.return_value = 'tree_sha'
+        self.assertEqual(self.cache.tree(runner), 'tree_sha')
+        runner.output.assert_called_once_with(
+            ['rev-parse', '--verify', '--quiet', 'HEAD^{tree}'])
+        runner.output.side_effect = subprocess.CalledProcessError(1, 'git')
+        self.assertIsNone(self.cache.tree(runner))
+
+    @unittest.mock.patch('os.makedirs')
+    def test_record_unwritable(self, makedirs):
+        makedirs.side_effect = PermissionError()
+        self.cache.record('finish', 'tree', {})
+        self.assertFalse(self.cache.succeeded('finish', 'tree', {}))
+
+    def test_evict_skips(self):
+        self.cache.record('finish', 'a', {})
+        with open(os.path.join(self.directory, 'x.tmp'), 'w'):
+            pass
+        self.cache.max_entries = 0
+        # entries removed by another process in the meantime
+        with unittest.mock.patch('os.stat', side_effect=OSError()):
+            self.cache.evict()
+        self.assertTrue(self.cache.succeeded('finish', 'a', {}))
+        with unittest.mock.patch('os.remove', side_effect=OSError()):
+            self.cache.evict()
+        self.assertTrue(self.cache.succeeded('finish', 'a', {}))
+        self.cache.evict()
+        self.assertEqual(os.listdir(self.directory), ['x.tmp'])
+
+    @unittest.mock.patch('os.replace')
+    def test_record_failed(self, replace):
+        replace.side_effect = PermissionError()
+        self.cache.record('finish', 'tree', {})
+        self.assertEqual(os.listdir(self.directory), [])
+        with unittest.mock.patch('os.remove', side_effect=OSError()):
+            self.cache.record('finish', 'tree', {})
+        self.assertFalse(self.cache.succeeded('finish', 'tree', {}))
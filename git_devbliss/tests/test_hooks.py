@@ -0,0 +1,174 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os.path
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import git_devbliss.hooks
+
+HOOKS_FILE = '''
+import os
+
+def version(env):
+    with open('version', 'w') as f:
+        f.write(env['DEVBLISS_BRANCH_TYPE'])
+
+def release(env):
+    return False
+
+DEPENDENCIES = {'version': ['changelog']}
+'''
+
+
+class HooksTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = unittest.mock.patch('git_devbliss.hooks.results', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @unittest.mock.patch('git_devbliss.hooks._entry_points')
+    def test_find_hooks_file(self, entry_points):
+        entry_points.return_value = []
+        with open(os.path.join(self.directory, 'devbliss_hooks.py'),
+                  'w') as f:
+            f.write(HOOKS_FILE)
+        source, function = git_devbliss.hooks.find('version', self.directory)
+        self.assertEqual(source, 'devbliss_hooks.py')
+        self.assertEqual(function.__name__, 'version')
+        self.assertIsNone(git_devbliss.hooks.find('finish', self.directory))
+
+    @unittest.mock.patch('git_devbliss.hooks._entry_points')
+    def test_find_entry_point(self, entry_points):
+        entry_point = unittest.mock.Mock(value='package.hooks:finish')
+        entry_point.name = 'finish'
+        other = unittest.mock.Mock()
+        other.name = 'version'
+        entry_points.return_value = [other, entry_point]
+        self.assertEqual(
+            git_devbliss.hooks.find('finish', self.directory),
+            ('entry point package.hooks:finish',
+             entry_point.load.return_value))
+        # only the plugin of the hook that fires is imported
+        self.assertEqual(other.load.call_count, 0)
+        self.assertIsNone(git_devbliss.hooks.find('release', self.directory))
+
+    def test_dependencies(self):
+        self.assertEqual(git_devbliss.hooks.dependencies(self.directory), {})
+        with open(os.path.join(self.directory, 'devbliss_hooks.py'),
+                  'w') as f:
+            f.write(HOOKS_FILE)
+        self.assertEqual(git_devbliss.hooks.dependencies(self.directory),
+                         {'version': ['changelog']})
+
+    @unittest.mock.patch('git_devbliss.hooks.run')
+    def test_run_all(self, run):
+        started = []
+        finish_started = threading.Event()
+        release_finish = threading.Event()
+
+        def fake_run(hook, env, plugin):
+            started.append(hook)
+            if hook == 'finish':
+                finish_started.set()
+                # changelog and version overlap with the finish hook
+                self.assertTrue(release_finish.wait(5))
+            elif hook == 'version':
+                self.assertIn('changelog', started)
+                release_finish.set()
+            return git_devbliss.hooks.HookResult(hook, plugin, True, 0)
+
+        run.side_effect = fake_run
+        results = git_devbliss.hooks.run_all(
+            ['finish', 'changelog', 'version'], {}, {'version': 'plugin'},
+            {'finish': [], 'changelog': [], 'version': ['changelog']})
+        self.assertEqual([result.hook for result in results],
+                         ['finish', 'changelog', 'version'])
+        self.assertEqual(results[2].source, 'plugin')
+        self.assertEqual(started[0], 'finish')
+
+    @unittest.mock.patch('git_devbliss.hooks.run')
+    def test_run_all_sequential(self, run):
+        order = []
+        run.side_effect = lambda hook, env, plugin: order.append(hook) or \
+            git_devbliss.hooks.HookResult(hook, 'Makefile', True, 0)
+        git_devbliss.hooks.run_all(['a', 'b', 'c'], {})
+        self.assertEqual(order, ['a', 'b', 'c'])
+        self.assertEqual(git_devbliss.hooks.run_all([], {}), [])
+
+    def test_run_all_circular(self):
+        with self.assertRaises(ValueError) as context:
+            git_devbliss.hooks.run_all(['a', 'b'], {},
+                                       dependencies={'a': ['b'], 'b': ['a']})
+        self.assertEqual(str(context.exception),
+                         'Circular dependencies between the hooks a, b')
+
+    def test_entry_points(self):
+        self.assertIsInstance(git_devbliss.hooks._entry_points(), list)
+
+    def test_run_plugin(self):
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            with open('devbliss_hooks.py', 'w') as f:
+                f.write(HOOKS_FILE)
+            plugin = git_devbliss.hooks.find('version')
+            result = git_devbliss.hooks.run(
+                'version', {'DEVBLISS_BRANCH_TYPE': 'bug'}, plugin)
+            with open('version') as f:
+                self.assertEqual(f.read(), 'bug')
+            failed = git_devbliss.hooks.run(
+                'release', {}, git_devbliss.hooks.find('release'))
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.source, 'devbliss_hooks.py')
+        self.assertGreaterEqual(result.seconds, 0)
+        self.assertFalse(failed.ok)
+        self.assertEqual(failed.message,
+                         'The release hook (devbliss_hooks.py) failed')
+        self.assertEqual(git_devbliss.hooks.results, [result, failed])
+
+    @unittest.mock.patch('subprocess.call')
+    def test_run_make(self, make):
+        make.return_value = 2
+        result = git_devbliss.hooks.run('finish', {'A': 'b'})
+        make.assert_called_once_with(['make', 'finish'], env={'A': 'b'})
+        self.assertFalse(result.ok)
+        self.assertEqual(result.source, 'Makefile')
+        self.assertEqual(result.message,
+                         'Makefile has no target named finish')
+
+    def test_result_repr(self):
+        self.assertEqual(
+            repr(git_devbliss.hooks.HookResult('finish', 'Makefile', False,
+                                               1.5)),
+            '<HookResult finish (Makefile): failed in 1.50s>')
+
+    def test_report(self):
+        self.assertEqual(git_devbliss.hooks.report(), 'hooks: none run')
+        git_devbliss.hooks.results.extend([
+            git_devbliss.hooks.HookResult('finish', 'Makefile', True, 12.3),
+            git_devbliss.hooks.HookResult(
+                'version', 'devbliss_hooks.py', False, 0.01),
+        ])
+        self.assertEqual(
+            git_devbliss.hooks.report(),
+            'hooks: finish (Makefile) 12.30s,'
+            ' version (devbliss_hooks.py) 0.01s failed')
@@ -0,0 +1,197 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import tempfile
+import unittest
+import unittest.mock
+import git_devbliss.jobs
+from git_devbliss.jobs import JobQueue, describe
+
+
+class JobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = os.path.join(directory.name, 'devbliss-jobs')
+        self.runner = unittest.mock.Mock()
+        self.queue = JobQueue(self.runner, self.directory)
+
+    def job(self, job_id, **state):
+        job = {'id': job_id, 'branch': 'feature/x', 'base_branch': 'master',
+               'env': {'DEVBLISS_BRANCH_TYPE': 'feature'},
+               'force_hooks': False, 'worktree': '/tmp/wt', 'started': 100,
+               'pid': None, 'finished': None, 'status': None,
+               'pull_request': None}
+        job.update(state)
+        os.makedirs(self.directory, exist_ok=True)
+        self.queue.save(job)
+        return job
+
+    @unittest.mock.patch('subprocess.Popen')
+    @unittest.mock.patch('tempfile.mkdtemp')
+    def test_start(self, mkdtemp, popen):
+        mkdtemp.return_value = '/tmp/git-devbliss-abc'
+        popen.return_value.pid = 4711
+        job = self.queue.start('feature/x', 'master', {'A': '1'})
+        self.assertRegex(job['id'], r'^\d{8}-\d{6}-feature-x-[0-9a-f]{6}$')
+        # a second job of the branch within the same second
+        self.assertNotEqual(
+            self.queue.start('feature/x', 'master', {})['id'], job['id'])
+        self.runner.output.assert_called_with(
+            ['worktree', 'add', '--quiet', '--detach',
+             '/tmp/git-devbliss-abc', 'HEAD'])
+        args, kwargs = popen.call_args_list[0]
+        self.assertEqual(args[0], [sys.executable, '-m', 'git_devbliss.jobs',
+                                   job['id']])
+        self.assertEqual(kwargs['cwd'], '/tmp/git-devbliss-abc')
+        self.assertEqual(self.queue.load(job['id'])['pid'], 4711)
+        self.assertEqual(self.queue.load(job['id'])['env'], {'A': '1'})
+        self.assertTrue(os.path.exists(self.queue.path(job['id'], '.log')))
+
+    @unittest.mock.patch('subprocess.CREATE_NEW_PROCESS_GROUP', 0x200,
+                         create=True)
+    @unittest.mock.patch('subprocess.DETACHED_PROCESS', 0x8, create=True)
+    @unittest.mock.patch('sys.platform', 'win32')
+    @unittest.mock.patch('subprocess.Popen')
+    @unittest.mock.patch('tempfile.mkdtemp')
+    def test_start_windows(self, mkdtemp, popen):
+        mkdtemp.return_value = '/tmp/git-devbliss-abc'
+        popen.return_value.pid = 4711
+        self.queue.start('feature/x', 'master', {})
+        _, kwargs = popen.call_args
+        self.assertEqual(kwargs['creationflags'], 0x208)
+        self.assertNotIn('start_new_session', kwargs)
+
+    @unittest.mock.patch('git_devbliss.gitdir.common_dir')
+    def test_directory(self, common_dir):
+        common_dir.return_value = '/repo/.git'
+        queue = JobQueue(self.runner)
+        self.assertEqual(queue.path('1', '.log'),
+                         '/repo/.git/devbliss-jobs/1.log')
+        common_dir.assert_called_once_with(self.runner)
+
+    @unittest.mock.patch('git_devbliss.jobs.is_alive')
+    def test_jobs(self, is_alive):
+        is_alive.side_effect = lambda pid: pid == 1
+        self.job('1', pid=1)
+        self.job('2', pid=2)
+        self.job('3', pid=3, finished=200, status=0)
+        self.job('4', pid=4, finished=200, status=2)
+        self.assertEqual([(job['id'], job['state'])
+                          for job in self.queue.jobs()],
+                         [('1', 'running'), ('2', 'died'),
+                          ('3', 'finished'), ('4', 'failed')])
+        self.assertEqual(JobQueue(self.runner, '/nonexistent').jobs(), [])
+        # a job written by an interrupted worker
+        with open(self.queue.path('5', '.json'), 'w') as f:
+            f.write('{"id"')
+        self.assertIsNone(self.queue.load('5'))
+        self.assertEqual(len(self.queue.jobs()), 4)
+
+    @unittest.mock.patch('git_devbliss.jobs.is_alive')
+    def test_prune(self, is_alive):
+        is_alive.side_effect = lambda pid: pid == 5
+        self.job('0', finished=200, status=0, worktree='/tmp/wt0')
+        self.job('1', finished=200, status=1, worktree='/tmp/wt1')
+        self.job('2', pid=2, worktree='/tmp/wt2')
+        self.job('3', finished=200, status=0)
+        self.job('4', finished=200, status=2)
+        self.job('5', pid=5)
+        self.queue.prune(keep=2)
+        self.assertEqual([job['id'] for job in self.queue.jobs()],
+                         ['3', '4', '5'])
+        self.assertFalse(os.path.exists(self.queue.path('0', '.json')))
+        # the worktrees kept by the failed and the died job go with them
+        self.assertEqual(self.runner.call.call_args_list, [
+            unittest.mock.call(['worktree', 'remove', '--force', '/tmp/wt1']),
+            unittest.mock.call(['worktree', 'remove', '--force', '/tmp/wt2']),
+        ])
+
+    @unittest.mock.patch('git_devbliss.__main__.publish')
+    def test_run(self, publish):
+        self.job('1')
+        with open(self.queue.path('1', '.log'), 'w') as f:
+            f.write('\nhttps://github.com/devbliss/repo/pull/12\n\n'
+                    'Pull Requests:\n    #12: x <https://github.com/'
+                    'devbliss/repo/pull/12>\n')
+        self.assertEqual(self.queue.run('1'), 0)
+        publish.assert_called_once_with(
+            'feature/x', 'master', {'DEVBLISS_BRANCH_TYPE': 'feature'},
+            False, detached=True)
+        job = self.queue.load('1')
+        self.assertEqual(job['status'], 0)
+        self.assertEqual(job['pid'], os.getpid())
+        self.assertEqual(job['pull_request'],
+                         'https://github.com/devbliss/repo/pull/12')
+        self.runner.call.assert_called_once_with(
+            ['worktree', 'remove', '--force', '/tmp/wt'])
+
+    @unittest.mock.patch('traceback.print_exc')
+    @unittest.mock.patch('git_devbliss.__main__.publish')
+    def test_run_failed(self, publish, print_exc):
+        self.job('1')
+        self.job('2')
+        publish.side_effect = [SystemExit(2), RuntimeError('boom')]
+        self.assertEqual(self.queue.run('1'), 2)
+        self.assertEqual(self.queue.run('2'), 1)
+        print_exc.assert_called_once_with()
+        self.assertEqual(self.queue.load('1')['status'], 2)
+        self.assertIsNone(self.queue.load('1')['pull_request'])
+        self.assertIsNotNone(self.queue.load('2')['finished'])
+        # the worktree is kept
+        self.assertEqual(self.runner.call.call_count, 0)
+
+    def test_describe(self):
+        job = self.job('1', pid=1)
+        job['state'] = 'running'
+        self.assertEqual(describe(job, now=130),
+                         '1  feature/x -> master  running for 30s')
+        job.update(state='finished', finished=190, status=0,
+                   pull_request='https://github.com/o/r/pull/1')
+        self.assertEqual(describe(job), '1  feature/x -> master  finished'
+                         ' in 90s  https://github.com/o/r/pull/1')
+        job.update(state='failed', status=2)
+        self.assertEqual(describe(job), '1  feature/x -> master  failed'
+                         ' (exit status 2), worktree kept at /tmp/wt')
+        job.update(state='died')
+        self.assertEqual(describe(job), '1  feature/x -> master  died,'
+                         ' worktree kept at /tmp/wt')
+
+    @unittest.mock.patch('sys.platform', 'linux')
+    @unittest.mock.patch('os.kill')
+    def test_is_alive(self, kill):
+        self.assertTrue(git_devbliss.jobs.is_alive(1))
+        kill.assert_called_once_with(1, 0)
+        kill.side_effect = ProcessLookupError()
+        self.assertFalse(git_devbliss.jobs.is_alive(1))
+        kill.side_effect = PermissionError()
+        self.assertTrue(git_devbliss.jobs.is_alive(1))
+
+    @unittest.mock.patch('sys.platform', 'win32')
+    @unittest.mock.patch('os.kill')
+    def test_is_alive_windows(self, kill):
+        self.assertTrue(git_devbliss.jobs.is_alive(1))
+        self.assertEqual(kill.call_count, 0)
+
+    @unittest.mock.patch('git_devbliss.jobs.JobQueue.run')
+    def test_main(self, run):
+        run.return_value = 2
+        self.assertEqual(git_devbliss.jobs.main(['1']), 2)
+        run.assert_called_once_with('1')
+        with unittest.mock.patch('sys.argv', ['jobs.py', '3']):
+            git_devbliss.jobs.main()
+        run.assert_called_with('3')
@@ -18,7 +18,11 @@ import unittest.mock
 from unittest.mock import call
 import subprocess
 import sys
+import tempfile
 import git_devbliss
+import git_devbliss.github
+import git_devbliss.hookcache
+from git_devbliss.git import MergedBranches, RefIndex
 
 git_devbliss_main = pkg_resources.load_entry_point(
     "git_devbliss", "console_scripts", "git-devbliss")
@@ -27,21 +31,49 @@ git_devbliss_main = pkg_resources.load_entry_point(
 @unittest.mock.patch("builtins.print")
 class MainTest(unittest.TestCase):
 
-    @unittest.mock.patch('os.system')
-    def test_git(self, system, print_function):
-        git_devbliss.__main__.git('test cmd')
-        system.assert_has_calls([
-            call('git test cmd')
-        ])
+    def setUp(self):
+        patcher = unittest.mock.patch(
+            'git_devbliss.__main__.origin_is_github', return_value=True)
+        self.origin_is_github = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('git_devbliss.__main__.repo_snapshot')
+        self.snapshot = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch(
+            'git_devbliss.__main__.ref_index', return_value=RefIndex({
+                'refs/heads/master': 'a' * 40,
+                'refs/tags/1.9.0': 'b' * 40,
+                'refs/tags/1.10.0': 'c' * 40,
+                'refs/tags/1.10.1': 'd' * 40,
+                'refs/tags/test_rev': 'e' * 40,
+            }))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('git_devbliss.__main__.fetcher')
+        self.fetcher = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('git_devbliss.__main__.hook_cache')
+        self.hook_cache = patcher.start()
+        self.hook_cache.succeeded.return_value = False
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('git_devbliss.hooks.find',
+                                      return_value=None)
+        self.find_hook = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @unittest.mock.patch('git_devbliss.__main__.runner')
+    def test_git(self, runner, print_function):
+        git_devbliss.__main__.git(['test', 'cmd'])
+        runner.call.assert_called_once_with(['test', 'cmd'])
         self.assertEqual(print_function.call_count, 0)
 
-    @unittest.mock.patch('subprocess.check_output')
-    def test_git_pipe(self, check_output, print_function):
-        git_devbliss.__main__.git('test cmd', pipe=True)
-        check_output.assert_has_calls([
-            call('git test cmd', shell=True),
-            call().decode()
-        ])
+    @unittest.mock.patch('git_devbliss.__main__.runner')
+    def test_git_pipe(self, runner, print_function):
+        runner.output.return_value = 'test_output'
+        self.assertEqual(
+            git_devbliss.__main__.git(['test', 'cmd'], pipe=True),
+            'test_output')
+        runner.output.assert_called_once_with(['test', 'cmd'])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
@@ -49,156 +81,362 @@ class MainTest(unittest.TestCase):
         with unittest.mock.patch('sys.argv', ['git-devbliss']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-        ])
+        self.origin_is_github.assert_called_once_with()
+        self.assertEqual(git.call_count, 0)
         self.assertEqual(print_function.call_count, 0)
 
-    @unittest.mock.patch('os.path.abspath')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_toplevel_failure(self, git, abspath, print_function):
-        git.return_value = '/User/test_user/test_repo'
-        abspath.side_effect = [
-            '/User/test_user/test_repo',
-            '/User/test_user/test_repo/subpath'
-        ]
+    def test_main_error(self, git, print_function):
+        self.origin_is_github.return_value = False
         with self.assertRaises(SystemExit):
-            git_devbliss.__main__.check_repo_toplevel()
-        git.assert_has_calls([
-            call('rev-parse --show-toplevel', pipe=True),
+            git_devbliss_main()
+        print_function.assert_has_calls([
+            call('Fatal: origin does not point to a github.com repository',
+                 file=sys.stderr)
+        ])
+
+    @unittest.mock.patch('git_devbliss.github.GitHub.rate_limiter')
+    @unittest.mock.patch('git_devbliss.github.GitHub.connection_report')
+    @unittest.mock.patch('git_devbliss.hooks.results', [])
+    @unittest.mock.patch('git_devbliss.__main__.runner')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_main_stats_github(self, git, runner, connection_report,
+                               rate_limiter, print_function):
+        runner.report.return_value = 'test_report'
+        connection_report.return_value = 'test_connections'
+        rate_limiter.report.return_value = 'test_budget'
+        with unittest.mock.patch('sys.argv', ['git-devbliss', 'status']):
+            with unittest.mock.patch.dict(
+                    'os.environ', {'GIT_DEVBLISS_STATS': '1'}):
+                with unittest.mock.patch.dict('sys.modules', {
+                        'git_devbliss.github': git_devbliss.github}):
+                    with unittest.mock.patch(
+                            'git_devbliss.__main__.github_devbliss'):
+                        git_devbliss_main()
+        self.assertEqual(print_function.call_args_list, [
+            call('test_budget', file=sys.stderr),
+            call('test_connections', file=sys.stderr),
+            call('test_report', file=sys.stderr),
         ])
+
+    @unittest.mock.patch('git_devbliss.hooks.results', [])
+    @unittest.mock.patch('git_devbliss.__main__.runner')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_main_stats(self, git, runner, print_function):
+        runner.report.return_value = 'test_report'
+        with unittest.mock.patch('sys.argv', ['git-devbliss', 'jobs']):
+            with unittest.mock.patch.dict(
+                    'os.environ', {'GIT_DEVBLISS_STATS': '1'}):
+                with unittest.mock.patch.dict('sys.modules', {
+                        'git_devbliss.github': None}):
+                    with unittest.mock.patch('git_devbliss.__main__.jobs'):
+                        git_devbliss_main()
+        print_function.assert_called_once_with('test_report',
+                                               file=sys.stderr)
+
+    @unittest.mock.patch('git_devbliss.hooks.report')
+    @unittest.mock.patch('git_devbliss.hooks.results', ['test_result'])
+    @unittest.mock.patch('git_devbliss.__main__.runner')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_main_stats_hooks(self, git, runner, report, print_function):
+        runner.report.return_value = 'test_report'
+        report.return_value = 'test_hooks'
+        with unittest.mock.patch('sys.argv', ['git-devbliss', 'jobs']):
+            with unittest.mock.patch.dict(
+                    'os.environ', {'GIT_DEVBLISS_STATS': '1'}):
+                with unittest.mock.patch.dict('sys.modules', {
+                        'git_devbliss.github': None}):
+                    with unittest.mock.patch('git_devbliss.__main__.jobs'):
+                        git_devbliss_main()
+        self.assertEqual(print_function.call_args_list, [
+            call('test_hooks', file=sys.stderr),
+            call('test_report', file=sys.stderr),
+        ])
+
+    @unittest.mock.patch('os.getcwd')
+    def test_toplevel_failure(self, getcwd, print_function):
+        self.snapshot.toplevel = '/User/test_user/test_repo'
+        getcwd.return_value = '/User/test_user/test_repo/subpath'
+        with self.assertRaises(SystemExit):
+            git_devbliss.__main__.check_repo_toplevel()
         print_function.assert_has_calls([
             call('You need to run this command from the toplevel'
                  ' of the working tree.', file=sys.stderr)
         ])
 
-    @unittest.mock.patch('os.path.abspath')
+    @unittest.mock.patch('os.getcwd')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_toplevel(self, git, abspath, print_function):
-        git.return_value = '/User/test_user/test_repo'
-        abspath.side_effect = [
-            '/User/test_user/test_repo',
-            '/User/test_user/test_repo'
-        ]
+    def test_toplevel(self, git, getcwd, print_function):
+        self.snapshot.toplevel = '/User/test_user/test_repo'
+        getcwd.return_value = '/User/test_user/test_repo'
         git_devbliss.__main__.check_repo_toplevel()
-        git.assert_has_calls([
-            call('rev-parse --show-toplevel', pipe=True),
-        ])
+        self.assertEqual(git.call_count, 0)
         self.assertEqual(print_function.call_count, 0)
 
-    @unittest.mock.patch('os.system')
+    @unittest.mock.patch('subprocess.call')
     @unittest.mock.patch('os.path.isfile')
     @unittest.mock.patch('git_devbliss.__main__.git')
     @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
     @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
     def test_hook_no_makefile(self, toplevel, repo_clean, git, isfile,
-                              system_function, print_function):
+                              make, print_function):
         toplevel.return_value = True
         isfile.return_value = False
         repo_clean.return_value = False
-        git_devbliss.__main__.call_hook('test_hook', 'test_env')
+        git_devbliss.__main__.call_hook('test_hook', {'TEST_ENV': '1'})
+        self.assertEqual(make.call_count, 0)
         print_function.assert_has_calls([
             call('Warning: No Makefile found. All make hooks have'
                  ' been skipped.', file=sys.stderr)
         ])
 
-    @unittest.mock.patch('os.system')
+    @unittest.mock.patch('subprocess.call')
     @unittest.mock.patch('os.path.isfile')
     @unittest.mock.patch('git_devbliss.__main__.git')
     @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
     @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
     def test_hook_unclean(self, toplevel, repo_clean, git, isfile,
-                          system_function, print_function):
+                          make, print_function):
         toplevel.return_value = True
         isfile.return_value = True
         repo_clean.return_value = False
-        git_devbliss.__main__.call_hook('test_hook', 'test_env')
+        make.return_value = 0
+        git_devbliss.__main__.call_hook('test_hook', {'TEST_ENV': '1'})
         git.assert_has_calls([
-            call('commit --quiet -am "Ran git devbliss test_hook hook"')
+            call(['commit', '--quiet', '-am',
+                  'Ran git devbliss test_hook hook'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
-    @unittest.mock.patch('os.system')
+    @unittest.mock.patch('subprocess.call')
     @unittest.mock.patch('os.path.isfile')
     @unittest.mock.patch('git_devbliss.__main__.git')
     @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
     @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
     def test_hook_clean(self, toplevel, repo_clean, git, isfile,
-                        system_function, print_function):
+                        make, print_function):
         toplevel.return_value = True
         isfile.return_value = True
         repo_clean.return_value = True
-        git_devbliss.__main__.call_hook('test_hook', 'test_env')
+        make.return_value = 0
+        git_devbliss.__main__.call_hook('test_hook', {'TEST_ENV': '1'})
+        self.assertEqual(make.call_args[0], (['make', 'test_hook'],))
+        self.assertEqual(make.call_args[1]['env']['TEST_ENV'], '1')
         self.assertEqual(git.call_count, 0)
         self.assertEqual(print_function.call_count, 0)
 
+    @unittest.mock.patch('subprocess.call')
+    @unittest.mock.patch('os.path.isfile')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_main_error(self, git, print_function):
-        git.side_effect = subprocess.CalledProcessError('3', 'git')
-        with self.assertRaises(SystemExit):
-            git_devbliss_main()
-        git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-        ])
-        print_function.assert_has_calls([
-            call('Fatal: origin does not point to a github.com repository',
-                 file=sys.stderr)
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hook_plugin(self, toplevel, repo_clean, git, isfile, make,
+                         print_function):
+        isfile.return_value = False
+        repo_clean.return_value = True
+        plugin = unittest.mock.Mock(return_value=None)
+        self.find_hook.return_value = ('devbliss_hooks.py', plugin)
+        git_devbliss.__main__.call_hook('version', {'TEST_ENV': '1'})
+        self.find_hook.assert_called_once_with('version')
+        self.assertEqual(make.call_count, 0)
+        self.assertEqual(plugin.call_args[0][0]['TEST_ENV'], '1')
+        self.assertEqual(self.hook_cache.record.call_count, 1)
+        self.assertEqual(print_function.call_count, 0)
+
+    @unittest.mock.patch('subprocess.call')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hook_plugin_failed(self, toplevel, repo_clean, git, isfile,
+                                make, print_function):
+        repo_clean.return_value = True
+        plugin = unittest.mock.Mock(side_effect=ValueError('no version'))
+        self.find_hook.return_value = ('devbliss_hooks.py', plugin)
+        git_devbliss.__main__.call_hook('version')
+        self.assertEqual(self.hook_cache.record.call_count, 0)
+        print_function.assert_called_once_with(
+            'Warning: The version hook (devbliss_hooks.py) failed:'
+            ' ValueError: no version')
+
+    @unittest.mock.patch('subprocess.call')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hook_cached(self, toplevel, repo_clean, git, isfile, make,
+                         print_function):
+        isfile.return_value = True
+        self.hook_cache.tree.return_value = 'tree_sha'
+        self.hook_cache.succeeded.return_value = True
+        git_devbliss.__main__.call_hook('test_hook', {'TEST_ENV': '1'})
+        self.assertEqual(make.call_count, 0)
+        self.assertEqual(git.call_count, 0)
+        self.hook_cache.tree.assert_called_once_with(
+            git_devbliss.__main__.runner)
+        self.assertEqual(self.hook_cache.succeeded.call_args[0][:2],
+                         ('test_hook', 'tree_sha'))
+        self.assertEqual(
+            self.hook_cache.succeeded.call_args[0][2]['TEST_ENV'], '1')
+        print_function.assert_called_once_with(
+            'Skipping the test_hook hook, it already succeeded on this'
+            ' tree.')
+
+    @unittest.mock.patch('subprocess.call')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hook_force(self, toplevel, repo_clean, git, isfile, make,
+                        print_function):
+        isfile.return_value = True
+        repo_clean.return_value = False
+        make.return_value = 0
+        self.hook_cache.tree.return_value = 'tree_sha'
+        self.hook_cache.succeeded.return_value = True
+        git_devbliss.__main__.call_hook('test_hook', force=True)
+        self.assertEqual(make.call_count, 1)
+        # the hook changed files, so it has to run again on tree_sha
+        self.assertEqual(self.hook_cache.record.call_count, 0)
+
+    @unittest.mock.patch('subprocess.call')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hook_after_reset(self, toplevel, repo_clean, git, isfile, make,
+                              print_function):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = git_devbliss.hookcache.HookCache(directory.name)
+        cache.tree = unittest.mock.Mock(return_value='tree_sha')
+        isfile.return_value = True
+        make.return_value = 0
+        env = {'DEVBLISS_VERSION': '2.0.0'}
+        with unittest.mock.patch('git_devbliss.__main__.hook_cache', cache):
+            # the release hook bumps the version and is committed
+            repo_clean.return_value = False
+            git_devbliss.__main__.call_hook('release', env)
+            # git reset --hard HEAD~1 brings back tree_sha
+            git_devbliss.__main__.call_hook('release', env)
+            self.assertEqual(make.call_count, 2)
+            self.assertEqual(git.call_count, 2)
+            # a run that changes nothing is remembered
+            repo_clean.return_value = True
+            git_devbliss.__main__.call_hook('release', env)
+            git_devbliss.__main__.call_hook('release', env)
+        self.assertEqual(make.call_count, 3)
+        print_function.assert_called_once_with(
+            'Skipping the release hook, it already succeeded on this tree.')
+
+    @unittest.mock.patch('git_devbliss.hooks.dependencies')
+    @unittest.mock.patch('git_devbliss.hooks.run_all')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hooks(self, toplevel, repo_clean, git, isfile, run_all,
+                   dependencies, print_function):
+        isfile.return_value = True
+        repo_clean.return_value = False
+        self.hook_cache.tree.return_value = 'tree_sha'
+        self.hook_cache.succeeded.side_effect = \
+            lambda hook, tree, env: hook == 'changelog'
+        dependencies.return_value = {'version': []}
+        run_all.return_value = [
+            git_devbliss.hooks.HookResult('finish', 'Makefile', True, 12.5),
+            git_devbliss.hooks.HookResult(
+                'version', 'Makefile', False, 0.25, 'version failed'),
+        ]
+        git_devbliss.__main__.call_hooks(
+            ['finish', 'changelog', 'version'], {'TEST_ENV': '1'})
+        toplevel.assert_called_once_with()
+        self.assertEqual(run_all.call_args[0][0], ['finish', 'version'])
+        self.assertEqual(run_all.call_args[0][1]['TEST_ENV'], '1')
+        self.assertEqual(run_all.call_args[0][2],
+                         {'finish': None, 'version': None})
+        self.assertEqual(run_all.call_args[0][3], {'version': []})
+        git.assert_called_once_with(
+            ['commit', '--quiet', '-am', 'Ran git devbliss hooks'])
+        self.assertEqual(self.hook_cache.record.call_count, 0)
+        self.assertEqual(print_function.call_args_list, [
+            call('Skipping the changelog hook, it already succeeded on this'
+                 ' tree.'),
+            call('Warning: version failed'),
+            call('Ran the hooks in finish 12.50s, version 0.25s'),
         ])
 
+    @unittest.mock.patch('git_devbliss.hooks.dependencies')
+    @unittest.mock.patch('git_devbliss.hooks.run_all')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hooks_circular(self, toplevel, isfile, run_all, dependencies,
+                            print_function):
+        isfile.return_value = True
+        run_all.side_effect = ValueError(
+            'Circular dependencies between the hooks a, b')
+        with self.assertRaises(SystemExit):
+            git_devbliss.__main__.call_hooks(['a', 'b'])
+        print_function.assert_called_once_with(
+            'Error: Circular dependencies between the hooks a, b',
+            file=sys.stderr)
+
+    @unittest.mock.patch('subprocess.call')
+    @unittest.mock.patch('os.path.isfile')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.is_repository_clean')
+    @unittest.mock.patch('git_devbliss.__main__.check_repo_toplevel')
+    def test_hook_missing_target(self, toplevel, repo_clean, git, isfile,
+                                 make, print_function):
+        isfile.return_value = True
+        repo_clean.return_value = True
+        make.return_value = 2
+        git_devbliss.__main__.call_hook('test_hook')
+        print_function.assert_called_once_with(
+            'Warning: Makefile has no target named test_hook')
+        self.assertEqual(self.hook_cache.record.call_count, 0)
+
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_feature(self, git, print_function):
+        git.return_value = 0
         with unittest.mock.patch('sys.argv',
                                  ['git-devbliss', 'feature', 'test']):
             git_devbliss_main()
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('checkout --quiet master'),
-            call('pull --quiet origin master'),
-            call('checkout --quiet -b feature/test'),
-            call('push --set-upstream origin feature/test')
+            call(['checkout', '--quiet', 'master']),
+            call(['pull', '--quiet', 'origin', 'master']),
+            call(['checkout', '--quiet', '-b', 'feature/test']),
+            call(['push', '--set-upstream', 'origin', 'feature/test'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_feature_branch_exists(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            '',
-            subprocess.CalledProcessError(2, 'git'),
-            '',
-            '',
-        ]
+        git.side_effect = [0, 0, 128, 0, 0]
         with unittest.mock.patch('sys.argv',
                                  ['git-devbliss', 'feature', 'test']):
             git_devbliss_main()
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('checkout --quiet master'),
-            call('pull --quiet origin master'),
-            call('checkout --quiet -b feature/test'),
-            call('checkout --quiet feature/test'),
-            call('push --set-upstream origin feature/test')
+            call(['checkout', '--quiet', 'master']),
+            call(['pull', '--quiet', 'origin', 'master']),
+            call(['checkout', '--quiet', '-b', 'feature/test']),
+            call(['checkout', '--quiet', 'feature/test']),
+            call(['push', '--set-upstream', 'origin', 'feature/test'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_feature_finish(self, git, print_function):
+        git.return_value = 0
         with unittest.mock.patch('sys.argv',
                                  ['git-devbliss', 'feature', 'finish']):
             git_devbliss_main()
 
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('checkout --quiet master'),
-            call('pull --quiet origin master'),
-            call('checkout --quiet -b feature/finish'),
-            call('push --set-upstream origin feature/finish')
+            call(['checkout', '--quiet', 'master']),
+            call(['pull', '--quiet', 'origin', 'master']),
+            call(['checkout', '--quiet', '-b', 'feature/finish']),
+            call(['push', '--set-upstream', 'origin', 'feature/finish'])
         ])
         print_function.assert_has_calls([
             call('You are creating a branch "feature/finish".'
@@ -209,210 +447,176 @@ class MainTest(unittest.TestCase):
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_bug(self, git, print_function):
+        git.return_value = 0
         with unittest.mock.patch('sys.argv',
                                  ['git-devbliss', 'bug', 'test']):
             git_devbliss_main()
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('checkout --quiet master'),
-            call('pull --quiet origin master'),
-            call('checkout --quiet -b bug/test'),
-            call('push --set-upstream origin bug/test')
+            call(['checkout', '--quiet', 'master']),
+            call(['pull', '--quiet', 'origin', 'master']),
+            call(['checkout', '--quiet', '-b', 'bug/test']),
+            call(['push', '--set-upstream', 'origin', 'bug/test'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_research(self, git, print_function):
+        git.return_value = 0
         with unittest.mock.patch('sys.argv',
                                  ['git-devbliss', 'research', 'test']):
             git_devbliss_main()
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('checkout --quiet master'),
-            call('pull --quiet origin master'),
-            call('checkout --quiet -b research/test'),
-            call('push --set-upstream origin research/test')
+            call(['checkout', '--quiet', 'master']),
+            call(['pull', '--quiet', 'origin', 'master']),
+            call(['checkout', '--quiet', '-b', 'research/test']),
+            call(['push', '--set-upstream', 'origin', 'research/test'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_refactor(self, git, print_function):
+        git.return_value = 0
         with unittest.mock.patch('sys.argv',
                                  ['git-devbliss', 'refactor', 'test']):
             git_devbliss_main()
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('checkout --quiet master'),
-            call('pull --quiet origin master'),
-            call('checkout --quiet -b refactor/test'),
-            call('push --set-upstream origin refactor/test')
+            call(['checkout', '--quiet', 'master']),
+            call(['pull', '--quiet', 'origin', 'master']),
+            call(['checkout', '--quiet', '-b', 'refactor/test']),
+            call(['push', '--set-upstream', 'origin', 'refactor/test'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_hotfix_tag_not_found(self, git, print_function):
         with unittest.mock.patch(
-                'sys.argv', ['git-devbliss', 'hotfix', 'test_rev', 'test']):
+                'sys.argv', ['git-devbliss', 'hotfix', '2.0.0', 'test']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('tag', pipe=True),
-        ])
+        self.assertEqual(git.call_count, 0)
         print_function.assert_has_calls([
-            call('Tag not found: test_rev', file=sys.stderr),
-            call('Available tags:')
+            call('Tag not found: 2.0.0', file=sys.stderr),
+            call('Available tags:'),
+            call('1.9.0\n1.10.0\n1.10.1\ntest_rev')
         ])
 
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_hotfix_similar_tags(self, git, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'hotfix', '1.10.2', 'test']):
+            with self.assertRaises(SystemExit):
+                git_devbliss_main()
+        print_function.assert_called_with('1.10.0\n1.10.1')
+
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_hotfix_similar_tags_order(self, git, print_function):
+        index = RefIndex({'refs/tags/' + i: 'a' * 40 for i in (
+            '1.2.9', '1.2.10', '1.20.0', '1.2.8')})
+        with unittest.mock.patch('git_devbliss.__main__.ref_index',
+                                 return_value=index):
+            with unittest.mock.patch(
+                    'sys.argv', ['git-devbliss', 'hotfix', '1.2.11', 'test']):
+                with self.assertRaises(SystemExit):
+                    git_devbliss_main()
+        print_function.assert_called_with('1.2.8\n1.2.9\n1.2.10')
+
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_hotfix(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'master\ntest_rev\nanother_rev',
-            '',
-            '',
-            '',
-            '',
-        ]
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'hotfix', 'test_rev', 'test']):
             git_devbliss_main()
+        self.fetcher.fetch.assert_called_once_with(
+            '+refs/tags/test_rev:refs/tags/test_rev')
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('tag', pipe=True),
+            call(['checkout', '--quiet', 'test_rev']),
+            call(['checkout', '--quiet', '-b', 'hotfix/test']),
+            call(['push', '--set-upstream', 'origin', 'hotfix/test'])
         ])
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_finish_not_merged(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'some_branch',
-            '0',
-            '',
-        ]
+        self.snapshot.branch = 'some_branch'
+        self.snapshot.clean = True
+        git.return_value = '3'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'finish', 'annegret']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('branch --contains annegret', pipe=True)
-        ])
+        git.assert_called_once_with(
+            ['rev-list', '--count', 'HEAD..annegret', '--'], pipe=True)
         print_function.assert_has_calls([
             call("Error: Won't finish. annegret is not merged into the"
-                 " current branch.", file=sys.stderr),
+                 " current branch (3 commits behind).", file=sys.stderr),
             call("Please do 'git merge annegret', make sure all conflicts"
                  " are merged and try again.", file=sys.stderr)
         ])
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_finish_not_merged_hotfix_with_target(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'hotfix/somehotfix',
-            '0',
-            '',
-        ]
+        self.snapshot.branch = 'hotfix/somehotfix'
+        self.snapshot.clean = True
+        git.return_value = '1'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'finish', 'annegret']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('branch --contains annegret', pipe=True)
-        ])
+        git.assert_called_once_with(
+            ['rev-list', '--count', 'HEAD..annegret', '--'], pipe=True)
         print_function.assert_has_calls([
             call("Error: Won't finish. annegret is not merged into the"
-                 " current branch.", file=sys.stderr),
+                 " current branch (1 commit behind).", file=sys.stderr),
             call("Please do 'git merge annegret', make sure all conflicts"
                  " are merged and try again.", file=sys.stderr)
         ])
 
     @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
-    @unittest.mock.patch('git_devbliss.__main__.call_hook')
+    @unittest.mock.patch('git_devbliss.__main__.call_hooks')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_finish_not_merged_hotfix(self, git, call_hook, github,
+    def test_finish_not_merged_hotfix(self, git, call_hooks, github,
                                       print_function):
-        git.side_effect = [
-            '',
-            '',
-            'hotfix/somehotfix',
-            '0',
-            '',
-            ''
-        ]
+        self.snapshot.branch = 'hotfix/somehotfix'
+        self.snapshot.clean = True
+        git.side_effect = ['2', 0]
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'finish']):
             git_devbliss_main()
         git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('branch --contains master', pipe=True)
-
-        ])
-        call_hook.assert_has_calls([
-            call('finish', 'DEVBLISS_BRANCH_TYPE=hotfix'),
-            call('changelog', 'DEVBLISS_BRANCH_TYPE=hotfix'),
-            call('version', 'DEVBLISS_BRANCH_TYPE=hotfix')
+            call(['rev-list', '--count', 'HEAD..master', '--'], pipe=True),
+            call(['push', 'origin', 'hotfix/somehotfix'])
         ])
+        call_hooks.assert_called_once_with(
+            ['finish', 'changelog', 'version'],
+            {'DEVBLISS_BRANCH_TYPE': 'hotfix'}, False)
         github.assert_has_calls([
             call(['pull-request', 'master']),
             call(['open-pulls'])
         ])
         print_function.assert_has_calls([
-            call('Warning: Master is not merged into the current branch.'),
+            call('Warning: Master is not merged into the current branch'
+                 ' (2 commits behind).'),
             call(),
             call()
         ])
 
     @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
-    @unittest.mock.patch('git_devbliss.__main__.call_hook')
+    @unittest.mock.patch('git_devbliss.__main__.call_hooks')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_finish(self, git, call_hook, github, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'feature/some_branch',
-            '0',
-            'feature/some_branch',
-            ''
-        ]
+    def test_finish(self, git, call_hooks, github, print_function):
+        self.snapshot.branch = 'feature/some_branch'
+        self.snapshot.clean = True
+        git.side_effect = ['0', 0]
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'finish', 'annegret']):
             git_devbliss_main()
         git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('branch --contains annegret', pipe=True)
-        ])
-        call_hook.assert_has_calls([
-            call('finish', 'DEVBLISS_BRANCH_TYPE=feature'),
-            call('changelog', 'DEVBLISS_BRANCH_TYPE=feature'),
-            call('version', 'DEVBLISS_BRANCH_TYPE=feature')
+            call(['rev-list', '--count', 'HEAD..annegret', '--'],
+                 pipe=True),
+            call(['push', 'origin', 'feature/some_branch'])
         ])
+        call_hooks.assert_called_once_with(
+            ['finish', 'changelog', 'version'],
+            {'DEVBLISS_BRANCH_TYPE': 'feature'}, False)
         github.assert_has_calls([
             call(['pull-request', 'annegret']),
             call(['open-pulls'])
@@ -422,25 +626,139 @@ class MainTest(unittest.TestCase):
             call()
         ])
 
+    @unittest.mock.patch('git_devbliss.github.GitHub')
+    @unittest.mock.patch('git_devbliss.__main__.JobQueue')
+    @unittest.mock.patch('git_devbliss.__main__.call_hooks')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_finish_unclean(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'some_branch',
-            '4',
+    def test_finish_background(self, git, call_hooks, job_queue, github,
+                               print_function):
+        self.snapshot.branch = 'feature/some_branch'
+        self.snapshot.clean = True
+        git.return_value = '0'
+        job_queue.return_value.start.return_value = {'id': 'job_id'}
+        job_queue.return_value.path.return_value = 'job_log'
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'finish', '--background']):
+            git_devbliss_main()
+        git.assert_called_once_with(
+            ['rev-list', '--count', 'HEAD..master', '--'], pipe=True)
+        self.assertEqual(call_hooks.call_count, 0)
+        github.assert_called_once_with()
+        job_queue.return_value.start.assert_called_once_with(
+            'feature/some_branch', 'master',
+            {'DEVBLISS_BRANCH_TYPE': 'feature', 'DEVBLISS_BACKGROUND': '1'},
+            False)
+        print_function.assert_has_calls([
+            call('Finishing feature/some_branch in the background'
+                 ' (job job_id).'),
+            call('Follow its progress in job_log'),
+        ])
+
+    @unittest.mock.patch('git_devbliss.github.GitHub')
+    @unittest.mock.patch('git_devbliss.__main__.JobQueue')
+    def test_finish_background_no_worktree(self, job_queue, github,
+                                           print_function):
+        job_queue.return_value.start.side_effect = \
+            subprocess.CalledProcessError(128, 'git worktree')
+        with self.assertRaises(SystemExit):
+            git_devbliss.__main__.start_job('feature/x', 'master', {})
+        print_function.assert_called_once_with(
+            'Error: Could not create a worktree for the job.',
+            file=sys.stderr)
+
+    @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
+    @unittest.mock.patch('git_devbliss.__main__.call_hooks')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_publish_detached(self, git, call_hooks, github,
+                              print_function):
+        git_devbliss.__main__.publish('feature/x', 'master', {'A': '1'},
+                                      True, detached=True)
+        call_hooks.assert_called_once_with(
+            ['finish', 'changelog', 'version'], {'A': '1'}, True)
+        git.assert_called_once_with(
+            ['push', 'origin', 'HEAD:refs/heads/feature/x'])
+        github.assert_has_calls([
+            call(['pull-request', '--head=feature/x', 'master']),
+            call(['open-pulls'])
+        ])
+
+    @unittest.mock.patch('git_devbliss.__main__.JobQueue')
+    def test_jobs(self, job_queue, print_function):
+        job_queue.return_value.jobs.return_value = [
+            {'id': '1', 'branch': 'feature/x', 'base_branch': 'master',
+             'state': 'finished', 'started': 0, 'finished': 5,
+             'pull_request': 'https://github.com/o/r/pull/1'},
+            {'id': '2', 'branch': 'bug/y', 'base_branch': 'master',
+             'state': 'failed', 'status': 2, 'worktree': '/tmp/wt'},
         ]
+        job_queue.return_value.path.return_value = 'job_log'
+        with unittest.mock.patch('sys.argv', ['git-devbliss', 'jobs']):
+            git_devbliss_main()
+        self.assertEqual(print_function.call_args_list, [
+            call('1  feature/x -> master  finished in 5s'
+                 '  https://github.com/o/r/pull/1'),
+            call('2  bug/y -> master  failed (exit status 2), worktree kept'
+                 ' at /tmp/wt'),
+            call('    log: job_log'),
+        ])
+        job_queue.return_value.path.assert_called_once_with('2', '.log')
+
+    @unittest.mock.patch('git_devbliss.__main__.JobQueue')
+    def test_jobs_none(self, job_queue, print_function):
+        job_queue.return_value.jobs.return_value = []
+        git_devbliss.__main__.jobs()
+        print_function.assert_called_once_with('No finish jobs.')
+
+    @unittest.mock.patch('git_devbliss.github.GitHub.deadline', None)
+    @unittest.mock.patch('git_devbliss.__main__.finish')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_finish_deadline(self, git, finish, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'finish', '--deadline=30s']):
+            git_devbliss_main()
+        self.assertEqual(git_devbliss.github.GitHub.deadline.seconds, 30)
+        finish.assert_called_with(None, False, False)
+
+    @unittest.mock.patch('git_devbliss.__main__.finish')
+    def test_finish_force_hooks(self, finish, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'finish', '--force-hooks',
+                             'annegret']):
+            git_devbliss_main()
+        finish.assert_called_with('annegret', True, False)
+
+    @unittest.mock.patch('git_devbliss.__main__.finish')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_finish_invalid_deadline(self, git, finish, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'finish', '--deadline=x']):
+            with self.assertRaises(SystemExit):
+                git_devbliss_main()
+        print_function.assert_called_with('Fatal: Invalid duration: x',
+                                          file=sys.stderr)
+        self.assertEqual(finish.call_count, 0)
+
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_finish_unknown_base(self, git, print_function):
+        self.snapshot.branch = 'some_branch'
+        self.snapshot.clean = True
+        git.side_effect = subprocess.CalledProcessError(128, 'git')
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'finish', 'annegret']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
+        print_function.assert_called_once_with(
+            'Error: Unknown base branch annegret.', file=sys.stderr)
 
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-        ])
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_finish_unclean(self, git, print_function):
+        self.snapshot.branch = 'some_branch'
+        self.snapshot.clean = False
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'finish', 'annegret']):
+            with self.assertRaises(SystemExit):
+                git_devbliss_main()
+        self.assertEqual(git.call_count, 0)
         print_function.assert_has_calls([
             call('Error: Repository is not clean. Aborting.', file=sys.stderr)
         ])
@@ -448,72 +766,58 @@ class MainTest(unittest.TestCase):
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_release_invalid_version(self, git, print_function):
         git.side_effect = [
-            '',
-            '',
         ]
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'release', 'annegret']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
         git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
         ])
         print_function.assert_has_calls([
-            call('Invalid version number', file=sys.stderr)
+            call('Invalid version number', file=sys.stderr),
+            call('The latest release is 1.10.1, the next one would be'
+                 ' 1.10.2, 1.11.0 or 2.0.0.', file=sys.stderr)
         ])
 
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_release_existing_tag(self, git, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'release', '1.10.0']):
+            with self.assertRaises(SystemExit):
+                git_devbliss_main()
+        self.assertEqual(git.call_count, 0)
+        print_function.assert_called_with(
+            'Error: Tag 1.10.0 already exists. The next release would be'
+            ' 1.10.2.', file=sys.stderr)
+
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_release_unclean(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            'some_branch',
-            '4',
-        ]
+        self.snapshot.branch = 'some_branch'
+        self.snapshot.clean = False
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'release', '1.0.0']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch --quiet origin'),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True)
-        ])
+        self.assertEqual(git.call_count, 0)
+        self.fetcher.fetch.assert_called_once_with(
+            '+refs/heads/master:refs/remotes/origin/master', force=True)
         print_function.assert_has_calls([
             call('Error: Repository is not clean. Aborting.', file=sys.stderr)
         ])
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_release_unmerged(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            'some_branch',
-            '0',
-            'sha-1',
-            'sha-2'
-        ]
+        self.snapshot.branch = 'some_branch'
+        self.snapshot.clean = True
+        self.snapshot.is_synced.return_value = False
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'release', '1.0.0']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch --quiet origin'),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('rev-parse HEAD', pipe=True),
-            call('rev-parse origin/master', pipe=True)
-        ])
+        self.assertEqual(git.call_count, 0)
+        self.fetcher.fetch.assert_called_once_with(
+            '+refs/heads/master:refs/remotes/origin/master', force=True)
+        self.snapshot.is_synced.assert_called_once_with('origin/master')
         print_function.assert_has_calls([
             call('Error: Local branch is not in sync with origin. Aborting.',
                  file=sys.stderr),
@@ -525,33 +829,21 @@ class MainTest(unittest.TestCase):
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_release_cancel(self, git, call_hook, input_function,
                             print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            'some_branch',
-            '0',
-            'sha-1',
-            'sha-1',
-            ''
-        ]
+        self.snapshot.branch = 'some_branch'
+        self.snapshot.clean = True
+        self.snapshot.is_synced.return_value = True
         input_function.side_effect = KeyboardInterrupt()
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'release', '1.0.0']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
+        self.fetcher.fetch.assert_called_once_with(
+            '+refs/heads/master:refs/remotes/origin/master', force=True)
         git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch --quiet origin'),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('rev-parse HEAD', pipe=True),
-            call('rev-parse origin/master', pipe=True),
-            call('diff')
+            call(['diff'])
         ])
         call_hook.assert_has_calls([
-            call('release', 'DEVBLISS_VERSION="1.0.0"')
+            call('release', {'DEVBLISS_VERSION': '1.0.0'}, False)
         ])
         print_function.assert_has_calls([
             call('Have these changes been reviewed?'),
@@ -564,42 +856,31 @@ class MainTest(unittest.TestCase):
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_release(self, git, call_hook, input_function,
                      github_devbliss, print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            'master',
-            '0',
-            'sha-1',
-            'sha-1',
-            '',
-            '',
-            '',
-            '',
-            '',
-            ''
-        ]
+        self.snapshot.branch = 'master'
+        self.snapshot.clean = True
+        self.snapshot.is_synced.return_value = True
         input_function.return_value = ''
+        git.side_effect = [
+            0, 0, 0, 0, 'c' * 40,
+            '{0}\trefs/heads/master\n{0}\trefs/tags/1.0.0'.format('c' * 40)]
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'release', '1.0.0']):
             git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch --quiet origin'),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('status --short --untracked-files=no | wc -l', pipe=True),
-            call('rev-parse HEAD', pipe=True),
-            call('rev-parse origin/master', pipe=True),
-            call('diff'),
-            call('commit --quiet --allow-empty -m "Release: 1.0.0"'),
-            call('push origin master'),
-            call('tag 1.0.0'),
-            call('push --tags origin'),
+        self.fetcher.fetch.assert_called_once_with(
+            '+refs/heads/master:refs/remotes/origin/master', force=True)
+        self.assertEqual(git.call_args_list, [
+            call(['diff']),
+            call(['commit', '--quiet', '--allow-empty', '-m',
+                  'Release: 1.0.0']),
+            call(['tag', '1.0.0']),
+            call(['push', '--atomic', 'origin', 'refs/heads/master',
+                  'refs/tags/1.0.0']),
+            call(['rev-parse', 'HEAD'], pipe=True),
+            call(['ls-remote', 'origin', 'refs/heads/master',
+                  'refs/tags/1.0.0'], pipe=True),
         ])
         call_hook.assert_has_calls([
-            call('release', 'DEVBLISS_VERSION="1.0.0"')
+            call('release', {'DEVBLISS_VERSION': '1.0.0'}, False)
         ])
         github_devbliss.assert_has_calls([
             call(['pull-request'])
@@ -609,6 +890,48 @@ class MainTest(unittest.TestCase):
             call('[enter / ctrl+c to cancel]')
         ])
 
+    @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
+    @unittest.mock.patch('builtins.input')
+    @unittest.mock.patch('git_devbliss.__main__.call_hook')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_release_push_failed(self, git, call_hook, input_function,
+                                 github_devbliss, print_function):
+        self.snapshot.branch = 'master'
+        self.snapshot.clean = True
+        self.snapshot.is_synced.return_value = True
+        input_function.return_value = ''
+        git.side_effect = [0, 0, 0, 1]
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'release', '1.0.0']):
+            with self.assertRaises(SystemExit):
+                git_devbliss_main()
+        self.assertEqual(git.call_count, 4)
+        print_function.assert_called_with(
+            'Error: Push failed, nothing was published. Try again with'
+            ' "git push --atomic origin refs/heads/master refs/tags/1.0.0".',
+            file=sys.stderr)
+        self.assertEqual(github_devbliss.call_count, 0)
+
+    @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
+    @unittest.mock.patch('builtins.input')
+    @unittest.mock.patch('git_devbliss.__main__.call_hook')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_release_not_published(self, git, call_hook, input_function,
+                                   github_devbliss, print_function):
+        self.snapshot.branch = 'hotfix/test'
+        self.snapshot.clean = True
+        input_function.return_value = ''
+        git.side_effect = [
+            0, 0, 0, 0, 'c' * 40,
+            '{}\trefs/heads/hotfix/test'.format('c' * 40)]
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'release', '1.0.0']):
+            with self.assertRaises(SystemExit):
+                git_devbliss_main()
+        print_function.assert_called_with(
+            'Error: origin does not show hotfix/test and tag 1.0.0 at the'
+            ' release commit.', file=sys.stderr)
+
     @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_status(self, git, github, print_function):
@@ -619,6 +942,16 @@ class MainTest(unittest.TestCase):
         ])
         self.assertEqual(print_function.call_count, 0)
 
+    @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_status_no_cache(self, git, github, print_function):
+        with unittest.mock.patch('sys.argv', ['git-devbliss', 'status',
+                                 '--no-cache']):
+            git_devbliss_main()
+        github.assert_has_calls([
+            call(['status', '--no-cache']),
+        ])
+
     @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_issue(self, git, github, print_function):
@@ -675,21 +1008,12 @@ class MainTest(unittest.TestCase):
 
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_delete_master(self, git, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'master',
-        ]
+        self.snapshot.branch = 'master'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'delete']):
             with self.assertRaises(SystemExit):
                 git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True)
-        ])
+        self.assertEqual(git.call_count, 0)
         print_function.assert_has_calls([
             call("Won't delete master branch. Aborting.", file=sys.stderr),
         ])
@@ -697,43 +1021,24 @@ class MainTest(unittest.TestCase):
     @unittest.mock.patch('builtins.input')
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_delete_cancel(self, git, input_function, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'test-branch',
-        ]
+        self.snapshot.branch = 'test-branch'
         input_function.return_value = ''
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'delete']):
             git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True)
-        ])
+        self.assertEqual(git.call_count, 0)
         self.assertEqual(print_function.call_count, 0)
 
     @unittest.mock.patch('builtins.input')
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_delete_yes(self, git, input_function, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'test-branch',
-            ''
-        ]
+        self.snapshot.branch = 'test-branch'
         input_function.return_value = 'y'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'delete']):
             git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('push --delete origin test-branch')
-        ])
+        git.assert_called_once_with(
+            ['push', '--delete', 'origin', 'test-branch'])
         print_function.assert_has_calls([
             call('To restore the remote branch, type'),
             call('    git push --set-upstream origin test-branch'),
@@ -744,22 +1049,12 @@ class MainTest(unittest.TestCase):
     @unittest.mock.patch('builtins.input')
     @unittest.mock.patch('git_devbliss.__main__.git')
     def test_delete_force(self, git, input_function, print_function):
-        git.side_effect = [
-            '',
-            '',
-            'test-branch',
-            ''
-        ]
+        self.snapshot.branch = 'test-branch'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'delete', '-f']):
             git_devbliss_main()
-        git.assert_has_calls([
-
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('push --delete origin test-branch')
-        ])
+        git.assert_called_once_with(
+            ['push', '--delete', 'origin', 'test-branch'])
         self.assertEqual(input_function.call_count, 0)
         print_function.assert_has_calls([
             call('To restore the remote branch, type'),
@@ -770,33 +1065,26 @@ class MainTest(unittest.TestCase):
 
     @unittest.mock.patch('builtins.input')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_cleanup_no_remote_merged(self, git, input_function,
-                                      print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            '',
-            subprocess.CalledProcessError(2, 'git'),
-            '',
-            '',
-        ]
+    @unittest.mock.patch('git_devbliss.__main__.merged_branches')
+    def test_cleanup_no_remote_merged(self, merged_branches, git,
+                                      input_function, print_function):
+        merged_branches.return_value = MergedBranches({
+            'refs/heads/master': 'a' * 40,
+            'refs/remotes/origin/master': 'a' * 40,
+            'refs/remotes/origin/release/1.0': 'a' * 40,
+        }, {'refs/heads/master', 'refs/remotes/origin/master',
+            'refs/remotes/origin/release/1.0'})
+        self.snapshot.branch = 'master'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'cleanup']):
             git_devbliss_main()
-        git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch'),
-            call('remote prune origin'),
-            call('branch -r --merged origin/master | grep -v master'
-                 ' | grep -v release', pipe=True),
-            call("branch --merged master | grep -v master | grep -v "
-                 "'\\*' | xargs git branch -d"),
-            call('branch --no-merged master')
+        merged_branches.assert_called_once_with(refresh=True)
+        self.fetcher.fetch.assert_called_once_with(
+            '+refs/heads/*:refs/remotes/origin/*', prune=True, force=True)
+        self.assertEqual(git.call_args_list, [
         ])
         self.assertEqual(input_function.call_count, 0)
-        print_function.assert_has_calls([
+        self.assertEqual(print_function.call_args_list, [
             call('Deleting remote tracking branches whose tracked'
                  ' branches on server are gone...'),
             call('Searching all remote branches except release'
@@ -807,94 +1095,191 @@ class MainTest(unittest.TestCase):
             call('Checking for unmerged local branches...')
         ])
 
-    @unittest.mock.patch('os.system')
     @unittest.mock.patch('builtins.input')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_cleanup_canceled(self, git, input_function, system,
+    @unittest.mock.patch('git_devbliss.__main__.merged_branches')
+    def test_cleanup_canceled(self, merged_branches, git, input_function,
                               print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            '',
-            'remote_merged_branch',
-            '',
-            '',
-            '',
-        ]
-        input.return_value = ''
+        merged_branches.return_value = MergedBranches({
+            'refs/heads/master': 'a' * 40,
+            'refs/heads/feature/merged': 'a' * 40,
+            'refs/heads/feature/other': 'a' * 40,
+            'refs/heads/feature/current': 'a' * 40,
+            'refs/heads/feature/unmerged': 'b' * 40,
+            'refs/remotes/origin/master': 'a' * 40,
+            'refs/remotes/origin/feature/merged': 'a' * 40,
+        }, {'refs/heads/master', 'refs/heads/feature/merged',
+            'refs/heads/feature/other', 'refs/heads/feature/current',
+            'refs/remotes/origin/master',
+            'refs/remotes/origin/feature/merged'})
+        self.snapshot.branch = 'feature/current'
+        input_function.return_value = ''
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'cleanup']):
             git_devbliss_main()
-        git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch'),
-            call('remote prune origin'),
-            call('branch -r --merged origin/master | grep -v master'
-                 ' | grep -v release', pipe=True),
-            call("branch --merged master | grep -v master | grep -v "
-                 "'\\*' | xargs git branch -d"),
-            call('branch --no-merged master')
+        self.assertEqual(git.call_args_list, [
+            call(['branch', '-d', 'feature/merged', 'feature/other']),
         ])
         input_function.assert_called_with(
             'Do you want to delete those branches on the server? [y/N]')
-        print_function.assert_has_calls([
+        self.assertEqual(print_function.call_args_list, [
             call('Deleting remote tracking branches whose tracked branches'
                  ' on server are gone...'),
             call('Searching all remote branches except release that are'
                  ' already merged into master...'),
-            call('remote_merged_branch'),
+            call('origin/feature/merged'),
             call('ok, will not delete anything.'),
             call('Deleting all local branches (except current) that are'
                  ' already merged into local master...'),
-            call('Checking for unmerged local branches...')
+            call('Checking for unmerged local branches...'),
+            call('feature/unmerged')
         ])
 
-    @unittest.mock.patch('os.system')
     @unittest.mock.patch('builtins.input')
     @unittest.mock.patch('git_devbliss.__main__.git')
-    def test_cleanup(self, git, input_function, os_system,
+    @unittest.mock.patch('git_devbliss.__main__.merged_branches')
+    def test_cleanup(self, merged_branches, git, input_function,
                      print_function):
-        git.side_effect = [
-            '',
-            '',
-            '',
-            '',
-            'remote_merged_branch',
-            '',
-            '',
-            '',
-        ]
+        merged_branches.return_value = MergedBranches({
+            'refs/heads/master': 'a' * 40,
+            'refs/remotes/origin/HEAD': 'a' * 40,
+            'refs/remotes/origin/master': 'a' * 40,
+            'refs/remotes/origin/feature/a': 'a' * 40,
+            'refs/remotes/origin/bug/b': 'a' * 40,
+        }, {'refs/heads/master', 'refs/remotes/origin/HEAD',
+            'refs/remotes/origin/master', 'refs/remotes/origin/feature/a',
+            'refs/remotes/origin/bug/b'})
+        self.snapshot.branch = 'master'
+        git.return_value = 0
         input_function.return_value = 'y'
         with unittest.mock.patch(
                 'sys.argv', ['git-devbliss', 'cleanup']):
             git_devbliss_main()
-        git.assert_has_calls([
-            call('rev-parse --abbrev-ref HEAD', pipe=True),
-            call('remote -v | grep "^origin.*github.*:.*(fetch)$"', pipe=True),
-            call('fetch'),
-            call('remote prune origin'),
-            call('branch -r --merged origin/master | grep -v master'
-                 ' | grep -v release', pipe=True),
-            call('remote prune origin'),
-            call("branch --merged master | grep -v master | grep -v"
-                 " '\\*' | xargs git branch -d"),
-            call('branch --no-merged master')
+        self.assertEqual(git.call_args_list, [
+            call(['push', '--atomic', 'origin', ':bug/b', ':feature/a']),
+            call(['remote', 'prune', 'origin']),
         ])
         input_function.assert_called_with(
             'Do you want to delete those branches on the server? [y/N]')
-        os_system.assert_called_with(
-            "echo 'remote_merged_branch' | sed 's#origin/##' | xargs -I {}"
-            " git push origin :{}")
         print_function.assert_has_calls([
             call('Deleting remote tracking branches whose tracked branches'
                  ' on server are gone...'),
             call('Searching all remote branches except release that are'
                  ' already merged into master...'),
-            call('remote_merged_branch'),
+            call('origin/bug/b\norigin/feature/a'),
             call('Deleting...'),
+            call(unittest.mock.ANY),
             call('Deleting all local branches (except current) that are'
                  ' already merged into local master...'),
             call('Checking for unmerged local branches...')
         ])
+
+    @unittest.mock.patch('builtins.input')
+    @unittest.mock.patch('git_devbliss.__main__.github_devbliss')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    @unittest.mock.patch('git_devbliss.__main__.merged_branches')
+    def test_cleanup_api(self, merged_branches, git, github_devbliss,
+                         input_function, print_function):
+        merged_branches.return_value = MergedBranches({
+            'refs/heads/master': 'a' * 40,
+            'refs/remotes/origin/master': 'a' * 40,
+            'refs/remotes/origin/feature/a': 'a' * 40,
+            'refs/remotes/origin/bug/b': 'a' * 40,
+        }, {'refs/heads/master', 'refs/remotes/origin/master',
+            'refs/remotes/origin/feature/a', 'refs/remotes/origin/bug/b'})
+        self.snapshot.branch = 'master'
+        input_function.return_value = 'y'
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'cleanup', '--api']):
+            git_devbliss_main()
+        github_devbliss.assert_called_once_with(
+            ['delete-branches', 'bug/b', 'feature/a'])
+        self.assertEqual(git.call_args_list, [
+            call(['remote', 'prune', 'origin']),
+        ])
+
+    @unittest.mock.patch('git_devbliss.maintenance.run')
+    @unittest.mock.patch('git_devbliss.__main__.cleanup')
+    def test_cleanup_maintenance(self, cleanup, run, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'cleanup', '--maintenance']):
+            git_devbliss_main()
+        cleanup.assert_called_once_with(False)
+        run.assert_called_once_with(git_devbliss.__main__.runner)
+
+    @unittest.mock.patch('git_devbliss.maintenance.run')
+    def test_maintenance(self, run, print_function):
+        with unittest.mock.patch(
+                'sys.argv', ['git-devbliss', 'maintenance']):
+            git_devbliss_main()
+        run.assert_called_once_with(git_devbliss.__main__.runner)
+
+    @unittest.mock.patch('git_devbliss.__main__.chunked')
+    @unittest.mock.patch('git_devbliss.__main__.git')
+    def test_delete_remote_branches(self, git, chunked, print_function):
+        chunked.return_value = [[':a', ':b'], [':c', ':d', ':e']]
+        # d is already gone on the server, which fails the atomic push
+        git.side_effect = [0, 1, 0, 1, 0]
+        self.assertEqual(git_devbliss.__main__.delete_remote_branches(
+            ['a', 'b', 'c', 'd', 'e']), ['a', 'b', 'c', 'e'])
+        chunked.assert_called_once_with([':a', ':b', ':c', ':d', ':e'])
+        self.assertEqual(git.call_args_list, [
+            call(['push', '--atomic', 'origin', ':a', ':b']),
+            call(['push', '--atomic', 'origin', ':c', ':d', ':e']),
+            call(['push', 'origin', ':c']),
+            call(['push', 'origin', ':d']),
+            call(['push', 'origin', ':e']),
+        ])
+        print_function.assert_any_call('Could not delete d',
+                                       file=sys.stderr)
+        self.assertRegex(print_function.call_args[0][0],
+                         r'^Deleted 4 of 5 branches in \d+\.\ds$')
+
+
+class HelpersTest(unittest.TestCase):
+
+    @unittest.mock.patch('git_devbliss.__main__.remote_url')
+    def test_origin_is_github(self, remote_url):
+        remote_url.return_value = 'git@github.com:test_user/test_repo.git'
+        self.assertTrue(git_devbliss.__main__.origin_is_github())
+        remote_url.assert_called_once_with(
+            git_devbliss.__main__.runner, 'origin')
+        remote_url.return_value = 'git@example.com:test_user/test_repo.git'
+        self.assertFalse(git_devbliss.__main__.origin_is_github())
+        remote_url.return_value = None
+        self.assertFalse(git_devbliss.__main__.origin_is_github())
+
+    @unittest.mock.patch('git_devbliss.github.__main__.main')
+    def test_github_devbliss(self, main):
+        main.return_value = 'test_result'
+        self.assertEqual(
+            git_devbliss.__main__.github_devbliss(['pull-request']),
+            'test_result')
+        main.assert_called_once_with(['pull-request'])
+
+    @unittest.mock.patch('git_devbliss.__main__._merged_branches', None)
+    @unittest.mock.patch('git_devbliss.git.MergedBranches.classify')
+    def test_merged_branches(self, classify):
+        classify.side_effect = ['first', 'second']
+        self.assertEqual(git_devbliss.__main__.merged_branches(), 'first')
+        self.assertEqual(git_devbliss.__main__.merged_branches(), 'first')
+        self.assertEqual(
+            git_devbliss.__main__.merged_branches(refresh=True), 'second')
+        classify.assert_called_with(git_devbliss.__main__.runner)
+
+    @unittest.mock.patch('git_devbliss.__main__._ref_index', None)
+    @unittest.mock.patch('git_devbliss.git.RefIndex.build')
+    def test_ref_index(self, build):
+        build.side_effect = ['first', 'second']
+        self.assertEqual(git_devbliss.__main__.ref_index(), 'first')
+        self.assertEqual(git_devbliss.__main__.ref_index(), 'first')
+        build.assert_called_once_with(git_devbliss.__main__.runner)
+
+    @unittest.mock.patch('git_devbliss.__main__._snapshot', None)
+    @unittest.mock.patch('git_devbliss.git.RepoSnapshot.take')
+    def test_repo_snapshot(self, take):
+        take.side_effect = ['first', 'second']
+        self.assertEqual(git_devbliss.__main__.repo_snapshot(), 'first')
+        self.assertEqual(git_devbliss.__main__.repo_snapshot(), 'first')
+        self.assertEqual(
+            git_devbliss.__main__.repo_snapshot(refresh=True), 'second')
@@ -0,0 +1,96 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+from unittest.mock import call
+import git_devbliss.maintenance
+from git_devbliss.git import GitRunner
+
+
+@unittest.mock.patch("builtins.print")
+class MaintenanceTest(unittest.TestCase):
+
+    def test_steps(self, print_function):
+        self.assertEqual(git_devbliss.maintenance.steps("linux"),
+                         git_devbliss.maintenance.STEPS)
+        self.assertEqual(git_devbliss.maintenance.steps("darwin")[-1][1],
+                         ["config", "core.fsmonitor", "true"])
+
+    def test_measure(self, print_function):
+        operation = unittest.mock.Mock()
+        failing = unittest.mock.Mock(
+            side_effect=subprocess.CalledProcessError(128, "git"))
+        timings = git_devbliss.maintenance.measure(
+            [("ok", operation), ("failing", failing)], repeat=2)
+        self.assertEqual(operation.call_count, 2)
+        self.assertEqual(failing.call_count, 1)
+        self.assertGreaterEqual(timings["ok"], 0)
+        self.assertIsNone(timings["failing"])
+
+    def test_report(self, print_function):
+        self.assertEqual(git_devbliss.maintenance.report(
+            {"status": 0.25, "merged branches": None},
+            {"status": 0.0625, "merged branches": 0.5}),
+            "Timings before -> after maintenance:\n"
+            "    status          0.250s -> 0.062s\n"
+            "    merged branches n/a -> 0.500s")
+
+    @unittest.mock.patch("git_devbliss.maintenance.measure")
+    def test_run(self, measure, print_function):
+        measure.return_value = {"status": 0.5}
+        runner = unittest.mock.Mock()
+        runner.call.side_effect = [0, 0, 129, 0, 0, 0]
+        git_devbliss.maintenance.run(runner)
+        self.assertEqual(measure.call_count, 2)
+        self.assertEqual(runner.call.call_args_list[:3], [
+            call(["pack-refs", "--all", "--prune"]),
+            call(["commit-graph", "write", "--reachable",
+                  "--changed-paths"]),
+            call(["multi-pack-index", "write"]),
+        ])
+        print_function.assert_any_call(
+            "Warning: git multi-pack-index write failed, skipping.",
+            file=sys.stderr)
+        print_function.assert_called_with(
+            "Timings before -> after maintenance:\n"
+            "    status 0.500s -> 0.500s")
+
+    @unittest.mock.patch.dict("os.environ")
+    def test_repository(self, print_function):
+        os.environ.pop("GIT_DIR", None)
+        with tempfile.TemporaryDirectory() as repository:
+            for command in ("-c init.defaultBranch=master init --quiet",
+                            "-c user.name=test -c user.email=test commit"
+                            " --quiet --allow-empty -m test",
+                            "update-ref refs/remotes/origin/master HEAD"):
+                subprocess.check_call(["git"] + command.split(),
+                                      cwd=repository)
+            cwd = os.getcwd()
+            os.chdir(repository)
+            try:
+                git_devbliss.maintenance.run(GitRunner())
+            finally:
+                os.chdir(cwd)
+            self.assertTrue(os.path.exists(os.path.join(
+                repository, ".git", "objects", "info", "commit-graph")))
+            self.assertTrue(os.path.exists(os.path.join(
+                repository, ".git", "packed-refs")))
+            report = print_function.call_args[0][0]
+            self.assertNotIn("n/a", report)
@@ -0,0 +1,64 @@
+# Copyright 2014 devbliss GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import git_devbliss
+
+# Seconds `git-devbliss --version` may take on top of a bare interpreter.
+STARTUP_BUDGET = 0.25
+RUNS = 5
+
+
+def best_time(command, cwd):
+    best = None
+    for i in range(RUNS):
+        start = time.perf_counter()
+        subprocess.check_output(command, cwd=cwd)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        modules = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, git_devbliss.__main__; print(" ".join(sys.modules))'
+        ]).decode().split()
+        for module in ('pkg_resources', 'requests', 'git_devbliss.github'):
+            self.assertNotIn(module, modules)
+
+    def test_version_startup(self):
+        with tempfile.TemporaryDirectory() as repository:
+            for command in (
+                    'init --quiet',
+                    'remote add origin git@github.com:devbliss/startup.git',
+                    '-c user.name=test -c user.email=test commit --quiet'
+                    ' --allow-empty -m startup'):
+                subprocess.check_call(['git'] + command.split(),
+                                      cwd=repository)
+            output = subprocess.check_output(
+                [sys.executable, '-m', 'git_devbliss', '--version'],
+                cwd=repository)
+            self.assertEqual(output.decode().strip(), git_devbliss.version())
+            baseline = best_time([sys.executable, '-c', 'pass'], repository)
+            startup = best_time(
+                [sys.executable, '-m', 'git_devbliss', '--version'],
+                repository)
+        self.assertLess(startup - baseline, STARTUP_BUDGET)
@@ -22,8 +22,8 @@ def notify(message):
     print()
 
 
-if sys.version_info < (3, 4):
-    print('Python 3.4 or above is required for git-devbliss')
+if sys.version_info < (3, 7):
+    print('Python 3.7 or above is required for git-devbliss')
     sys.exit(1)
 
 python_path_notice = ''
@@ -48,12 +48,12 @@ if os.path.exists('/etc'):
         ' into your profile to enable bash completion')
 
 
-python_path = '/opt/local/Library/Frameworks/Python.framework/Versions/3.4/bin'
+python_path = '/opt/local/Library/Frameworks/Python.framework/Versions/3.7/bin'
 if (sys.platform == 'darwin'
         and os.path.exists(python_path)
         and python_path not in os.environ.get('PATH')):
     python_path_notice = (
-        'Please ensure you have set your PATH to include python3.4'
+        'Please ensure you have set your PATH to include python3.7'
         ' packages: "export PATH=$PATH:{}"'.format(python_path))
 
 
@@ -71,6 +71,7 @@ setuptools.setup(
     name="git_devbliss",
     version="2.0.6",
     packages=setuptools.find_packages(),
+    python_requires=">=3.7",
     test_suite="git_devbliss",
     install_requires=[
         "docopt >=0.6.1",
@@ -97,7 +98,7 @@ setuptools.setup(
         'Operating System :: MacOS :: MacOS X',
         'Operating System :: Microsoft :: Windows',
         'Operating System :: POSIX',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3.7',
         'Topic :: Software Development :: Version Control',
         'Topic :: Utilities',
     ],